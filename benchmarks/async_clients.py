@@ -0,0 +1,77 @@
+"""在一个事件循环中并发驱动后端准备、提交与任务状态等待，上游由本地桩服务代替
+
+用法: python benchmarks/async_clients.py [--flows 200] [桩服务参数...]
+每个流程依次执行 AsyncDrawingTool.ensure_backend、submit_workflow、wait_for_task，
+输出总耗时、成功数、同时等待任务的流程数峰值与桩服务调用次数。
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# 添加项目根目录到 Python 路径
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stubs import StubServers, add_arguments, options_from_args
+
+
+async def run_flows(flows: int, timeout: float):
+    from wxcloudrun.async_http import close_async_session
+    from wxcloudrun.comfyui.async_drawing_tool import AsyncDrawingTool
+    from wxcloudrun.comfyui.workflow_templates import get_template_registry
+
+    tool = AsyncDrawingTool()
+    registry = get_template_registry()
+    waiting = peak = 0
+
+    async def flow(index):
+        nonlocal waiting, peak
+        await tool.ensure_backend()
+        task_id = await tool.submit_workflow(registry.prepare('base', {'seed': index}))
+        waiting += 1
+        peak = max(peak, waiting)
+        try:
+            task = await tool.wait_for_task(task_id, timeout)
+        finally:
+            waiting -= 1
+        return task['status']
+
+    started = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(flow(index) for index in range(flows)), return_exceptions=True)
+    finally:
+        await close_async_session()
+    return results, time.perf_counter() - started, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--flows', type=int, default=200, help='并发流程数')
+    parser.add_argument('--timeout', type=float, default=120, help='单个任务的等待超时（秒）')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    stubs = StubServers(options_from_args(args)).start()
+    os.environ.update(stubs.env)
+    os.environ.update({
+        'INSTANCE_POLL_INTERVAL': '0.2',
+        'ASYNC_TASK_POLL_INTERVAL': '0.2',
+    })
+    try:
+        results, elapsed, peak = asyncio.run(run_flows(args.flows, args.timeout))
+        finished = sum(1 for result in results if result == 'finished')
+        errors = [result for result in results if isinstance(result, Exception)]
+        print(f"流程数: {args.flows}  完成: {finished}  失败: {len(errors)}  总耗时: {elapsed:.2f}s")
+        print(f"同时等待任务的流程数峰值: {peak}")
+        print(f"桩服务调用次数: {dict(sorted(stubs.state.counts.items()))}")
+        for error in errors[:5]:
+            print(f"失败示例: {type(error).__name__}: {error}")
+    finally:
+        stubs.stop()
+
+
+if __name__ == '__main__':
+    main()
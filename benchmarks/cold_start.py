@@ -0,0 +1,61 @@
+"""测量冷启动耗时：应用导入与首个请求
+
+用法: python benchmarks/cold_start.py [次数] [导入预算ms] [首请求预算ms]
+每次在新的解释器进程中执行 `import run` 并发送首个请求，
+中位数超过预算时以非零状态退出，可在 CI 中拦截冷启动回退。
+首个请求使用不访问数据库和上游接口的 /api/jobs/<id>，只统计视图模块的延迟加载。
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# 在子进程中执行，保证每次都是全新的导入状态
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import run
+imported = time.perf_counter()
+client = run.app.test_client()
+first_started = time.perf_counter()
+client.get('/api/jobs/cold-start-probe')
+first_done = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_request_ms': (first_done - first_started) * 1000,
+    'modules': len(sys.modules),
+}))
+"""
+
+
+def probe():
+    env = dict(os.environ, TASK_EVENTS_ENABLED="false", AUTOSCALER_ENABLED="false")
+    output = subprocess.run([sys.executable, "-c", PROBE], cwd=PROJECT_ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    import_budget = float(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    first_request_budget = float(sys.argv[3]) if len(sys.argv) > 3 else 1500
+
+    samples = [probe() for _ in range(rounds)]
+    import_ms = statistics.median(sample['import_ms'] for sample in samples)
+    first_request_ms = statistics.median(sample['first_request_ms'] for sample in samples)
+    modules = samples[-1]['modules']
+
+    print(f"import run     p50={import_ms:8.1f}ms  budget={import_budget:.0f}ms")
+    print(f"first request  p50={first_request_ms:8.1f}ms  budget={first_request_budget:.0f}ms")
+    print(f"loaded modules {modules}")
+
+    if import_ms > import_budget or first_request_ms > first_request_budget:
+        print("冷启动耗时超出预算")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
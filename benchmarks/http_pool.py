@@ -0,0 +1,55 @@
+"""对比每次新建连接与连接池复用的单次调用耗时
+
+用法: python benchmarks/http_pool.py [次数] [接口路径]
+默认请求 ComfyOne 的 /v1/backends 接口 20 次。
+"""
+import os
+import statistics
+import sys
+import time
+
+import requests
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from wxcloudrun.comfyuione.comfyone import ComfyOne
+
+
+def measure(call, rounds):
+    """返回每次调用的耗时（毫秒）"""
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        try:
+            call()
+        except requests.exceptions.RequestException:
+            pass
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def report(name, samples):
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{name:<12} mean={statistics.mean(samples):8.1f}ms  p50={statistics.median(samples):8.1f}ms  p95={p95:8.1f}ms")
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    endpoint = sys.argv[2] if len(sys.argv) > 2 else "/v1/backends"
+    client = ComfyOne.shared()
+    url = f"{client.BASE_URL}{endpoint}"
+
+    cold = measure(lambda: requests.request("GET", url, headers=client.headers, timeout=5), rounds)
+    # 先建立一次连接，再统计复用连接的耗时
+    client.session.get(url, timeout=5)
+    pooled = measure(lambda: client.session.get(url, timeout=5), rounds)
+
+    report("new conn", cold)
+    report("pooled", pooled)
+    print(f"每次调用节省: {statistics.mean(cold) - statistics.mean(pooled):.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""以受控并发压测 Flask 接口，上游由本地桩服务代替
+
+用法: python benchmarks/loadtest.py [--concurrency 8] [--requests 40] [--warm] [桩服务参数...]
+流程：启动 benchmarks/stubs.py 中的桩服务，把应用的上游地址与数据库指向桩服务和临时 sqlite，
+在本进程内以多线程 WSGI 服务运行应用，再按接口分别压测，
+输出每个接口的请求数、失败数、p50/p95/p99 延迟与吞吐量。
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# 添加项目根目录到 Python 路径
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stubs import StubServers, add_arguments, options_from_args
+
+JOB_TERMINAL_STAGES = ('submitted', 'failed')
+
+
+class Recorder:
+    """按接口记录每次请求的耗时与成败"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+        self.durations = {}
+
+    def record(self, name: str, elapsed: float, ok: bool):
+        with self._lock:
+            self.samples.setdefault(name, []).append(elapsed)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def timed(self, name: str, method: str, session: requests.Session, url: str, ok_statuses=(200,), **kwargs):
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=60, **kwargs)
+        except requests.exceptions.RequestException:
+            self.record(name, time.perf_counter() - started, False)
+            return None
+        self.record(name, time.perf_counter() - started, response.status_code in ok_statuses)
+        return response
+
+    def report(self):
+        print(f"{'endpoint':<46}{'n':>6}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+        for name, samples in self.samples.items():
+            ordered = sorted(samples)
+            duration = self.durations.get(name) or sum(samples)
+            print(f"{name:<46}{len(samples):>6}{self.errors.get(name, 0):>6}"
+                  f"{percentile(ordered, 50) * 1000:>10.1f}{percentile(ordered, 95) * 1000:>10.1f}"
+                  f"{percentile(ordered, 99) * 1000:>10.1f}{len(samples) / duration:>10.1f}")
+
+
+def percentile(ordered, p):
+    """最近秩法计算百分位"""
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def run_scenario(recorder: Recorder, names, concurrency: int, count: int, func):
+    """以 concurrency 个线程执行 count 次 func，names 中的接口按本场景总耗时计算吞吐量"""
+    local = threading.local()
+
+    def call(index):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        return func(local.session, index)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(call, range(count)))
+    elapsed = time.perf_counter() - started
+    for name in names:
+        recorder.durations[name] = elapsed
+    return results
+
+
+def start_app(database_path: str):
+    """导入并启动应用，须在设置好环境变量之后调用"""
+    from werkzeug.serving import make_server
+    import run
+    from wxcloudrun import db
+    import wxcloudrun.model
+    import wxcloudrun.users.models
+    import wxcloudrun.comfyui.models
+
+    app = run.app
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{database_path}"
+    # sqlite 不支持 MySQL 的连接池参数
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    with app.app_context():
+        db.create_all()
+
+    # 关闭逐条访问日志，避免输出影响压测结果
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='loadtest-app', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=8, help='并发线程数')
+    parser.add_argument('--requests', type=int, default=40, help='每个接口的请求数')
+    parser.add_argument('--poll-interval', type=float, default=0.05, help='查询异步任务进度的间隔（秒）')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    stubs = StubServers(options_from_args(args)).start()
+    workdir = tempfile.mkdtemp(prefix='loadtest-')
+    os.environ.update(stubs.env)
+    os.environ.update({
+        'INSTANCE_POLL_INTERVAL': '0.2',
+        'AUTOSCALER_ENABLED': 'false',
+        'IMAGE_CACHE_DIR': os.path.join(workdir, 'images'),
+        'UPLOAD_INDEX_PATH': os.path.join(workdir, 'uploads.json'),
+    })
+    server, base_url = start_app(os.path.join(workdir, 'loadtest.db'))
+    recorder = Recorder()
+
+    try:
+        response = requests.post(f"{base_url}/api/user/register", json={'openid': 'loadtest', 'nickname': 'loadtest'})
+        user_id = response.json()['data']['user_id']
+
+        create = 'POST /api/create_workflow_task_base'
+        job_done = 'job create_workflow_task_base (end-to-end)'
+
+        def create_task(session, index):
+            started = time.perf_counter()
+            response = recorder.timed(create, 'POST', session, f"{base_url}/api/create_workflow_task_base",
+                                      ok_statuses=(202,), json={'params': {'seed': index}, 'user_id': user_id})
+            if response is None or response.status_code != 202:
+                return None
+            job_id = response.json()['job_id']
+            while True:
+                job = session.get(f"{base_url}/api/jobs/{job_id}", timeout=60).json()['job']
+                if job['stage'] in JOB_TERMINAL_STAGES:
+                    recorder.record(job_done, time.perf_counter() - started, job['stage'] == 'submitted')
+                    return job['task_id']
+                time.sleep(args.poll_interval)
+
+        task_ids = [task_id for task_id in run_scenario(recorder, [create, job_done], args.concurrency,
+                                                         args.requests, create_task) if task_id]
+
+        if task_ids:
+            status = 'GET /api/tasks/<id>'
+            run_scenario(recorder, [status], args.concurrency, args.requests,
+                         lambda session, index: recorder.timed(
+                             status, 'GET', session, f"{base_url}/api/tasks/{task_ids[index % len(task_ids)]}"))
+
+            # 等待桩服务中的任务执行完成后再取图片
+            time.sleep(args.task_seconds)
+            image = 'GET /api/tasks/<id>/images/0'
+            run_scenario(recorder, [image], args.concurrency, args.requests,
+                         lambda session, index: recorder.timed(
+                             image, 'GET', session,
+                             f"{base_url}/api/tasks/{task_ids[index % len(task_ids)]}/images/0"))
+
+        user = 'GET /api/user/<id>'
+        run_scenario(recorder, [user], args.concurrency, args.requests,
+                     lambda session, index: recorder.timed(user, 'GET', session, f"{base_url}/api/user/{user_id}"))
+
+        # 相同工作流的重复请求：首个请求提交，其余挂到进行中的任务或直接复用结果
+        duplicate = 'POST create_workflow_task_base (deterministic)'
+        submits = lambda: stubs.state.counts.get('submit_workflow_task', 0) + stubs.state.counts.get('submit_task', 0)
+        submits_before = submits()
+        responses = run_scenario(recorder, [duplicate], args.concurrency, args.requests,
+                                 lambda session, index: recorder.timed(
+                                     duplicate, 'POST', session, f"{base_url}/api/create_workflow_task_base",
+                                     ok_statuses=(200, 202), json={'params': {'seed': 42}, 'deterministic': True}))
+        # 等待挂载的任务提交完成后再统计
+        for job_id in {response.json().get('job_id') for response in responses if response is not None} - {None}:
+            while requests.get(f"{base_url}/api/jobs/{job_id}", timeout=60).json()['job']['stage'] \
+                    not in JOB_TERMINAL_STAGES:
+                time.sleep(args.poll_interval)
+        duplicate_submits = submits() - submits_before
+
+        drawings = 'GET /api/user/<id>/drawings'
+        run_scenario(recorder, [drawings], args.concurrency, args.requests,
+                     lambda session, index: recorder.timed(drawings, 'GET', session,
+                                                           f"{base_url}/api/user/{user_id}/drawings"))
+
+        recorder.report()
+        print(f"桩服务调用次数: {dict(sorted(stubs.state.counts.items()))}")
+        print(f"deterministic 重复请求实际提交次数: {duplicate_submits}")
+        for name in ('submit_workflow_task', 'submit_task'):
+            if stubs.state.counts.get(name):
+                print(f"{name} 平均请求体: {stubs.state.request_bytes.get(name, 0) / stubs.state.counts[name]:.0f} 字节")
+    finally:
+        server.shutdown()
+        stubs.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,465 @@
+"""OneThingAI 与 ComfyOne 的本地桩服务，用于不消耗 GPU 的压测
+
+用法: python benchmarks/stubs.py [--latency-ms 20] [--failure-rate 0.01] ...
+启动后打印需要设置的环境变量，应用按这些地址访问桩服务。
+
+模拟的行为：
+- OneThingAI：余额、私有镜像、资源、实例列表与创建/启动/停止/删除，
+  实例状态按时间推进 100 -> 300（启动）、400 -> 800（停止）
+- ComfyOne：/v1/backends 增删查、/v1/prompts_workflow 与 /v1/prompts 提交、
+  任务状态查询、图片下载、文件上传，以及 WebSocket 任务事件推送
+每个 HTTP 请求都会注入固定延迟加随机抖动，并按失败率返回 500。
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import websockets
+
+# 1x1 透明 PNG，作为生成图片返回
+PNG_BYTES = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000b49444154789c6360000200000500017a5eab3f0000"
+    "000049454e44ae426082"
+)
+
+APP_IMAGE_ID = "stub-image"
+
+
+class StubOptions:
+    """桩服务的行为参数，时间单位为秒"""
+
+    def __init__(self, latency=0.02, jitter=0.01, failure_rate=0.0, boot_seconds=2.0,
+                 stop_seconds=1.0, task_seconds=3.0, warm=False):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.boot_seconds = boot_seconds
+        self.stop_seconds = stop_seconds
+        self.task_seconds = task_seconds
+        # 启动时是否已有运行中的实例与后端
+        self.warm = warm
+
+
+class StubState:
+    """实例、后端与任务的内存状态，状态随时间推进而非靠后台线程"""
+
+    def __init__(self, options: StubOptions):
+        self.options = options
+        self._lock = threading.Lock()
+        # appId -> {'appImageId', 'phase', 'since'}
+        self._instances = {}
+        # 后端名称 -> 实例 ID
+        self._backends = {}
+        # taskId -> 提交时间
+        self._tasks = {}
+        self.counts = {}
+        # 各接口累计收到的请求体字节数
+        self.request_bytes = {}
+        if options.warm:
+            app_id = self.create_instance()
+            self._instances[app_id]['since'] -= options.boot_seconds
+            self.register_backend(app_id)
+
+    def count(self, name: str, request_bytes: int = 0):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+            if request_bytes:
+                self.request_bytes[name] = self.request_bytes.get(name, 0) + request_bytes
+
+    # ---- OneThingAI 实例 ----
+
+    def _status(self, instance) -> int:
+        elapsed = time.time() - instance['since']
+        if instance['phase'] == 'booting':
+            return 300 if elapsed >= self.options.boot_seconds else 100
+        return 800 if elapsed >= self.options.stop_seconds else 400
+
+    def list_instances(self):
+        with self._lock:
+            return [{'appId': app_id, 'appImageId': inst['appImageId'], 'status': self._status(inst)}
+                    for app_id, inst in self._instances.items()]
+
+    def create_instance(self) -> str:
+        app_id = f"app-{uuid.uuid4().hex[:12]}"
+        with self._lock:
+            self._instances[app_id] = {'appImageId': APP_IMAGE_ID, 'phase': 'booting', 'since': time.time()}
+        return app_id
+
+    def operate(self, app_id: str, phase: str) -> bool:
+        with self._lock:
+            instance = self._instances.get(app_id)
+            if instance is None:
+                return False
+            instance['phase'] = phase
+            instance['since'] = time.time()
+            return True
+
+    def delete_instance(self, app_id: str) -> bool:
+        with self._lock:
+            self._backends = {name: owner for name, owner in self._backends.items() if owner != app_id}
+            return self._instances.pop(app_id, None) is not None
+
+    # ---- ComfyOne 后端与任务 ----
+
+    def list_backends(self):
+        with self._lock:
+            backends = []
+            for name, app_id in self._backends.items():
+                instance = self._instances.get(app_id)
+                running = instance is not None and self._status(instance) == 300
+                backends.append({'name': name, 'instance_id': app_id, 'is_live': running,
+                                 'is_down': not running, 'status': 'running' if running else 'down'})
+            return backends
+
+    def register_backend(self, app_id: str) -> str:
+        name = f"backend-{uuid.uuid4().hex[:8]}"
+        with self._lock:
+            self._backends[name] = app_id
+        return name
+
+    def delete_backend(self, name: str) -> bool:
+        with self._lock:
+            return self._backends.pop(name, None) is not None
+
+    def submit_task(self) -> str:
+        task_id = uuid.uuid4().hex
+        with self._lock:
+            self._tasks[task_id] = time.time()
+        return task_id
+
+    def task_status(self, task_id: str, base_url: str):
+        with self._lock:
+            submitted_at = self._tasks.get(task_id)
+        if submitted_at is None:
+            return None
+        if time.time() - submitted_at < self.options.task_seconds:
+            return {'status': 'running', 'message': None, 'images': None}
+        return {'status': 'finished', 'message': 'success', 'images': [f"{base_url}/v1/images/{task_id}.png"]}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """按 (方法, 路径正则) 分发到处理函数"""
+
+    protocol_version = 'HTTP/1.1'
+    state: StubState = None
+    events = None
+    routes = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type='application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, data, status=200):
+        self._send(status, json.dumps(data).encode('utf-8'))
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        try:
+            return json.loads(body) if body else {}
+        except ValueError:
+            return {}
+
+    def base_url(self) -> str:
+        return f"http://{self.headers.get('Host')}"
+
+    def _dispatch(self, method: str):
+        options = self.state.options
+        time.sleep(max(0.0, options.latency + random.uniform(-options.jitter, options.jitter)))
+        path = urlsplit(self.path).path
+        for route_method, pattern, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if route_method == method and match:
+                self.state.count(handler.__name__, int(self.headers.get('Content-Length') or 0))
+                if random.random() < options.failure_rate:
+                    # 读完请求体，保证 keep-alive 连接可继续使用
+                    self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                    self.send_json({'code': 500, 'msg': 'injected failure'}, 500)
+                    return
+                handler(self, *match.groups())
+                return
+        self.send_json({'code': 404, 'msg': f'unknown endpoint {method} {path}'}, 404)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+
+def route(method: str, pattern: str):
+    def decorator(func):
+        StubHandler.routes.append((method, re.compile(pattern), func))
+        return func
+    return decorator
+
+
+# ---- OneThingAI ----
+
+@route('GET', r'/api/v1/account/wallet/detail')
+def wallet(handler):
+    handler.send_json({'code': 0, 'data': {'availableBalance': '1000.00'}})
+
+
+@route('GET', r'/api/v2/app/private/image/list')
+def list_image(handler):
+    handler.send_json({'code': 0, 'data': {'privateImageList': [{'appImageId': APP_IMAGE_ID}]}})
+
+
+@route('GET', r'/api/v2/resources/?')
+def list_resources(handler):
+    handler.send_json({'code': 0, 'data': {'resourceList': [
+        {'gpuType': 'NVIDIA-GEFORCE-RTX-4090', 'regionId': 'stub-region', 'maxGpuNum': 8},
+    ]}})
+
+
+@route('GET', r'/api/v2/app')
+def list_instances(handler):
+    handler.send_json({'code': 0, 'data': {'appList': handler.state.list_instances()}})
+
+
+@route('POST', r'/api/v2/app')
+def create_instance(handler):
+    handler.read_json()
+    handler.send_json({'code': 0, 'data': {'appId': handler.state.create_instance()}})
+
+
+@route('PUT', r'/api/v1/app/operate/boot/([^/]+)')
+def boot_instance(handler, app_id):
+    ok = handler.state.operate(app_id, 'booting')
+    handler.send_json({'code': 0 if ok else 404}, 200 if ok else 404)
+
+
+@route('PUT', r'/api/v1/app/operate/shutdown/([^/]+)')
+def shutdown_instance(handler, app_id):
+    ok = handler.state.operate(app_id, 'stopping')
+    handler.send_json({'code': 0 if ok else 404}, 200 if ok else 404)
+
+
+@route('DELETE', r'/api/v1/app/([^/]+)')
+def delete_instance(handler, app_id):
+    ok = handler.state.delete_instance(app_id)
+    handler.send_json({'code': 0 if ok else 404}, 200 if ok else 404)
+
+
+# ---- ComfyOne ----
+
+@route('GET', r'/v1/backends')
+def list_backends(handler):
+    handler.send_json({'code': 0, 'data': handler.state.list_backends()})
+
+
+@route('POST', r'/v1/backends')
+def register_backend(handler):
+    params = handler.read_json()
+    name = handler.state.register_backend(params.get('instance_id'))
+    handler.send_json({'code': 0, 'data': {'name': name}})
+
+
+@route('DELETE', r'/v1/backends/([^/]+)')
+def delete_backend(handler, name):
+    ok = handler.state.delete_backend(name)
+    handler.send_json({'code': 0 if ok else 404}, 200 if ok else 404)
+
+
+@route('POST', r'/v1/workflows')
+def create_workflow(handler):
+    handler.read_json()
+    handler.send_json({'code': 0, 'data': {'id': uuid.uuid4().hex}})
+
+
+@route('POST', r'/v1/prompts_workflow')
+def submit_workflow_task(handler):
+    handler.read_json()
+    task_id = handler.state.submit_task()
+    handler.events.publish_task(task_id)
+    handler.send_json({'code': 0, 'data': {'taskId': task_id}})
+
+
+@route('POST', r'/v1/prompts')
+def submit_task(handler):
+    handler.read_json()
+    task_id = handler.state.submit_task()
+    handler.events.publish_task(task_id)
+    handler.send_json({'code': 0, 'data': {'taskId': task_id}})
+
+
+@route('GET', r'/v1/prompts/([^/]+)/status')
+def task_status(handler, task_id):
+    data = handler.state.task_status(task_id, handler.base_url())
+    if data is None:
+        handler.send_json({'code': 404, 'msg': '任务不存在', 'data': None})
+        return
+    handler.send_json({'code': 0, 'msg': 'ok', 'data': data})
+
+
+@route('GET', r'/v1/images/([^/]+)')
+def image(handler, name):
+    handler._send(200, PNG_BYTES, 'image/png')
+
+
+@route('POST', r'/v1/files')
+def upload_file(handler):
+    length = int(handler.headers.get('Content-Length') or 0)
+    handler.rfile.read(length)
+    handler.send_json({'code': 0, 'data': {'name': f"{uuid.uuid4().hex}.png"}})
+
+
+class EventServer:
+    """WebSocket 任务事件推送：pendding -> progress -> finished"""
+
+    def __init__(self, options: StubOptions, host: str, port: int):
+        self.options = options
+        self.host = host
+        self.port = port
+        self._clients = set()
+        self._server = None
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stub-events', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait(5)
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(websockets.serve(self._handler, self.host, self.port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        # 关闭连接并等待剩余任务结束，避免退出时的未完成任务告警
+        self._server.close()
+        self._loop.run_until_complete(self._server.wait_closed())
+        pending = asyncio.all_tasks(self._loop)
+        for task in pending:
+            task.cancel()
+        self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        self._loop.close()
+
+    async def _handler(self, websocket, path=None):
+        self._clients.add(websocket)
+        try:
+            await websocket.wait_closed()
+        finally:
+            self._clients.discard(websocket)
+
+    async def _broadcast(self, event):
+        message = json.dumps(event)
+        for client in list(self._clients):
+            try:
+                await client.send(message)
+            except websockets.ConnectionClosed:
+                self._clients.discard(client)
+
+    async def _emit_task(self, task_id: str):
+        step = self.options.task_seconds / 2
+        await self._broadcast({'type': 'pendding', 'taskId': task_id, 'data': {'current': 0}})
+        await asyncio.sleep(step)
+        await self._broadcast({'type': 'progress', 'taskId': task_id, 'data': {'process': 50}})
+        await asyncio.sleep(step)
+        await self._broadcast({'type': 'finished', 'taskId': task_id, 'data': {'success': True}})
+
+    def publish_task(self, task_id: str):
+        self._loop.call_soon_threadsafe(lambda: self._loop.create_task(self._emit_task(task_id)))
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+
+
+class StubServers:
+    """同一进程内启动 OneThingAI、ComfyOne 与事件推送三个桩服务"""
+
+    def __init__(self, options: StubOptions = None, host: str = '127.0.0.1'):
+        self.options = options or StubOptions()
+        self.host = host
+        self.state = StubState(self.options)
+        self.events = EventServer(self.options, host, 0)
+        handler = type('BoundStubHandler', (StubHandler,), {'state': self.state, 'events': self.events})
+        self._servers = [ThreadingHTTPServer((host, 0), handler) for _ in range(2)]
+        for server in self._servers:
+            server.daemon_threads = True
+
+    @property
+    def env(self):
+        """指向桩服务的环境变量"""
+        onethingai, comfyone = (server.server_address[1] for server in self._servers)
+        return {
+            'ONETHINGAI_BASE_URL': f"http://{self.host}:{onethingai}",
+            'COMFYONE_BASE_URL': f"http://{self.host}:{comfyone}",
+            'COMFYONE_WS_URL': f"ws://{self.host}:{self.events.port}/v1/ws",
+            'ALERT_WEBHOOK_URL': '',
+        }
+
+    def start(self):
+        self.events.start()
+        for server in self._servers:
+            threading.Thread(target=server.serve_forever, name='stub-http', daemon=True).start()
+        return self
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self.events.stop()
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--latency-ms', type=float, default=20, help='每个请求的固定延迟')
+    parser.add_argument('--jitter-ms', type=float, default=10, help='延迟的随机抖动')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='返回 500 的概率')
+    parser.add_argument('--boot-seconds', type=float, default=2.0, help='实例从 100 到 300 的时间')
+    parser.add_argument('--stop-seconds', type=float, default=1.0, help='实例从 400 到 800 的时间')
+    parser.add_argument('--task-seconds', type=float, default=3.0, help='任务执行时间')
+    parser.add_argument('--warm', action='store_true', help='启动时已有运行中的实例与后端')
+
+
+def options_from_args(args) -> StubOptions:
+    return StubOptions(
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        failure_rate=args.failure_rate,
+        boot_seconds=args.boot_seconds,
+        stop_seconds=args.stop_seconds,
+        task_seconds=args.task_seconds,
+        warm=args.warm,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    args = parser.parse_args()
+    stubs = StubServers(options_from_args(args)).start()
+    for name, value in stubs.env.items():
+        print(f"export {name}='{value}'")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stubs.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,158 @@
 import os
 
-# 是否开启debug模式
-DEBUG = True
+# 是否开启debug模式，仅用于本地调试
+DEBUG = os.environ.get("DEBUG", "false").lower() == "true"
 
 # 读取数据库环境变量
 username = os.environ.get("MYSQL_USERNAME", 'root')
 password = os.environ.get("MYSQL_PASSWORD", 'Xx562137890!')
 db_address = os.environ.get("MYSQL_ADDRESS", 'sh-cynosdbmysql-grp-fts9hnq6.sql.tencentcdb.com:22267')
+# 只读副本地址，多个以逗号分隔，为空时所有查询都走主库
+replica_addresses = [address.strip() for address in os.environ.get("MYSQL_REPLICA_ADDRESSES", '').split(',')
+                     if address.strip()]
+# 完整的数据库连接地址，设置后替代上面的 MySQL 配置（如压测时使用 sqlite）
+DATABASE_URI = os.environ.get("DATABASE_URI", '')
 
 # 读取OneThingAI API密钥
 api_key = os.environ.get("ONE_THING_AI_API_KEY", 'fd5c8b952a9c2293c1078e7af7f71949')
 
+# 上游接口地址，压测时可指向本地桩服务（见 benchmarks/stubs.py）
+ONETHINGAI_BASE_URL = os.environ.get("ONETHINGAI_BASE_URL", "https://api-lab.onethingai.com")
+COMFYONE_BASE_URL = os.environ.get("COMFYONE_BASE_URL", "https://pandora-server-cf.onethingai.com")
+COMFYONE_WS_URL = os.environ.get("COMFYONE_WS_URL", "wss://pandora-server-cf.onethingai.com/v1/ws")
+
+# 余额告警的企业微信机器人地址，为空时不发送
+ALERT_WEBHOOK_URL = os.environ.get(
+    "ALERT_WEBHOOK_URL", 'https://qyapi.weixin.qq.com/cgi-bin/webhook/send?key=3234d8bf-bb64-4e40-997e-9e756c232ad4')
+
 jsons_path = [
     {"base": "wxcloudrun/comfyui/jsons/base.json"},
-]
\ No newline at end of file
+]
+
+# 异步绘画任务池：后台线程数、最大排队任务数、已完成任务保留时间（秒）
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+JOB_MAX_PENDING = int(os.environ.get("JOB_MAX_PENDING", 64))
+JOB_TTL = int(os.environ.get("JOB_TTL", 3600))
+
+# GPU 实例自动伸缩：是否开启、最少保温实例数、最多实例数、每个实例承载的排队任务数、
+# 空闲多久后释放（秒）、伸缩判断间隔（秒）、保留的伸缩决策条数
+AUTOSCALER_ENABLED = os.environ.get("AUTOSCALER_ENABLED", "false").lower() == "true"
+AUTOSCALER_MIN_WARM = int(os.environ.get("AUTOSCALER_MIN_WARM", 0))
+AUTOSCALER_MAX_INSTANCES = int(os.environ.get("AUTOSCALER_MAX_INSTANCES", 3))
+AUTOSCALER_JOBS_PER_INSTANCE = int(os.environ.get("AUTOSCALER_JOBS_PER_INSTANCE", 4))
+AUTOSCALER_IDLE_SECONDS = int(os.environ.get("AUTOSCALER_IDLE_SECONDS", 600))
+AUTOSCALER_INTERVAL = int(os.environ.get("AUTOSCALER_INTERVAL", 15))
+AUTOSCALER_HISTORY = int(os.environ.get("AUTOSCALER_HISTORY", 200))
+
+# OneThingAI 实例状态轮询：有等待者时的轮询间隔、空闲时的轮询间隔（秒），
+# 等待实例启动、停止的最长时间（秒）
+INSTANCE_POLL_INTERVAL = float(os.environ.get("INSTANCE_POLL_INTERVAL", 3))
+INSTANCE_IDLE_POLL_INTERVAL = float(os.environ.get("INSTANCE_IDLE_POLL_INTERVAL", 60))
+INSTANCE_BOOT_TIMEOUT = int(os.environ.get("INSTANCE_BOOT_TIMEOUT", 900))
+INSTANCE_STOP_TIMEOUT = int(os.environ.get("INSTANCE_STOP_TIMEOUT", 300))
+
+# 上游 HTTP 连接池：连接池个数、每个连接池的最大连接数、重试次数、重试退避系数
+HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", 4))
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", 32))
+HTTP_RETRY_TOTAL = int(os.environ.get("HTTP_RETRY_TOTAL", 3))
+HTTP_RETRY_BACKOFF = float(os.environ.get("HTTP_RETRY_BACKOFF", 0.5))
+
+# 工作流模板文件修改检查间隔（秒）
+WORKFLOW_TEMPLATE_CHECK_INTERVAL = float(os.environ.get("WORKFLOW_TEMPLATE_CHECK_INTERVAL", 2))
+
+# 任务事件：是否启动 WebSocket 事件消费、已结束任务在内存中的保留时间（秒）、
+# 未结束任务无更新时的最长保留时间（秒，结束事件丢失的任务超过后不再计入排队并被清理）、
+# 长轮询最长等待（秒）、SSE 心跳间隔与单个连接最长持续时间（秒）
+TASK_EVENTS_ENABLED = os.environ.get("TASK_EVENTS_ENABLED", "true").lower() == "true"
+TASK_STORE_TTL = int(os.environ.get("TASK_STORE_TTL", 3600))
+TASK_STORE_INFLIGHT_MAX_AGE = float(os.environ.get("TASK_STORE_INFLIGHT_MAX_AGE", 1800))
+TASK_LONG_POLL_MAX = float(os.environ.get("TASK_LONG_POLL_MAX", 30))
+TASK_SSE_HEARTBEAT = float(os.environ.get("TASK_SSE_HEARTBEAT", 15))
+TASK_SSE_MAX_DURATION = float(os.environ.get("TASK_SSE_MAX_DURATION", 600))
+
+# 批量提交：单次请求最多的工作流数、并发提交数
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 16))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", 4))
+
+# 生成图片磁盘缓存：缓存目录、容量上限（字节）、下载分块大小（字节）、客户端缓存时间（秒）
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", "/tmp/yimeng/images")
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+IMAGE_CACHE_CHUNK_SIZE = int(os.environ.get("IMAGE_CACHE_CHUNK_SIZE", 64 * 1024))
+IMAGE_CACHE_MAX_AGE = int(os.environ.get("IMAGE_CACHE_MAX_AGE", 7 * 24 * 3600))
+# 由前置 Web 服务器（nginx 等）通过 X-Sendfile 发送缓存文件
+USE_X_SENDFILE = os.environ.get("USE_X_SENDFILE", "false").lower() == "true"
+
+# 输入图片上传：上传超时（秒）、并发上传数、读取分块大小（字节）、
+# 已上传文件索引的保存位置与有效期（秒）
+UPLOAD_TIMEOUT = int(os.environ.get("UPLOAD_TIMEOUT", 60))
+UPLOAD_CONCURRENCY = int(os.environ.get("UPLOAD_CONCURRENCY", 4))
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 64 * 1024))
+UPLOAD_INDEX_PATH = os.environ.get("UPLOAD_INDEX_PATH", "/tmp/yimeng/upload_index.json")
+UPLOAD_INDEX_TTL = int(os.environ.get("UPLOAD_INDEX_TTL", 7 * 24 * 3600))
+
+# 计数器：是否注册 / 与 /api/count 路由、分片数（大于1时开启分片写入）、读缓存时间（秒）
+COUNTER_ENABLED = os.environ.get("COUNTER_ENABLED", "false").lower() == "true"
+COUNTER_SHARDS = int(os.environ.get("COUNTER_SHARDS", 1))
+COUNTER_CACHE_TTL = float(os.environ.get("COUNTER_CACHE_TTL", 1))
+
+# 用户订单总数缓存：有效期（秒）、最大条数
+ORDER_COUNT_CACHE_TTL = int(os.environ.get("ORDER_COUNT_CACHE_TTL", 60))
+ORDER_COUNT_CACHE_SIZE = int(os.environ.get("ORDER_COUNT_CACHE_SIZE", 10000))
+
+# 用户信息缓存：最大条数、有效期（秒）
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", 60))
+
+# 数据库连接池：主库与只读副本分别配置
+DB_ENGINE_OPTIONS = {
+    "pool_size": int(os.environ.get("DB_POOL_SIZE", 10)),
+    "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+    "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+    "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true",
+    "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", 10)),
+}
+DB_REPLICA_ENGINE_OPTIONS = {
+    "pool_size": int(os.environ.get("DB_REPLICA_POOL_SIZE", DB_ENGINE_OPTIONS["pool_size"])),
+    "max_overflow": int(os.environ.get("DB_REPLICA_MAX_OVERFLOW", DB_ENGINE_OPTIONS["max_overflow"])),
+    "pool_recycle": int(os.environ.get("DB_REPLICA_POOL_RECYCLE", DB_ENGINE_OPTIONS["pool_recycle"])),
+    "pool_pre_ping": os.environ.get("DB_REPLICA_POOL_PRE_PING", "true").lower() == "true",
+    "pool_timeout": int(os.environ.get("DB_REPLICA_POOL_TIMEOUT", DB_ENGINE_OPTIONS["pool_timeout"])),
+}
+
+# JSON 响应压缩：最小压缩字节数、gzip 压缩级别、brotli 压缩质量
+RESPONSE_COMPRESS_MIN_SIZE = int(os.environ.get("RESPONSE_COMPRESS_MIN_SIZE", 1024))
+RESPONSE_GZIP_LEVEL = int(os.environ.get("RESPONSE_GZIP_LEVEL", 5))
+RESPONSE_BROTLI_QUALITY = int(os.environ.get("RESPONSE_BROTLI_QUALITY", 4))
+
+# 日志：默认级别、按模块覆盖的级别（如 "log.comfyone=WARNING,log.drawing_tool=DEBUG"）、
+# 高频日志的抽样比例（如 "task_progress=0.1" 表示进度事件每 10 条输出 1 条）、异步日志队列长度
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.environ.get("LOG_LEVELS", "")
+LOG_SAMPLE_RATES = os.environ.get("LOG_SAMPLE_RATES", "task_pending=0.1,task_progress=0.1")
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+
+# 指标多进程汇总：各工作进程写入指标的共享目录（为空时只输出处理请求的进程的指标）、写入间隔（秒）。
+# gunicorn 多进程时由 gunicorn.conf.py 设置默认目录
+METRICS_MULTIPROC_DIR = os.environ.get("METRICS_MULTIPROC_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 5))
+
+# 后端准备的跨进程锁：MySQL GET_LOCK 锁名、等待超时（秒），超时应覆盖一次完整的实例启动
+PROVISION_LOCK_NAME = os.environ.get("PROVISION_LOCK_NAME", "yimeng:provision_backend")
+PROVISION_LOCK_TIMEOUT = int(os.environ.get("PROVISION_LOCK_TIMEOUT", INSTANCE_BOOT_TIMEOUT + 120))
+
+# 生成结果缓存（请求带 deterministic 时启用）：进程内最多缓存的结果数、结果可复用的保留时间（秒），
+# 保留时间应短于上游图片地址的有效期
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", 10000))
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", 24 * 3600))
+# 未结束的相同任务提交后超过该时间（秒）不再挂载，视为结束写入失败或事件丢失，重新提交
+RESULT_CACHE_INFLIGHT_MAX_AGE = float(os.environ.get("RESULT_CACHE_INFLIGHT_MAX_AGE", 1800))
+
+# 工作流注册：开启后模板只在 ComfyOne 注册一次，参数全部是模板声明的输入时按 workflow_id 只提交 inputs；
+# 多个进程同时注册同一模板时等待锁的超时（秒）
+WORKFLOW_REGISTRY_ENABLED = os.environ.get("WORKFLOW_REGISTRY_ENABLED", "true").lower() == "true"
+WORKFLOW_REGISTER_LOCK_TIMEOUT = int(os.environ.get("WORKFLOW_REGISTER_LOCK_TIMEOUT", 30))
+
+# asyncio 客户端（aiohttp）：共享连接池总连接数、每个上游主机的最大连接数、任务状态轮询间隔（秒）
+ASYNC_HTTP_POOL_SIZE = int(os.environ.get("ASYNC_HTTP_POOL_SIZE", 200))
+ASYNC_HTTP_POOL_PER_HOST = int(os.environ.get("ASYNC_HTTP_POOL_PER_HOST", 100))
+ASYNC_TASK_POLL_INTERVAL = float(os.environ.get("ASYNC_TASK_POLL_INTERVAL", 1.0))
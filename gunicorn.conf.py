@@ -0,0 +1,65 @@
+# gunicorn 配置文件：单进程预加载，gevent 协作式 I/O 提供并发
+# 启动命令: gunicorn -c gunicorn.conf.py run:app
+import os
+import shutil
+
+# 工作进程类型：gevent（协作式 I/O，等待上游时让出）、gthread（线程池）、sync
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gevent")
+
+# gevent 模式须在加载应用之前打补丁，否则预加载的模块仍持有阻塞版本的 socket/time
+if worker_class == "gevent":
+    from gevent import monkey
+    monkey.patch_all()
+
+bind = "0.0.0.0:{}".format(os.environ.get("PORT", 80))
+
+# 进程数默认 1：后台任务（JobManager）、任务状态（TaskStore）、ComfyOne 事件订阅、自动扩缩容与实例状态监视
+# 都保存在进程内，多进程时请求落到其他进程会查不到任务，且每个进程各自订阅事件、各自扩容。
+# 并发由 gevent 协程或 gthread 线程提供；这些状态迁移到共享存储之前不要调大
+workers = int(os.environ.get("GUNICORN_WORKERS", 1))
+# 多进程时各进程的指标写入共享目录，/metrics 汇总所有进程，须在加载应用之前设置
+if workers > 1:
+    os.environ.setdefault("METRICS_MULTIPROC_DIR", "/tmp/yimeng-metrics")
+# gthread 模式下每个进程的线程数
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+# gevent 模式下每个进程的最大并发连接数
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+
+# 在主进程中预加载应用，子进程共享只读内存
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# 处理一定数量请求后回收工作进程，加随机抖动避免同时重启。默认 0 不回收：
+# 回收会中断仍在等待实例启动（可达数分钟，远超 graceful_timeout）的后台任务
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+accesslog = "-"
+errorlog = "-"
+
+
+def on_starting(server):
+    """清空上次运行留下的指标文件"""
+    directory = os.environ.get("METRICS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def post_fork(server, worker):
+    """子进程不能复用主进程创建的数据库连接，也不继承主进程的日志输出线程"""
+    import config
+    from run import app
+    from wxcloudrun import db, logs, metrics
+    db.dispose_engines(app)
+    logs.start_listener()
+    if config.METRICS_MULTIPROC_DIR:
+        metrics.REGISTRY.enable_multiprocess(config.METRICS_MULTIPROC_DIR, config.METRICS_FLUSH_INTERVAL)
+
+
+def worker_exit(server, worker):
+    """写出退出进程的最终指标，汇总时保留其计数"""
+    from wxcloudrun import metrics
+    metrics.REGISTRY.flush()
@@ -1,27 +1,48 @@
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-import pymysql
 import config
-from flask_migrate import Migrate
+from wxcloudrun.db_routing import RoutingSQLAlchemy
 
-# 因MySQLDB不支持Python3，使用pymysql扩展库代替MySQLDB库
-pymysql.install_as_MySQLdb()
+# 初始化DB操作对象，引擎在首次查询时创建
+db = RoutingSQLAlchemy()
 
-# 初始化web应用
-app = Flask(__name__, instance_relative_config=True)
-app.config['DEBUG'] = config.DEBUG
 
-# 设定数据库链接
-app.config['SQLALCHEMY_DATABASE_URI'] = 'mysql://{}:{}@{}/yimeng'.format(config.username, config.password,
-                                                                             config.db_address)
+def _database_uri(address: str) -> str:
+    # 通过 mysql+pymysql 方言直接使用 pymysql，无需 install_as_MySQLdb
+    return 'mysql+pymysql://{}:{}@{}/yimeng'.format(config.username, config.password, address)
 
-# 初始化DB操作对象
-db = SQLAlchemy(app)
-migrate = Migrate()
 
-# 加载控制器
-from wxcloudrun.comfyui import comfyui_views
-from wxcloudrun.users import user_views
+def create_app():
+    """创建web应用
 
-# 加载配置
-app.config.from_object('config')
+    仅注册配置与路由，视图模块、数据库引擎和上游客户端都在首次使用时才加载。
+    """
+    app = Flask(__name__, instance_relative_config=True)
+    app.config['DEBUG'] = config.DEBUG
+
+    # 设定数据库链接
+    app.config['SQLALCHEMY_DATABASE_URI'] = config.DATABASE_URI or _database_uri(config.db_address)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = config.DB_ENGINE_OPTIONS
+
+    # 设定只读副本链接，只读查询按副本分流
+    app.config['SQLALCHEMY_REPLICA_URIS'] = [_database_uri(address) for address in config.replica_addresses]
+    app.config['SQLALCHEMY_REPLICA_ENGINE_OPTIONS'] = config.DB_REPLICA_ENGINE_OPTIONS
+
+    # 加载配置
+    app.config.from_object('config')
+
+    db.init_app(app)
+
+    # 异步结构化日志与请求关联 ID
+    from wxcloudrun import logs
+    logs.setup_logging()
+    logs.init_app(app)
+
+    # 注册响应压缩
+    from wxcloudrun import response
+    response.init_app(app)
+
+    # 注册路由
+    from wxcloudrun.routes import register_blueprints
+    register_blueprints(app)
+
+    return app
@@ -0,0 +1,87 @@
+import asyncio
+import time
+import weakref
+from typing import Dict, Optional
+
+import config
+from wxcloudrun.http_session import HTTPStatusError
+from wxcloudrun.metrics import observe_upstream
+
+# 与同步会话的重试策略一致：这些状态码只对幂等请求重试，连接失败对所有请求重试
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS')
+
+# 事件循环 -> aiohttp 会话，会话不能跨事件循环使用
+_sessions = weakref.WeakKeyDictionary()
+
+
+def get_async_session():
+    """获取当前事件循环共享的 aiohttp 会话
+
+    同一事件循环中的所有异步客户端共用一个连接池，复用 keep-alive 连接。
+    aiohttp 在首次调用时才导入，不影响应用冷启动。
+    """
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(limit=config.ASYNC_HTTP_POOL_SIZE,
+                                         limit_per_host=config.ASYNC_HTTP_POOL_PER_HOST,
+                                         ttl_dns_cache=300)
+        session = aiohttp.ClientSession(connector=connector)
+        _sessions[loop] = session
+    return session
+
+
+async def close_async_session():
+    """关闭当前事件循环的共享会话，事件循环结束前调用"""
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+async def request_json(service: str, method: str, base_url: str, endpoint: str, headers: Dict,
+                       data: Optional[Dict] = None, timeout: float = 15, session=None,
+                       status_messages: Optional[Dict[int, str]] = None) -> Dict:
+    """发送请求并解析 JSON 响应，按 HTTP_RETRY_TOTAL 与 HTTP_RETRY_BACKOFF 重试
+
+    Args:
+        service: 上游服务名，记录到上游调用指标
+        status_messages: 特定状态码的错误信息，如 {401: "认证失败"}
+    """
+    import aiohttp
+
+    session = session or get_async_session()
+    method = method.upper()
+    # 失败类型或 HTTP 状态码，记录到上游调用指标
+    status = 'error'
+    started = time.perf_counter()
+    try:
+        for attempt in range(config.HTTP_RETRY_TOTAL + 1):
+            retry = attempt < config.HTTP_RETRY_TOTAL
+            try:
+                async with session.request(method, f"{base_url}{endpoint}", headers=headers, json=data,
+                                           timeout=aiohttp.ClientTimeout(total=timeout, sock_connect=5)) as response:
+                    status = response.status
+                    if retry and status in RETRY_STATUSES and method in IDEMPOTENT_METHODS:
+                        await asyncio.sleep(config.HTTP_RETRY_BACKOFF * (2 ** attempt))
+                        continue
+                    if status_messages and status in status_messages:
+                        raise Exception(status_messages[status])
+                    if status >= 400:
+                        raise HTTPStatusError(f"API 请求失败: {status} {response.reason}", status)
+                    return await response.json(content_type=None)
+            except asyncio.TimeoutError as e:
+                status = 'timeout'
+                raise Exception(f"请求超时: {str(e) or timeout}")
+            except aiohttp.ClientConnectionError as e:
+                status = 'connection_error'
+                if retry:
+                    await asyncio.sleep(config.HTTP_RETRY_BACKOFF * (2 ** attempt))
+                    continue
+                raise Exception(f"连接服务器失败: {str(e)}")
+            except aiohttp.ClientError as e:
+                raise Exception(f"API 请求失败: {str(e)}")
+    finally:
+        observe_upstream(service, method, endpoint, status, time.perf_counter() - started)
@@ -0,0 +1,282 @@
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Callable, Dict, Optional, Tuple, Union
+
+import config
+from ..async_http import get_async_session
+from ..onethingai.async_onething_ai import AsyncOneThingAI
+from ..onethingai.watcher import InstanceMissingError
+from ..comfyuione.async_comfyone import AsyncComfyOne
+from ..comfyuione.comfyone import ComfyOne
+from ..comfyuione.task_events import get_task_store, TERMINAL_STATUSES
+from ..metrics import stage_timer
+from ..coordination import AsyncSingleFlight, async_advisory_lock
+from .drawing_tool import DrawingTool, submit_error_response
+from .workflow_templates import PreparedWorkflow, get_template_registry
+
+logger = logging.getLogger('log.drawing_tool')
+
+# 事件循环内合并并发的后端准备请求
+_provisioning = AsyncSingleFlight()
+
+
+async def _run_sync(func, *args):
+    """在线程池中执行阻塞调用，沿用当前上下文（应用上下文、日志关联 ID）"""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(None, lambda: context.run(func, *args))
+
+
+class AsyncDrawingTool:
+    """DrawingTool 的 asyncio 版本：准备后端服务实例、提交任务、等待任务结束
+
+    上游调用使用 AsyncOneThingAI 与 AsyncComfyOne，等待实例启动与任务结束时在事件循环中挂起，
+    不占用线程，一个进程可同时驱动数百个流程。
+    准备锁只在选择或创建实例、注册后端时持有，启动等待在锁外进行；
+    其他进程取得锁后看到启动中的实例会复用它，注册前再次检查，一台实例只注册一次。
+    资源选择、工作流注册表与任务记录与 DrawingTool 共用。
+    """
+
+    def __init__(self, one_thing_ai: Optional[AsyncOneThingAI] = None, comfyone: Optional[AsyncComfyOne] = None,
+                 tool: Optional[DrawingTool] = None):
+        self.one_thing_ai = one_thing_ai or AsyncOneThingAI()
+        self.comfyone = comfyone or AsyncComfyOne()
+        self.tool = tool or DrawingTool()
+
+    async def send_mess(self, message):
+        """发送消息"""
+        if not config.ALERT_WEBHOOK_URL:
+            return
+        json = {
+            "msgtype": "text",
+            "text": {
+                "content": message
+            }
+        }
+        async with get_async_session().post(config.ALERT_WEBHOOK_URL, json=json) as resp:
+            logger.info("余额告警通知发送结果: %s", resp.status)
+
+    async def _wait_instance(self, instance_id: str, predicate: Callable[[Dict], bool], timeout: float) -> Dict:
+        """按 INSTANCE_POLL_INTERVAL 轮询实例列表，直到实例满足 predicate
+
+        Raises:
+            InstanceMissingError: 实例不存在
+            Exception: 超时
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            response = await self.one_thing_ai.list_instances()
+            instance = next((inst for inst in response['data']['appList'] if inst['appId'] == instance_id), None)
+            if instance is None:
+                raise InstanceMissingError(instance_id)
+            if predicate(instance):
+                return instance
+            if time.monotonic() >= deadline:
+                raise Exception(f"等待实例 {instance_id} 状态超时")
+            await asyncio.sleep(config.INSTANCE_POLL_INTERVAL)
+
+    async def get_instance(self) -> Tuple[Optional[str], bool]:
+        """选择或创建 OneThingAI 实例，不等待启动完成
+
+        Returns:
+            (实例 ID, 是否新建)，无可用资源时实例 ID 为 None
+        """
+        # 查询余额
+        with stage_timer('wallet_check'):
+            wallet_response = await self.one_thing_ai.get_wallet()
+            balance = float(wallet_response['data']['availableBalance'])
+        logger.debug("当前余额: %s元", balance)
+
+        # 如果余额不足20元，发送通知
+        if balance < 20:
+            logger.warning("余额不足20元，发送通知，当前余额: %s元", balance)
+            await self.send_mess(f"当前余额不足20元，仅剩{balance}元，请及时充值。")
+
+        app_image_id = await self.get_app_image_id()
+
+        with stage_timer('instance_list'):
+            response = await self.one_thing_ai.list_instances()
+            instances = [inst for inst in response['data']['appList'] if inst['appImageId'] == app_image_id]
+
+        # 启动中或运行中的实例直接使用
+        running_instances = [inst for inst in instances if inst['status'] in [100, 200, 300]]
+        if running_instances:
+            instance = running_instances[0]
+            logger.info("使用现有实例 %s，状态: %s", instance['appId'], instance['status'])
+            return instance['appId'], False
+
+        # 停止中或已停止的实例释放后启动新实例
+        stopped_instances = [inst for inst in instances if inst['status'] in [400, 800]]
+        if stopped_instances:
+            instance = stopped_instances[0]
+            logger.info("找到已停止实例 %s，状态: %s", instance['appId'], instance['status'])
+            if instance['status'] == 400:
+                logger.info("实例 %s 正在停止中，等待停止完成", instance['appId'])
+                with stage_timer('stop_wait'):
+                    instance = await self._wait_instance(instance['appId'], lambda inst: inst['status'] != 400,
+                                                         config.INSTANCE_STOP_TIMEOUT)
+            logger.info("开始释放实例: %s", instance['appId'])
+            with stage_timer('instance_release'):
+                await self.one_thing_ai.delete_instance(instance['appId'])
+
+        return await self.create_instance(app_image_id), True
+
+    async def get_app_image_id(self) -> str:
+        """查询私有镜像 ID"""
+        with stage_timer('image_list'):
+            image_response = await self.one_thing_ai.list_image()
+            app_image_id = image_response['data']['privateImageList'][0]['appImageId']
+        logger.debug("获取到的镜像 ID: %s", app_image_id)
+        return app_image_id
+
+    async def create_instance(self, app_image_id: str) -> Optional[str]:
+        """选择资源并创建新实例，不等待启动，无可用资源时返回 None"""
+        logger.info("开始创建新实例")
+        with stage_timer('resource_select'):
+            instance_config = DrawingTool.instance_config(app_image_id,
+                                                          await self.one_thing_ai.list_resources(app_image_id))
+        if instance_config is None:
+            return None
+        with stage_timer('instance_create'):
+            create_instance_response = await self.one_thing_ai.create_instance(instance_config)
+            instance_id = create_instance_response['data']['appId']
+        logger.info("创建的实例 ID: %s", instance_id)
+        return instance_id
+
+    async def wait_for_boot(self, instance_id: str) -> str:
+        """等待实例启动完成
+
+        Raises:
+            Exception: 实例消失、启动失败或超时
+        """
+        with stage_timer('boot_wait'):
+            instance = await self._wait_instance(instance_id, lambda inst: inst['status'] not in (100, 200),
+                                                 config.INSTANCE_BOOT_TIMEOUT)
+        if instance['status'] != 300:
+            raise Exception(f"实例 {instance_id} 启动失败，状态: {instance['status']}")
+        logger.info("实例 %s 启动成功", instance_id)
+        return instance_id
+
+    async def _check_backend(self) -> Optional[Dict]:
+        """查询第一个后端服务实例，没有时返回 None"""
+        with stage_timer('backend_check'):
+            backends_response = await self.comfyone.list_backends()
+        backends = backends_response.get('data', [])
+        return backends[0] if backends else None
+
+    async def ensure_backend(self, on_stage: Optional[Callable[[str], None]] = None) -> str:
+        """确保存在可用的后端服务实例，返回后端实例名称
+
+        同一事件循环内的并发调用共享一次准备过程，不同进程之间通过数据库锁串行。
+        """
+        report = on_stage or (lambda stage: None)
+        report('checking_backend')
+        backend = await self._check_backend()
+        if backend is not None and DrawingTool.is_healthy(backend):
+            return backend['name']
+
+        report('provisioning')
+        return await _provisioning.do('backend', lambda: self._provision_backend(report))
+
+    async def _provision_backend(self, report: Callable[[str], None]) -> str:
+        """准备后端服务实例，等待中的实例被删除或释放时重新准备一次"""
+        try:
+            return await self._provision_once(report)
+        except InstanceMissingError as e:
+            logger.warning("实例 %s 在等待期间消失，重新准备实例", e.app_id)
+            return await self._provision_once(report)
+
+    async def _provision_once(self, report: Callable[[str], None]) -> str:
+        """选择或创建实例、等待启动并注册后端，锁只在检查与变更时持有"""
+        with stage_timer('provision'):
+            async with async_advisory_lock(config.PROVISION_LOCK_NAME, config.PROVISION_LOCK_TIMEOUT):
+                # 等锁期间其他进程可能已经准备好后端
+                backend = await self._check_backend()
+                if backend is not None:
+                    if DrawingTool.is_healthy(backend):
+                        logger.info("其他进程已准备好后端服务实例 ID: %s", backend['name'])
+                        return backend['name']
+                    logger.warning("后端服务实例 %s 状态异常，开始重建: is_live=%s, is_down=%s, status=%s",
+                                   backend['name'], backend['is_live'], backend['is_down'], backend['status'])
+                    try:
+                        await self.comfyone.delete_backend(backend['name'])
+                    except Exception as e:
+                        logger.warning("删除 ComfyOne 实例 ID: %s 失败: %s", backend['name'], e)
+                instance_id, created = await self.get_instance()
+            if not instance_id:
+                raise Exception("无法创建 OneThingAI 实例")
+
+            await self.wait_for_boot(instance_id)
+            if created:
+                await self.send_mess("有新实例启动成功")
+
+        report('registering_backend')
+        async with async_advisory_lock(config.PROVISION_LOCK_NAME, config.PROVISION_LOCK_TIMEOUT):
+            backends = (await self.comfyone.list_backends()).get('data', [])
+            registered = next((backend for backend in backends if backend.get('instance_id') == instance_id), None)
+            if registered is not None:
+                logger.info("实例 %s 已由其他进程注册为后端服务实例 ID: %s", instance_id, registered['name'])
+                return registered['name']
+            with stage_timer('backend_register'):
+                register_response = await self.comfyone.register_backend(instance_id)
+        backend_instance_id = register_response['data']['name']
+        logger.info("创建新的后端服务实例成功，ID: %s", backend_instance_id)
+        return backend_instance_id
+
+    async def submit_workflow(self, workflow: Union[Dict, PreparedWorkflow], owner: Optional[Dict] = None) -> str:
+        """提交工作流任务，返回任务 ID，规则与 DrawingTool.submit_workflow 相同"""
+        prepared = workflow if isinstance(workflow, PreparedWorkflow) else None
+        workflow_id = None
+        if prepared is not None:
+            workflow_id = await _run_sync(self.tool.registered_workflow_id, ComfyOne.shared(), prepared)
+        with stage_timer('submit'):
+            task_response = None
+            if workflow_id is not None:
+                try:
+                    task_response = await self.comfyone.submit_task(workflow_id, prepared.inputs)
+                except Exception as e:
+                    task_response = submit_error_response(e)
+                if task_response.get('code') != 0:
+                    await _run_sync(DrawingTool.submit_task_failed, workflow_id, prepared, task_response)
+                    task_response = None
+            if task_response is None:
+                task_response = await self.comfyone.submit_workflow_task(prepared.workflow if prepared else workflow)
+            task_id = task_response['data']['taskId']
+        logger.info("提交任务成功，任务 ID: %s", task_id)
+        DrawingTool.record_submitted(task_id, owner)
+        return task_id
+
+    async def create_workflow_task_base(self, workflow: Optional[Union[Dict, PreparedWorkflow]] = None,
+                                        on_stage: Optional[Callable[[str], None]] = None,
+                                        owner: Optional[Dict] = None) -> str:
+        """准备后端并提交工作流任务，默认使用 base 模板"""
+        report = on_stage or (lambda stage: None)
+        with stage_timer('pipeline'):
+            await self.ensure_backend(on_stage)
+            if workflow is None:
+                workflow = get_template_registry().prepare('base')
+            report('submitting')
+            return await self.submit_workflow(workflow, owner)
+
+    async def wait_for_task(self, task_id: str, timeout: float, interval: Optional[float] = None) -> Dict:
+        """轮询任务状态直到结束，返回本地状态表中的任务
+
+        每次查询结果写入本地状态表，任务结束时由任务记录器更新 drawing_tasks
+
+        Raises:
+            Exception: 查询失败或超时仍未结束
+        """
+        interval = interval or config.ASYNC_TASK_POLL_INTERVAL
+        store = get_task_store()
+        deadline = time.monotonic() + timeout
+        while True:
+            response = await self.comfyone.get_task_status(task_id)
+            if response['code'] != 0:
+                raise Exception(f"查询任务 {task_id} 状态失败: {response.get('msg')}")
+            task = store.apply_status(task_id, response['data'])
+            if task['status'] in TERMINAL_STATUSES:
+                return task
+            if time.monotonic() >= deadline:
+                raise Exception(f"等待任务 {task_id} 超时")
+            await asyncio.sleep(interval)
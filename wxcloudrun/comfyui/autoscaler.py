@@ -0,0 +1,247 @@
+import contextlib
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import config
+from ..comfyuione.comfyone import ComfyOne
+from ..comfyuione.task_events import TaskStore
+from ..coordination import advisory_lock
+from ..onethingai.watcher import get_instance_watcher
+from .drawing_tool import DrawingTool
+from .jobs import JobManager
+
+logger = logging.getLogger('log.autoscaler')
+
+# 实例状态
+BOOTING_STATUSES = (100, 200)
+RUNNING_STATUS = 300
+
+
+class Autoscaler:
+    """按排队深度伸缩 GPU 实例
+
+    排队深度 = 任务池中未完成的任务数 + 任务状态表中 ComfyOne 排队等待的任务数。
+    保持至少 min_warm 个实例，随排队增长扩容到 max_instances，
+    空闲超过 idle_seconds 后通过 stop/delete 释放多余实例。
+    扩容与 DrawingTool.ensure_backend 共用后端准备锁，锁内确认仍需扩容后才创建实例。
+    """
+
+    def __init__(self, job_manager: JobManager, task_store: TaskStore, min_warm: int, max_instances: int,
+                 jobs_per_instance: int, idle_seconds: int, interval: int):
+        self.job_manager = job_manager
+        self.task_store = task_store
+        self.min_warm = min_warm
+        self.max_instances = max_instances
+        self.jobs_per_instance = max(1, jobs_per_instance)
+        self.idle_seconds = idle_seconds
+        self.interval = interval
+
+        self._lock = threading.Lock()
+        # 正在启动或释放中的实例操作数，避免重复扩缩容
+        self._launching = 0
+        self._releasing = set()
+        self._last_busy_at = time.time()
+        self._decisions = deque(maxlen=config.AUTOSCALER_HISTORY)
+        self._app_image_id = None
+        self._app = None
+        self._started = False
+
+    def start(self, app=None):
+        """启动伸缩循环，传入 app 时扩容在其应用上下文中取得跨进程锁"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            self._app = app
+        threading.Thread(target=self._loop, name='gpu-autoscaler', daemon=True).start()
+
+    def queue_depth(self) -> int:
+        """当前排队深度"""
+        return self.job_manager.pending_count() + self.task_store.pending_count()
+
+    def desired_instances(self, queue_depth: int) -> int:
+        """根据排队深度计算期望的实例数"""
+        desired = math.ceil(queue_depth / self.jobs_per_instance)
+        return max(self.min_warm, min(self.max_instances, desired))
+
+    def _loop(self):
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                logger.warning("自动伸缩检查失败: %s", e)
+            time.sleep(self.interval)
+
+    def _list_instances(self, max_age: Optional[float] = None) -> List[Dict]:
+        if self._app_image_id is None:
+            self._app_image_id = DrawingTool().get_app_image_id()
+        max_age = self.interval if max_age is None else max_age
+        return [inst for inst in get_instance_watcher().instances(max_age=max_age)
+                if inst['appImageId'] == self._app_image_id]
+
+    def _active_count(self) -> int:
+        """最新实例列表中启动中与运行中（不含释放中）的实例数"""
+        instances = self._list_instances(max_age=0)
+        with self._lock:
+            return len([inst for inst in instances if inst['status'] in BOOTING_STATUSES
+                        or (inst['status'] == RUNNING_STATUS and inst['appId'] not in self._releasing)])
+
+    def tick(self):
+        """执行一次伸缩判断"""
+        started = time.time()
+        depth = self.queue_depth()
+        if depth > 0:
+            self._last_busy_at = started
+
+        instances = self._list_instances()
+        running = [inst['appId'] for inst in instances if inst['status'] == RUNNING_STATUS]
+        booting = [inst['appId'] for inst in instances if inst['status'] in BOOTING_STATUSES]
+        desired = self.desired_instances(depth)
+
+        with self._lock:
+            running = [app_id for app_id in running if app_id not in self._releasing]
+            # 创建请求发出到实例出现在列表中之间，用 _launching 补齐
+            active = len(running) + max(len(booting), self._launching)
+            idle_for = started - self._last_busy_at
+
+            if active < desired:
+                action = 'scale_up'
+                count = desired - active
+                self._launching += count
+            elif active > desired and not booting and idle_for >= self.idle_seconds:
+                action = 'scale_down'
+                targets = running[:active - desired]
+                count = len(targets)
+                self._releasing.update(targets)
+            else:
+                action = 'hold'
+                count = 0
+
+        if action == 'scale_up':
+            for _ in range(count):
+                threading.Thread(target=self._launch, args=(desired,), daemon=True).start()
+        elif action == 'scale_down':
+            for app_id in targets:
+                threading.Thread(target=self._release, args=(app_id,), daemon=True).start()
+
+        self._record({
+            'action': action,
+            'count': count,
+            'queue_depth': depth,
+            'running': len(running),
+            'booting': len(booting),
+            'desired': desired,
+            'idle_seconds': round(idle_for, 1),
+            'decision_ms': round((time.time() - started) * 1000, 1),
+        })
+
+    def _launch(self, desired: int):
+        started = time.time()
+        instance_id = None
+        skipped = False
+        error = None
+        app_context = self._app.app_context() if self._app is not None else contextlib.nullcontext()
+        try:
+            tool = DrawingTool()
+            with app_context:
+                # 等锁期间 ensure_backend 或其他进程可能已经创建了实例；创建后实例随即出现在实例列表中，
+                # 随后准备后端的请求会等待它启动，而不是再创建一台
+                with advisory_lock(config.PROVISION_LOCK_NAME, config.PROVISION_LOCK_TIMEOUT):
+                    if self._active_count() >= desired:
+                        skipped = True
+                    else:
+                        instance_id = tool.create_instance(self._app_image_id)
+            if instance_id:
+                tool.wait_for_boot(instance_id)
+                comfyone = ComfyOne.shared()
+                # ensure_backend 可能已复用该实例并注册了后端
+                if not any(backend.get('instance_id') == instance_id
+                           for backend in comfyone.list_backends().get('data', [])):
+                    comfyone.register_backend(instance_id)
+        except Exception as e:
+            error = str(e)
+        finally:
+            with self._lock:
+                self._launching -= 1
+        if skipped:
+            action = 'launch_skipped'
+        else:
+            action = 'launched' if instance_id and error is None else 'launch_failed'
+        self._record({
+            'action': action,
+            'instance_id': instance_id,
+            'error': error,
+            'duration_s': round(time.time() - started, 1),
+        })
+
+    def _release(self, app_id: str):
+        started = time.time()
+        error = None
+        try:
+            comfyone = ComfyOne.shared()
+            tool = DrawingTool()
+            for backend in comfyone.list_backends().get('data', []):
+                if backend.get('instance_id') == app_id:
+                    tool.delete_backend_instance(backend['name'])
+            tool.stop_and_release_instance(app_id)
+        except Exception as e:
+            error = str(e)
+        finally:
+            with self._lock:
+                self._releasing.discard(app_id)
+        self._record({
+            'action': 'released' if error is None else 'release_failed',
+            'instance_id': app_id,
+            'error': error,
+            'duration_s': round(time.time() - started, 1),
+        })
+
+    def _record(self, decision: Dict):
+        decision['at'] = time.time()
+        with self._lock:
+            self._decisions.append(decision)
+        if decision['action'] != 'hold':
+            logger.info("伸缩决策: %s", decision)
+
+    def stats(self) -> Dict:
+        """伸缩参数与最近的伸缩决策"""
+        with self._lock:
+            return {
+                'min_warm': self.min_warm,
+                'max_instances': self.max_instances,
+                'jobs_per_instance': self.jobs_per_instance,
+                'idle_seconds': self.idle_seconds,
+                'interval': self.interval,
+                'launching': self._launching,
+                'releasing': sorted(self._releasing),
+                'pending_tasks': self.task_store.pending_count(),
+                'decisions': list(self._decisions),
+            }
+
+
+_autoscaler = None
+_autoscaler_lock = threading.Lock()
+
+
+def get_autoscaler(job_manager: JobManager, task_store: TaskStore) -> Optional[Autoscaler]:
+    """获取进程内唯一的伸缩器，未开启时返回 None"""
+    global _autoscaler
+    if not config.AUTOSCALER_ENABLED:
+        return None
+    if _autoscaler is None:
+        with _autoscaler_lock:
+            if _autoscaler is None:
+                _autoscaler = Autoscaler(
+                    job_manager,
+                    task_store,
+                    min_warm=config.AUTOSCALER_MIN_WARM,
+                    max_instances=config.AUTOSCALER_MAX_INSTANCES,
+                    jobs_per_instance=config.AUTOSCALER_JOBS_PER_INSTANCE,
+                    idle_seconds=config.AUTOSCALER_IDLE_SECONDS,
+                    interval=config.AUTOSCALER_INTERVAL,
+                )
+    return _autoscaler
@@ -1,25 +1,389 @@
-from flask import jsonify
-from run import app
+import os
+import tempfile
+import time
+from flask import current_app, request, Response, stream_with_context, send_file
+from werkzeug.utils import secure_filename
+from wxcloudrun.response import make_json_response, dumps
+from ..comfyuione.task_events import get_task_store, get_task_event_bus, TERMINAL_STATUSES
+from ..comfyuione.uploads import get_image_uploader
+import config
 from .drawing_tool import DrawingTool
+from .jobs import get_job_manager, JobQueueFullError
+from .autoscaler import get_autoscaler
+from .workflow_templates import get_template_registry, workflow_hash
+from .image_cache import get_image_cache
+from .task_records import get_task_recorder
+from .result_cache import get_result_cache
+from ..users.service import UserService
+
+# 视图函数的路由注册在 wxcloudrun/routes.py 中
+
+
+def start_background_components():
+    """在首个请求到达时预加载工作流模板，并启动任务记录、任务事件消费与自动伸缩，避免在导入阶段创建后台线程"""
+    get_template_registry()
+    get_task_recorder().start(current_app._get_current_object())
+    bus = get_task_event_bus()
+    if bus is not None:
+        bus.start()
+    autoscaler = get_autoscaler(get_job_manager(), get_task_store())
+    if autoscaler is not None:
+        autoscaler.start(current_app._get_current_object())
+
+
+def _positive_int(params, name):
+    value = params.get(name)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        raise ValueError(f"{name} 必须是正整数")
+    return value
+
+
+def _owner(params, template):
+    """请求中的任务归属，写入 drawing_tasks
+
+    user_id 须为已存在的用户，order_id 须为该用户的订单，任务提交后订单关联到绘画记录
+
+    Raises:
+        ValueError: 归属参数无效
+    """
+    user_id = _positive_int(params, 'user_id')
+    order_id = _positive_int(params, 'order_id')
+    if user_id is not None and UserService.get_user(user_id) is None:
+        raise ValueError("用户不存在")
+    if order_id is not None and (user_id is None or UserService.get_user_order(user_id, order_id) is None):
+        raise ValueError("订单不存在或不属于该用户")
+    return {
+        'user_id': user_id,
+        'order_id': order_id,
+        'template': template
+    }
+
+
+def _workflow_job(workflow, owner=None):
+    """生成后台执行函数：准备实例并提交工作流任务"""
+    def run(job):
+        tool = DrawingTool()
+        return tool.create_workflow_task_base(workflow, on_stage=job.set_stage, owner=owner)
+    return run
+
 
-@app.route('/api/create_workflow_task_base', methods=['POST'])
 def create_workflow_task_base():
-    """API 接口：创建工作流任务"""
+    """API 接口：创建工作流任务
+
+    任务入队后立即返回 job_id，实例准备与提交在后台完成，
+    通过 /api/jobs/<job_id> 查询进度。
+    请求体可选：template 指定模板名（默认 base），params 为注入的参数，
+    如 {"seed": 1, "6.text": "提示词", "10.image": "上传后的图片名"}；
+    user_id、order_id 为任务归属，记录在绘画历史中。
+    deterministic 为 true 时复用相同工作流的结果：已完成的直接返回 taskId 与任务状态（200），
+    仍在执行的返回已有的 job_id 或 taskId，不再重复提交。结果在用户之间共享，
+    因此这类任务不记录 user_id、order_id，不出现在用户的绘画历史中，也不关联订单
+    """
+    params = request.get_json(silent=True) or {}
+    template = params.get('template', 'base')
+    try:
+        workflow = get_template_registry().prepare(template, params.get('params'))
+        owner = _owner(params, template)
+    except (KeyError, ValueError) as e:
+        return make_json_response({
+            'status': 'error',
+            'message': e.args[0]
+        }, 400)
+
     try:
-        # 初始化 DrawingTool
+        if params.get('deterministic'):
+            return _create_deterministic(workflow, owner)
+
+        job = get_job_manager().submit(_workflow_job(workflow, owner))
+
+        # 返回已受理响应
+        return make_json_response({
+            'status': 'accepted',
+            'job_id': job.id
+        }, 202)
+    except JobQueueFullError as e:
+        return make_json_response({
+            'status': 'error',
+            'message': str(e)
+        }, 503)
+    except Exception as e:
+        # 返回错误响应
+        return make_json_response({
+            'status': 'error',
+            'message': str(e)
+        }, 500)
+
+
+def _create_deterministic(workflow, owner):
+    """按工作流摘要复用结果，未命中时提交，本进程内相同的并发请求只提交一次
+
+    一个 taskId 只有一条 drawing_tasks 记录，复用的结果无法归属到每个请求者，任务记录不带归属
+    """
+    cache = get_result_cache()
+    owner = {'template': owner['template'], 'content_hash': workflow_hash(workflow.workflow)}
+    hit = cache.lookup(owner['content_hash'], DrawingTool().get_task_state)
+    if hit is not None:
+        kind, value = hit
+        if kind == 'job':
+            return make_json_response({
+                'status': 'accepted',
+                'job_id': value.id,
+                'attached': True
+            }, 202)
+        return make_json_response({
+            'status': 'success',
+            'cached': True,
+            'task_id': value['task_id'],
+            'task': value
+        }, 200)
+
+    job, attached = cache.submit_once(owner['content_hash'],
+                                      lambda: get_job_manager().submit(_workflow_job(workflow, owner)))
+    return make_json_response({
+        'status': 'accepted',
+        'job_id': job.id,
+        'attached': attached
+    }, 202)
+
+
+def _batch_job(workflows, owners=None):
+    """生成后台执行函数：准备一次实例并批量提交工作流任务"""
+    def run(job):
         tool = DrawingTool()
-        
-        # 调用 create_workflow_task_base 方法
-        task_id = tool.create_workflow_task_base()
-        
-        # 返回成功响应
-        return jsonify({
+        job.set_results(tool.create_workflow_tasks_batch(workflows, on_stage=job.set_stage, owners=owners))
+    return run
+
+
+def create_workflow_task_batch():
+    """API 接口：批量创建工作流任务
+
+    请求体：template 为默认模板名，items 为参数列表，
+    每项形如 {"params": {...}}，也可单独指定 template；user_id、order_id 为全部任务的归属。
+    所有工作流共用一个后端实例，结果通过 /api/jobs/<job_id> 的 results 查询
+    """
+    params = request.get_json(silent=True) or {}
+    items = params.get('items')
+    if not isinstance(items, list) or not items:
+        return make_json_response({
+            'status': 'error',
+            'message': '缺少items参数'
+        }, 400)
+    if len(items) > config.BATCH_MAX_ITEMS:
+        return make_json_response({
+            'status': 'error',
+            'message': f"items 最多 {config.BATCH_MAX_ITEMS} 项"
+        }, 400)
+
+    try:
+        owner = _owner(params, None)
+    except ValueError as e:
+        return make_json_response({
+            'status': 'error',
+            'message': e.args[0]
+        }, 400)
+
+    registry = get_template_registry()
+    default_template = params.get('template', 'base')
+    workflows = []
+    owners = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            return make_json_response({
+                'status': 'error',
+                'message': f"第 {index} 项必须是对象"
+            }, 400)
+        template = item.get('template', default_template)
+        try:
+            workflows.append(registry.prepare(template, item.get('params')))
+            owners.append(dict(owner, template=template))
+        except (KeyError, ValueError) as e:
+            return make_json_response({
+                'status': 'error',
+                'message': f"第 {index} 项参数错误: {e.args[0]}"
+            }, 400)
+
+    try:
+        job = get_job_manager().submit(_batch_job(workflows, owners), kind='batch')
+        return make_json_response({
+            'status': 'accepted',
+            'job_id': job.id
+        }, 202)
+    except JobQueueFullError as e:
+        return make_json_response({
+            'status': 'error',
+            'message': str(e)
+        }, 503)
+    except Exception as e:
+        return make_json_response({
+            'status': 'error',
+            'message': str(e)
+        }, 500)
+
+
+def get_job(job_id):
+    """API 接口：查询异步任务的阶段、taskId 与错误信息"""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return make_json_response({
+            'status': 'error',
+            'message': '任务不存在'
+        }, 404)
+    return make_json_response({
+        'status': 'success',
+        'job': job.to_dict()
+    }, 200)
+
+
+def get_autoscaler_stats():
+    """API 接口：查询自动伸缩参数与最近的伸缩决策及耗时"""
+    autoscaler = get_autoscaler(get_job_manager(), get_task_store())
+    if autoscaler is None:
+        return make_json_response({
+            'status': 'error',
+            'message': '自动伸缩未开启'
+        }, 404)
+    return make_json_response({
+        'status': 'success',
+        'autoscaler': autoscaler.stats()
+    }, 200)
+
+
+def get_result_cache_stats():
+    """API 接口：查询生成结果缓存的命中、挂载与淘汰次数"""
+    return make_json_response({
+        'status': 'success',
+        'result_cache': get_result_cache().stats()
+    }, 200)
+
+
+def get_task(task_id):
+    """API 接口：查询任务状态
+
+    优先使用本地任务状态表。传入 version 与 wait（秒）时为长轮询，
+    直到任务版本超过 version、任务结束或超时才返回。
+    """
+    try:
+        version = request.args.get('version', type=int)
+        wait = min(request.args.get('wait', 0, type=float), config.TASK_LONG_POLL_MAX)
+        if version is not None and wait > 0:
+            task = get_task_store().wait_for_change(task_id, version, wait)
+        else:
+            task = DrawingTool().get_task_state(task_id)
+        if task is None:
+            return make_json_response({
+                'status': 'error',
+                'message': '任务不存在'
+            }, 404)
+        return make_json_response({
             'status': 'success',
-            'task_id': task_id
-        }), 200
+            'task': task
+        }, 200)
     except Exception as e:
-        # 返回错误响应
-        return jsonify({
+        return make_json_response({
+            'status': 'error',
+            'message': str(e)
+        }, 500)
+
+
+def stream_task_events(task_id):
+    """API 接口：以 SSE 推送任务进度，任务结束后关闭连接"""
+    store = get_task_store()
+    if store.get(task_id) is None:
+        try:
+            task = DrawingTool().get_task_state(task_id)
+        except Exception as e:
+            return make_json_response({
+                'status': 'error',
+                'message': str(e)
+            }, 500)
+        if task is None:
+            return make_json_response({
+                'status': 'error',
+                'message': '任务不存在'
+            }, 404)
+
+    def generate():
+        version = -1
+        deadline = time.time() + config.TASK_SSE_MAX_DURATION
+        while time.time() < deadline:
+            task = store.wait_for_change(task_id, version, config.TASK_SSE_HEARTBEAT)
+            if task is None or task['version'] == version:
+                # 心跳，防止代理断开空闲连接
+                yield ': keep-alive\n\n'
+                continue
+            version = task['version']
+            yield f"id: {version}\nevent: {task['status']}\ndata: {dumps(task).decode('utf-8')}\n\n"
+            if task['status'] in TERMINAL_STATUSES:
+                return
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def get_task_image(task_id, index):
+    """API 接口：获取任务生成的图片
+
+    图片首次访问时从上游流式写入本地磁盘缓存，之后直接从磁盘发送，
+    支持 ETag 与 Range 请求
+    """
+    try:
+        images = DrawingTool().get_task_images(task_id)
+        if not images or index >= len(images):
+            return make_json_response({
+                'status': 'error',
+                'message': '图片不存在或任务未完成'
+            }, 404)
+        image = images[index]
+        url = image['url'] if isinstance(image, dict) else image
+        path, sha, content_type = get_image_cache().fetch(url)
+        # 内容按摘要寻址，永不变化
+        return send_file(path, mimetype=content_type, conditional=True, etag=sha,
+                         max_age=config.IMAGE_CACHE_MAX_AGE)
+    except Exception as e:
+        return make_json_response({
+            'status': 'error',
+            'message': str(e)
+        }, 500)
+
+
+def upload_images():
+    """API 接口：批量上传输入图片
+
+    表单字段 files 可包含多个文件。内容相同的文件只上传一次，
+    返回每个文件在服务器上的信息，可作为工作流参数使用
+    """
+    files = request.files.getlist('files')
+    if not files:
+        return make_json_response({
+            'status': 'error',
+            'message': '缺少files参数'
+        }, 400)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            paths = []
+            for index, storage in enumerate(files):
+                # 保留原文件名，服务器按文件名保存
+                name = secure_filename(storage.filename or '') or f'image_{index}'
+                path = os.path.join(directory, str(index))
+                os.makedirs(path)
+                path = os.path.join(path, name)
+                storage.save(path)
+                paths.append(path)
+            results = get_image_uploader().upload_many(paths)
+        return make_json_response({
+            'status': 'success',
+            'files': [{
+                'filename': files[index].filename,
+                'sha256': result['sha'],
+                'remote': result['remote'],
+                'cached': result['cached'],
+                'error': result['error']
+            } for index, result in enumerate(results)]
+        }, 200)
+    except Exception as e:
+        return make_json_response({
             'status': 'error',
             'message': str(e)
-        }), 500   
\ No newline at end of file
+        }, 500)
@@ -1,17 +1,52 @@
+import contextvars
+import logging
 from ..onethingai.onething_ai import OneThingAI
+from ..onethingai.watcher import get_instance_watcher, InstanceMissingError
 from ..comfyuione.comfyone import ComfyOne
-import time
+from ..comfyuione.task_events import (get_task_store, get_task_event_bus,
+                                      STATUS_ERROR, STATUS_FINISHED, TERMINAL_STATUSES)
+import config
 import requests
-import json
+from flask import has_app_context
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Union
+from .workflow_templates import get_template_registry, PreparedWorkflow
+from .workflow_registry import get_workflow_registry
+from .task_records import get_task_recorder, load_finished
+from ..metrics import stage_timer
+from ..coordination import SingleFlight, advisory_lock
+
+logger = logging.getLogger('log.drawing_tool')
+
+# 进程内合并并发的后端准备请求
+_provisioning = SingleFlight()
+
+# 按 workflow_id 提交失败时，表示工作流不存在（已在 ComfyOne 中删除）的错误码，
+# 响应体中的 code 与 HTTP 状态码均按此判断
+WORKFLOW_MISSING_CODES = (404,)
+
+
+def _workflow_missing(response: Dict) -> bool:
+    """submit_task 的失败响应是否表示 workflow_id 已失效"""
+    return response.get('code') in WORKFLOW_MISSING_CODES
+
+
+def submit_error_response(error: Exception) -> Dict:
+    """把 submit_task 抛出的异常转换为失败响应，HTTP 状态码作为 code"""
+    return {'code': getattr(error, 'status', None) or -1, 'msg': str(error)}
+
 
 class DrawingTool:
     """画画工具类，用于启动 OneThingAI 实例"""
     
     def __init__(self):
-        self.one_thing_ai = OneThingAI()
+        self.one_thing_ai = OneThingAI.shared()
+        self.watcher = get_instance_watcher()
 
     def send_mess(self, message):
         """发送消息"""
+        if not config.ALERT_WEBHOOK_URL:
+            return
         json = {
             "msgtype": "text",
             "text": {
@@ -21,185 +56,207 @@ class DrawingTool:
         header = {
             "Content-Type": "application/json"
         }
-        resp = requests.post(url='https://qyapi.weixin.qq.com/cgi-bin/webhook/send?key=3234d8bf-bb64-4e40-997e-9e756c232ad4', json=json, headers=header)
-        print(f"通知发送结果: {resp.status_code}")
+        resp = requests.post(url=config.ALERT_WEBHOOK_URL, json=json, headers=header)
+        logger.info("余额告警通知发送结果: %s", resp.status_code)
     
     def get_instance(self):
         """启动 OneThingAI 实例"""
         try:
             # 查询余额
-            print("开始查询账户余额...")
-            wallet_response = self.one_thing_ai.get_wallet()
-            balance = float(wallet_response['data']['availableBalance'])
-            print(f"当前余额: {balance}元")
-            
-            # 如果余额不足20元，发送通知
-            if balance < 20:
-                print("余额不足20元，发送通知...")
-                self.send_mess(f"当前余额不足20元，仅剩{balance}元，请及时充值。")
+            logger.debug("开始查询账户余额")
+            with stage_timer('wallet_check'):
+                wallet_response = self.one_thing_ai.get_wallet()
+                balance = float(wallet_response['data']['availableBalance'])
+                logger.debug("当前余额: %s元", balance)
+
+                # 如果余额不足20元，发送通知
+                if balance < 20:
+                    logger.warning("余额不足20元，发送通知，当前余额: %s元", balance)
+                    self.send_mess(f"当前余额不足20元，仅剩{balance}元，请及时充值。")
 
             # Step 1: 查询镜像
-            print("\n开始查询镜像列表...")
-            image_response = self.one_thing_ai.list_image()
-            app_image_id = image_response['data']['privateImageList'][0]['appImageId']
-            print(f"获取到的镜像 ID: {app_image_id}")
+            app_image_id = self.get_app_image_id()
             
             # 检查是否已有运行中的实例
-            print("\n开始查询实例列表...")
-            instances_response = self.one_thing_ai.list_instances()
-            instances = [inst for inst in instances_response['data']['appList'] 
-                        if inst['appImageId'] == app_image_id]
-            print(f"找到 {len(instances)} 个相关实例")
+            logger.debug("开始查询实例列表")
+            with stage_timer('instance_list'):
+                instances = [inst for inst in self.watcher.instances()
+                             if inst['appImageId'] == app_image_id]
             
             # 检查是否有启动中或运行中的实例
             running_instances = [inst for inst in instances if inst['status'] in [100, 200, 300]]
-            print(f"其中运行中或启动中的实例数: {len(running_instances)}")
+            logger.debug("找到 %d 个相关实例，其中运行中或启动中 %d 个", len(instances), len(running_instances))
             if running_instances:
                 instance = running_instances[0]
-                print(f"找到运行中实例，实例ID: {instance['appId']}, 状态: {instance['status']}")
+                logger.info("使用现有实例 %s，状态: %s", instance['appId'], instance['status'])
                 # 如果实例正在启动中,等待其完全启动
-                while instance['status'] == 100 or instance['status'] == 200:
-                    print("实例正在启动中，等待3秒...")
-                    time.sleep(3)
-                    instances_response = self.one_thing_ai.list_instances()
-                    instance = next(inst for inst in instances_response['data']['appList'] 
-                                  if inst['appId'] == instance['appId'])
-                    print(f"当前实例状态: {instance['status']}")
+                if instance['status'] == 100 or instance['status'] == 200:
+                    logger.info("实例 %s 正在启动中，等待启动完成", instance['appId'])
+                    with stage_timer('boot_wait'):
+                        instance = self.watcher.wait_until(
+                            instance['appId'],
+                            lambda inst: inst['status'] not in (100, 200),
+                            config.INSTANCE_BOOT_TIMEOUT)
+                    logger.info("实例 %s 当前状态: %s", instance['appId'], instance['status'])
                 return instance['appId']
             
             # 检查是否有停止中或已停止的实例
             stopped_instances = [inst for inst in instances if inst['status'] in [400, 800]]
-            print(f"\n停止中或已停止的实例数: {len(stopped_instances)}")
+            logger.debug("停止中或已停止的实例数: %d", len(stopped_instances))
             if stopped_instances:
                 instance = stopped_instances[0]
-                print(f"找到已停止实例，实例ID: {instance['appId']}, 状态: {instance['status']}")
+                logger.info("找到已停止实例 %s，状态: %s", instance['appId'], instance['status'])
                 # 如果实例正在停止中,等待其完全停止
-                while instance['status'] == 400:
-                    print("实例正在停止中，等待3秒...")
-                    time.sleep(3)
-                    instances_response = self.one_thing_ai.list_instances()
-                    instance = next(inst for inst in instances_response['data']['appList'] 
-                                  if inst['appId'] == instance['appId'])
-                    print(f"当前实例状态: {instance['status']}")
+                if instance['status'] == 400:
+                    logger.info("实例 %s 正在停止中，等待停止完成", instance['appId'])
+                    with stage_timer('stop_wait'):
+                        instance = self.watcher.wait_until(
+                            instance['appId'],
+                            lambda inst: inst['status'] != 400,
+                            config.INSTANCE_STOP_TIMEOUT)
+                    logger.info("实例 %s 当前状态: %s", instance['appId'], instance['status'])
                 # 释放后启动新实例
-                print(f"开始释放实例: {instance['appId']}")
-                self.one_thing_ai.delete_instance(instance['appId'])
+                logger.info("开始释放实例: %s", instance['appId'])
+                with stage_timer('instance_release'):
+                    self.one_thing_ai.delete_instance(instance['appId'])
+                self.watcher.invalidate()
             
-            print("\n开始创建新实例...")
-            # Step 2: 拉取资源
-            print("开始查询可用资源...")
-            resources_response = self.one_thing_ai.list_resources(app_image_id)
-            available_resources = [r for r in resources_response['data']['resourceList'] 
-                                   if r['gpuType'] in ["NVIDIA-GEFORCE-RTX-4090", "NVIDIA-GEFORCE-RTX-3090"] 
-                                   and r['maxGpuNum'] > 0]
-            if not available_resources:
-                print("没有找到可用的GPU资源")
-                return None
-            selected_resource = available_resources[0]
-            print(f"选择的资源: {selected_resource}")
-            
-            # Step 3: 创建实例
-            print("\n开始创建新实例...")
-            instance_config = {
-                "appImageId": app_image_id,
-                "gpuType": selected_resource['gpuType'],
-                "regionId": selected_resource['regionId'],
-                "billType": 3,
-                "duration": 1,
-                "gpuNum": 1
-            }
-            print(f"实例配置: {instance_config}")
-            create_instance_response = self.one_thing_ai.create_instance(instance_config)
-            instance_id = create_instance_response['data']['appId']
-            print(f"创建的实例 ID: {instance_id}")
-            
-            # Step 4: 等待实例启动
-            print("\n等待实例启动...")
-            while True:
-                time.sleep(3)
-                instance_status_response = self.one_thing_ai.list_instances()
-                instance = next((inst for inst in instance_status_response['data']['appList'] if inst['appId'] == instance_id), None)
-                status = instance['status']
-                print(f"实例状态: {status}")
-                if status == 300:
-                    print("实例启动成功")
-                    self.send_mess(f"有新实例启动成功")
-                    return instance['appId']
+            return self.launch_instance(app_image_id)
         except Exception as e:
-            print(f"\n发生异常: {str(e)}")
-            print(f"异常类型: {type(e).__name__}")
+            logger.warning("获取实例失败: %s: %s", type(e).__name__, e)
             raise
     
+    def get_app_image_id(self) -> str:
+        """查询私有镜像 ID"""
+        logger.debug("开始查询镜像列表")
+        with stage_timer('image_list'):
+            image_response = self.one_thing_ai.list_image()
+            app_image_id = image_response['data']['privateImageList'][0]['appImageId']
+        logger.debug("获取到的镜像 ID: %s", app_image_id)
+        return app_image_id
+
+    def launch_instance(self, app_image_id: str) -> Optional[str]:
+        """创建新实例并等待其启动完成，无可用资源时返回 None"""
+        instance_id = self.create_instance(app_image_id)
+        if instance_id is None:
+            return None
+        return self.wait_for_boot(instance_id)
+
+    def create_instance(self, app_image_id: str) -> Optional[str]:
+        """选择资源并创建新实例，不等待启动，无可用资源时返回 None"""
+        logger.info("开始创建新实例")
+        # Step 2: 拉取资源
+        logger.debug("开始查询可用资源")
+        with stage_timer('resource_select'):
+            instance_config = self.instance_config(app_image_id, self.one_thing_ai.list_resources(app_image_id))
+        if instance_config is None:
+            return None
+
+        # Step 3: 创建实例
+        with stage_timer('instance_create'):
+            create_instance_response = self.one_thing_ai.create_instance(instance_config)
+            instance_id = create_instance_response['data']['appId']
+        logger.info("创建的实例 ID: %s", instance_id)
+        self.watcher.invalidate()
+        return instance_id
+
+    @staticmethod
+    def instance_config(app_image_id: str, resources_response: Dict) -> Optional[Dict]:
+        """从资源列表中选择 GPU 资源，返回创建实例的配置，无可用资源时返回 None"""
+        available_resources = [r for r in resources_response['data']['resourceList']
+                               if r['gpuType'] in ["NVIDIA-GEFORCE-RTX-4090", "NVIDIA-GEFORCE-RTX-3090"]
+                               and r['maxGpuNum'] > 0]
+        if not available_resources:
+            logger.warning("没有找到可用的GPU资源")
+            return None
+        selected_resource = available_resources[0]
+        logger.debug("选择的资源: %s", selected_resource)
+        instance_config = {
+            "appImageId": app_image_id,
+            "gpuType": selected_resource['gpuType'],
+            "regionId": selected_resource['regionId'],
+            "billType": 3,
+            "duration": 1,
+            "gpuNum": 1
+        }
+        logger.debug("实例配置: %s", instance_config)
+        return instance_config
+
+    def wait_for_boot(self, instance_id: str) -> str:
+        """等待实例启动完成"""
+        # Step 4: 等待实例启动
+        logger.debug("等待实例 %s 启动", instance_id)
+        with stage_timer('boot_wait'):
+            instance = self.watcher.wait_until(
+                instance_id,
+                lambda inst: inst['status'] == 300,
+                config.INSTANCE_BOOT_TIMEOUT)
+        logger.info("实例 %s 启动成功", instance_id)
+        self.send_mess(f"有新实例启动成功")
+        return instance['appId']
+
     def stop_and_release_instance(self, instance_id: str):
         """停止并释放 OneThingAI 实例"""
         # 检查实例状态
-        instance_status_response = self.one_thing_ai.list_instances()
-        instance = next((inst for inst in instance_status_response['data']['appList'] if inst['appId'] == instance_id), None)
+        self.watcher.instances()
+        instance = self.watcher.get(instance_id)
         
         if not instance:
-            print("实例不存在")
+            logger.info("实例 %s 不存在", instance_id)
             return
             
         # 处理不同状态的实例
         status = instance['status']
         if status == 800:
-            print("实例已经是关机状态,直接释放资源")
+            logger.info("实例 %s 已经是关机状态，直接释放资源", instance_id)
             self.one_thing_ai.delete_instance(instance_id)
-            print("实例释放完成")
+            self.watcher.invalidate()
+            logger.info("实例 %s 释放完成", instance_id)
             return
         elif status == 300:
-            print(f"实例正在运行,开始停止实例: {instance_id}")
+            logger.info("实例 %s 正在运行，开始停止", instance_id)
             self.one_thing_ai.stop_instance(instance_id)
+            self.watcher.invalidate()
         else:
-            print(f"实例处于中间状态 {status},等待其变为可操作状态...")
-            while True:
-                time.sleep(3)
-                instance_status_response = self.one_thing_ai.list_instances()
-                instance = next((inst for inst in instance_status_response['data']['appList'] if inst['appId'] == instance_id), None)
-                if not instance:
-                    print("实例不存在")
-                    return
-                    
-                status = instance['status']
-                print(f"当前实例状态: {status}")
-                if status == 800:
-                    print("实例已关机,准备释放资源")
-                    self.one_thing_ai.delete_instance(instance_id)
-                    print("实例释放完成")
-                    return
-                elif status == 300:
-                    print("实例已运行,开始停止")
-                    self.one_thing_ai.stop_instance(instance_id)
-                    break
-        
-        # 等待实例停止
-        while True:
-            time.sleep(3)
-            instance_status_response = self.one_thing_ai.list_instances()
-            instance = next((inst for inst in instance_status_response['data']['appList'] if inst['appId'] == instance_id), None)
+            logger.info("实例 %s 处于中间状态 %s，等待其变为可操作状态", instance_id, status)
+            instance = self.watcher.wait_for_status(instance_id, (300, 800), config.INSTANCE_BOOT_TIMEOUT)
             if not instance:
-                print("实例不存在")
+                logger.info("实例 %s 不存在", instance_id)
                 return
                 
             status = instance['status']
-            print(f"实例状态: {status}")
+            logger.debug("实例 %s 当前状态: %s", instance_id, status)
             if status == 800:
-                print("实例已停止,准备释放资源")
-                break
+                logger.info("实例 %s 已关机，准备释放资源", instance_id)
+                self.one_thing_ai.delete_instance(instance_id)
+                self.watcher.invalidate()
+                logger.info("实例 %s 释放完成", instance_id)
+                return
+            logger.info("实例 %s 已运行，开始停止", instance_id)
+            self.one_thing_ai.stop_instance(instance_id)
+            self.watcher.invalidate()
+        
+        # 等待实例停止
+        instance = self.watcher.wait_for_status(instance_id, (800,), config.INSTANCE_STOP_TIMEOUT)
+        if not instance:
+            logger.info("实例 %s 不存在", instance_id)
+            return
+        logger.debug("实例 %s 已停止，准备释放资源", instance_id)
         
         # 释放实例
-        print(f"正在释放实例: {instance_id}")
+        logger.info("正在释放实例: %s", instance_id)
         self.one_thing_ai.delete_instance(instance_id)
-        print("实例释放完成")
+        self.watcher.invalidate()
+        logger.info("实例 %s 释放完成", instance_id)
 
     def create_backend_instance(self):
         """创建后端服务实例"""
         # 检查是否有正在运行的 OneThingAI 实例
         instance_id = self.get_instance()
-        print(f"获取到的 OneThingAI 实例 ID: {instance_id}")
+        logger.debug("获取到的 OneThingAI 实例 ID: %s", instance_id)
         
-        # 创建 ComfyOne 实例
-        comfyone = ComfyOne()
+        # 获取共享的 ComfyOne 客户端
+        comfyone = ComfyOne.shared()
         
         # 检查是否有运行中的 ComfyOne 实例
         backends_response = comfyone.list_backends()
@@ -207,138 +264,265 @@ class DrawingTool:
         
         if backends:
             backend_instance_id = backends[0]['name']
-            print(f"已有运行中的 ComfyOne 实例 ID: {backend_instance_id}")
+            logger.info("已有运行中的 ComfyOne 实例 ID: %s", backend_instance_id)
             return backend_instance_id
         else:
             # 创建新的 ComfyOne 实例
             new_backend_response = comfyone.register_backend(instance_id)
             new_backend_instance_id = new_backend_response['data'][0]['name']
-            print(f"创建新的 ComfyOne 实例 ID: {new_backend_instance_id}")
+            logger.info("创建新的 ComfyOne 实例 ID: %s", new_backend_instance_id)
             return new_backend_instance_id
     
     def delete_backend_instance(self, backend_instance_id: str):
         """删除后端服务实例"""
-        # 创建 ComfyOne 实例
-        comfyone = ComfyOne()
+        # 获取共享的 ComfyOne 客户端
+        comfyone = ComfyOne.shared()
         
         # 删除指定的 ComfyOne 实例
         try:
             response = comfyone._make_request("DELETE", f"/v1/backends/{backend_instance_id}")
-            print(f"删除 ComfyOne 实例 ID: {backend_instance_id} 成功")
+            logger.info("删除 ComfyOne 实例 ID: %s 成功", backend_instance_id)
             return response
         except Exception as e:
-            print(f"删除 ComfyOne 实例 ID: {backend_instance_id} 失败: {str(e)}")
+            logger.warning("删除 ComfyOne 实例 ID: %s 失败: %s", backend_instance_id, e)
             return None
     
-    def create_workflow_task_base(self):
-        """创建工作流任务"""
-        try:
-            print("\n=== 开始创建工作流任务 ===")
-            # 检查是否有后端服务实例
-            print("1. 开始检查后端服务实例...")
-            comfyone = ComfyOne()
+    def _check_backend(self, comfyone: ComfyOne) -> Optional[Dict]:
+        """查询第一个后端服务实例，没有时返回 None"""
+        with stage_timer('backend_check'):
             backends_response = comfyone.list_backends()
-            print(f"后端服务返回数据: {backends_response}")
-            backends = backends_response.get('data', [])
-            print(f"找到 {len(backends)} 个后端服务实例")
-            
-            if backends:
-                backend = backends[0]
-                print(f"\n当前后端实例状态:")
-                print(f"- 实例ID: {backend['name']}")
-                print(f"- is_live: {backend['is_live']}")
-                print(f"- is_down: {backend['is_down']}")
-                print(f"- status: {backend['status']}")
-                
-                # 检查实例状态
-                if not backend['is_live'] or backend['is_down'] or backend['status'] != 'running':
-                    print("\n2. 检测到后端服务实例状态异常，开始重建实例...")
-                    print(f"开始删除异常实例: {backend['name']}")
-                    # 删除异常的后端服务实例
-                    delete_response = self.delete_backend_instance(backend['name'])
-                    print(f"删除实例响应: {delete_response}")
-                    
-                    print("\n3. 开始获取新的 OneThingAI 实例...")
-                    # 获取 OneThingAI 实例 ID
-                    instance_id = self.get_instance()
-                    if not instance_id:
-                        raise Exception("无法创建 OneThingAI 实例")
-                    print(f"获取到新的 OneThingAI 实例 ID: {instance_id}")
-                        
-                    print("\n4. 开始注册新的后端服务实例...")
-                    # 创建新的后端服务实例
-                    register_response = comfyone.register_backend(instance_id)
-                    print(f"注册后端服务响应: {register_response}")
-                    backend_instance_id = register_response['data']['name']
-                    print(f"创建新的后端服务实例成功，ID: {backend_instance_id}")
-                else:
-                    print("\n2. 现有后端服务实例状态正常，继续使用...")
-                    backend_instance_id = backend['name']
-                    print(f"使用现有的后端服务实例 ID: {backend_instance_id}")
+        backends = backends_response.get('data', [])
+        logger.debug("找到 %d 个后端服务实例", len(backends))
+        if not backends:
+            return None
+        backend = backends[0]
+        logger.debug("当前后端实例 %s: is_live=%s, is_down=%s, status=%s",
+                     backend['name'], backend['is_live'], backend['is_down'], backend['status'])
+        return backend
+
+    @staticmethod
+    def is_healthy(backend: Dict) -> bool:
+        return backend['is_live'] and not backend['is_down'] and backend['status'] == 'running'
+
+    def ensure_backend(self, comfyone: ComfyOne, on_stage: Optional[Callable[[str], None]] = None) -> str:
+        """确保存在可用的后端服务实例，返回后端实例名称
+
+        需要准备实例时，同一进程内的并发调用共享一次准备过程，
+        不同进程与容器之间通过数据库锁串行，突发请求只启动一台实例。
+        """
+        report = on_stage or (lambda stage: None)
+
+        # 检查是否有后端服务实例
+        logger.debug("开始检查后端服务实例")
+        report('checking_backend')
+        backend = self._check_backend(comfyone)
+        if backend is not None and self.is_healthy(backend):
+            logger.debug("使用现有的后端服务实例 ID: %s", backend['name'])
+            return backend['name']
+
+        report('provisioning')
+        return _provisioning.do('backend', lambda: self._provision_backend(comfyone, report))
+
+    def _provision_backend(self, comfyone: ComfyOne, report: Callable[[str], None]) -> str:
+        """持有跨进程锁准备后端服务实例"""
+        with advisory_lock(config.PROVISION_LOCK_NAME, config.PROVISION_LOCK_TIMEOUT):
+            # 等锁期间其他进程可能已经准备好后端
+            backend = self._check_backend(comfyone)
+            if backend is not None:
+                if self.is_healthy(backend):
+                    logger.info("其他进程已准备好后端服务实例 ID: %s", backend['name'])
+                    return backend['name']
+                logger.warning("后端服务实例 %s 状态异常，开始重建: is_live=%s, is_down=%s, status=%s",
+                               backend['name'], backend['is_live'], backend['is_down'], backend['status'])
+                # 删除异常的后端服务实例
+                self.delete_backend_instance(backend['name'])
             else:
-                print("\n2. 未找到后端服务实例，开始创建新实例...")
-                # 如果没有后端服务实例，则创建一个
-                print("3. 开始获取 OneThingAI 实例...")
-                instance_id = self.get_instance()
-                if not instance_id:
-                    raise Exception("无法创建 OneThingAI 实例")
-                print(f"获取到 OneThingAI 实例 ID: {instance_id}")
-                    
-                print("\n4. 开始注册后端服务实例...")
+                logger.info("未找到后端服务实例，开始创建新实例")
+
+            logger.debug("开始获取 OneThingAI 实例")
+            # 获取 OneThingAI 实例 ID
+            with stage_timer('provision'):
+                try:
+                    instance_id = self.get_instance()
+                except InstanceMissingError as e:
+                    # 等待中的实例被删除或释放，重新选择或创建一次
+                    logger.warning("实例 %s 在等待期间消失，重新准备实例", e.app_id)
+                    instance_id = self.get_instance()
+            if not instance_id:
+                raise Exception("无法创建 OneThingAI 实例")
+            logger.debug("获取到 OneThingAI 实例 ID: %s", instance_id)
+
+            logger.debug("开始注册后端服务实例")
+            report('registering_backend')
+            with stage_timer('backend_register'):
                 register_response = comfyone.register_backend(instance_id)
-                print(f"注册后端服务响应: {register_response}")
-                backend_instance_id = register_response['data']['name']
-                print(f"创建新的后端服务实例成功，ID: {backend_instance_id}")
-            
-            print("\n5. 开始读取工作流配置文件...")
-            # 读取 base.json 文件内容
-            try:
-                with open('wxcloudrun/comfyui/jsons/base.json', 'r', encoding='utf-8') as file:
-                    base_data = json.load(file)
-                print("工作流配置文件读取成功")
-            except Exception as e:
-                print(f"读取工作流配置文件失败: {str(e)}")
-                raise
-            
-            print("\n6. 开始提交工作流任务...")
-            # 提交任务
-            task_response = comfyone.submit_workflow_task(base_data)
-            print(f"任务提交响应: {task_response}")
+            backend_instance_id = register_response['data']['name']
+            logger.info("创建新的后端服务实例成功，ID: %s", backend_instance_id)
+            return backend_instance_id
+
+    def registered_workflow_id(self, comfyone: ComfyOne, prepared: PreparedWorkflow) -> Optional[str]:
+        """获取可按 workflow_id 提交的工作流 ID，不可用时返回 None"""
+        if prepared.inputs is None or not config.WORKFLOW_REGISTRY_ENABLED:
+            return None
+        try:
+            return get_workflow_registry().workflow_id(comfyone, prepared.template)
+        except Exception as e:
+            logger.warning("注册工作流 %s 失败，提交完整工作流: %s", prepared.template.name, e)
+            return None
+
+    def submit_workflow(self, comfyone: ComfyOne, workflow: Union[Dict, PreparedWorkflow],
+                        owner: Optional[Dict] = None) -> str:
+        """提交工作流任务，返回任务 ID
+
+        workflow 为 PreparedWorkflow 且参数全部是模板声明的输入时，按注册的 workflow_id 只提交 inputs，
+        否则提交完整工作流。
+        owner 可包含 user_id、order_id、template、content_hash，随任务记录写入 drawing_tasks
+        """
+        prepared = workflow if isinstance(workflow, PreparedWorkflow) else None
+        workflow_id = self.registered_workflow_id(comfyone, prepared) if prepared is not None else None
+        with stage_timer('submit'):
+            task_response = None
+            if workflow_id is not None:
+                try:
+                    task_response = comfyone.submit_task(workflow_id, prepared.inputs)
+                except Exception as e:
+                    task_response = submit_error_response(e)
+                if task_response.get('code') != 0:
+                    self.submit_task_failed(workflow_id, prepared, task_response)
+                    task_response = None
+            if task_response is None:
+                task_response = comfyone.submit_workflow_task(prepared.workflow if prepared else workflow)
             task_id = task_response['data']['taskId']
-            print(f"提交任务成功，任务 ID: {task_id}")
-            
-            return task_id
-            
+        logger.info("提交任务成功，任务 ID: %s", task_id)
+        self.record_submitted(task_id, owner)
+        return task_id
+
+    @staticmethod
+    def submit_task_failed(workflow_id: str, prepared: PreparedWorkflow, response: Dict):
+        """按 workflow_id 提交失败，调用方随后提交完整工作流
+
+        只有 workflow_id 已失效时才重新注册，繁忙、配额等临时错误不重新注册
+        """
+        logger.warning("按 workflow_id %s 提交失败: %s，提交完整工作流", workflow_id, response.get('msg'))
+        if _workflow_missing(response):
+            get_workflow_registry().invalidate(prepared.template)
+
+    @staticmethod
+    def record_submitted(task_id: str, owner: Optional[Dict] = None):
+        """在本地状态表中跟踪刚提交的任务，并写入 drawing_tasks"""
+        task = get_task_store().track(task_id)
+        get_task_recorder().submitted(task_id, submitted_at=task['submitted_at'], **(owner or {}))
+
+    def create_workflow_task_base(self, workflow: Optional[Dict] = None,
+                                  on_stage: Optional[Callable[[str], None]] = None,
+                                  owner: Optional[Dict] = None):
+        """创建工作流任务
+
+        Args:
+            workflow: 已注入参数的工作流（Dict 或 PreparedWorkflow），默认使用 base 模板
+            on_stage: 阶段回调，异步任务通过它上报当前执行阶段
+            owner: 任务归属，见 submit_workflow
+        """
+        report = on_stage or (lambda stage: None)
+        try:
+            # 从检查后端到提交完成的总耗时
+            with stage_timer('pipeline'):
+                logger.debug("开始创建工作流任务")
+                comfyone = ComfyOne.shared()
+                self.ensure_backend(comfyone, on_stage)
+
+                if workflow is None:
+                    # 使用预加载的 base 模板
+                    workflow = get_template_registry().prepare('base')
+
+                logger.debug("开始提交工作流任务")
+                report('submitting')
+                return self.submit_workflow(comfyone, workflow, owner)
+
         except Exception as e:
-            print(f"\n=== 创建工作流任务失败 ===")
-            print(f"错误类型: {type(e).__name__}")
-            print(f"错误信息: {str(e)}")
-            if hasattr(e, 'response'):
-                print(f"API响应: {e.response.text if hasattr(e.response, 'text') else '无响应内容'}")
+            logger.warning("创建工作流任务失败: %s: %s", type(e).__name__, e)
+            if getattr(e, 'response', None) is not None:
+                logger.debug("上游响应: %s", getattr(e.response, 'text', '无响应内容'))
             raise
-    
+
+    def create_workflow_tasks_batch(self, workflows: List[Union[Dict, PreparedWorkflow]],
+                                    on_stage: Optional[Callable[[str], None]] = None,
+                                    owners: Optional[List[Dict]] = None) -> List[Dict]:
+        """批量创建工作流任务
+
+        只准备一次后端服务实例，再以有界并发提交全部工作流。
+        单个工作流提交失败不影响其他工作流，错误记录在对应结果中。
+        owners 与 workflows 一一对应，记录每个任务的归属。
+
+        Returns:
+            与 workflows 一一对应的结果列表，每项包含 index、task_id、error
+        """
+        report = on_stage or (lambda stage: None)
+        logger.info("开始批量创建工作流任务，共 %d 个", len(workflows))
+        comfyone = ComfyOne.shared()
+        self.ensure_backend(comfyone, on_stage)
+
+        report('submitting')
+
+        def submit(index: int, workflow: Dict) -> Dict:
+            try:
+                owner = owners[index] if owners else None
+                return {'index': index, 'task_id': self.submit_workflow(comfyone, workflow, owner), 'error': None}
+            except Exception as e:
+                logger.warning("第 %d 个工作流提交失败: %s", index, e)
+                return {'index': index, 'task_id': None, 'error': str(e)}
+
+        # 提交线程沿用当前的日志关联 ID
+        context = contextvars.copy_context()
+        max_workers = max(1, min(config.BATCH_CONCURRENCY, len(workflows)))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='batch-submit') as executor:
+            return list(executor.map(lambda index, workflow: context.copy().run(submit, index, workflow),
+                                     range(len(workflows)), workflows))
+
+    def get_task_state(self, task_id: str) -> Optional[Dict]:
+        """查询任务状态
+
+        优先使用 WebSocket 事件维护的本地状态表；本地没有时读取 drawing_tasks 中已结束的记录，
+        载入本地状态表后在 TASK_STORE_TTL 内直接从内存返回
+        """
+        store = get_task_store()
+        task = store.get(task_id)
+        if task is not None:
+            if task['status'] == STATUS_ERROR or (task['status'] == STATUS_FINISHED and task['images'] is not None):
+                return task
+            # 事件消费者运行时，未结束任务的进度以推送为准；长时间没有推送的任务查询上游
+            bus = get_task_event_bus()
+            if (task['status'] not in TERMINAL_STATUSES and bus is not None and bus.running
+                    and not store.is_stale(task)):
+                return task
+        elif has_app_context():
+            # 其他进程提交或已从内存清理的任务
+            record = load_finished(task_id)
+            if record is not None:
+                return store.apply_record(record)
+
+        # 本地未知，或已完成但尚未取得图片地址时查询一次上游
+        task_status_response = ComfyOne.shared().get_task_status(task_id)
+        if task_status_response['code'] != 0:
+            logger.warning("查询任务 %s 状态失败，错误码: %s，信息: %s",
+                           task_id, task_status_response['code'], task_status_response['msg'])
+            return None
+        return store.apply_status(task_id, task_status_response['data'])
+
     def get_task_images(self, task_id: str):
         """通过 taskId 查询任务状态并获取图片"""
-        # 创建 ComfyOne 实例
-        comfyone = ComfyOne()
-        
         # 查询任务状态
         try:
-            task_status_response = comfyone.get_task_status(task_id)
-            if task_status_response['code'] == 0:
-                task_data = task_status_response['data']
-                if task_data['status'] == 'finished' and task_data['message'] == 'success':
-                    images = task_data['images']
-                    print(f"任务 {task_id} 完成，获取到的图片: {images}")
-                    return images
-                else:
-                    print(f"任务 {task_id} 未完成或失败，状态: {task_data['status']}，信息: {task_data['message']}")
-                    return None
+            task = self.get_task_state(task_id)
+            if task is None:
+                return None
+            if task['status'] == STATUS_FINISHED:
+                images = task['images']
+                logger.debug("任务 %s 完成，获取到 %d 张图片", task_id, len(images or []))
+                return images
             else:
-                print(f"查询任务 {task_id} 状态失败，错误码: {task_status_response['code']}，信息: {task_status_response['msg']}")
+                logger.debug("任务 %s 未完成或失败，状态: %s，信息: %s", task_id, task['status'], task['message'])
                 return None
         except Exception as e:
-            print(f"查询任务 {task_id} 状态时发生异常: {str(e)}")
+            logger.warning("查询任务 %s 状态时发生异常: %s", task_id, e)
             return None
-        
-    
\ No newline at end of file
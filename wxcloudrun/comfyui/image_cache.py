@@ -0,0 +1,170 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import config
+from ..comfyuione.comfyone import ComfyOne
+
+logger = logging.getLogger('log.image_cache')
+
+INDEX_FILE = 'index.json'
+
+
+class ImageCache:
+    """按内容寻址的生成图片磁盘缓存
+
+    图片以 sha256 命名存放，上游 URL 到摘要的映射持久化在 index.json 中。
+    下载时分块写入临时文件，不在内存中缓存整张图片；
+    超过容量上限时按最近访问顺序淘汰。
+    """
+
+    def __init__(self, directory: str, max_bytes: int, chunk_size: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # 上游 URL -> {'sha': 摘要, 'content_type': 类型}
+        self._index: Dict[str, Dict] = {}
+        # 摘要 -> 文件大小，按最近访问排序
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        # 正在下载的 URL，同一 URL 只下载一次
+        self._inflight: Dict[str, threading.Event] = {}
+        self._load()
+
+    def _path(self, sha: str) -> str:
+        return os.path.join(self.directory, sha)
+
+    def _load(self):
+        """从磁盘恢复索引，按文件修改时间重建访问顺序"""
+        index_path = os.path.join(self.directory, INDEX_FILE)
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, 'r', encoding='utf-8') as file:
+                    self._index = json.load(file)
+            except (OSError, ValueError) as e:
+                logger.warning("读取图片缓存索引失败: %s", e)
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and len(entry.name) == 64:
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, sha, size in sorted(files):
+            self._entries[sha] = size
+            self._size += size
+        self._index = {url: item for url, item in self._index.items() if item['sha'] in self._entries}
+
+    def _save_index(self):
+        """持久化索引，调用方需持有锁"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.index')
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(self._index, file)
+        os.replace(tmp_path, os.path.join(self.directory, INDEX_FILE))
+
+    def lookup(self, url: str) -> Optional[Tuple[str, str, str]]:
+        """查询缓存，命中时返回 (文件路径, 摘要, 类型)"""
+        with self._lock:
+            item = self._index.get(url)
+            if item is None or item['sha'] not in self._entries:
+                return None
+            self._entries.move_to_end(item['sha'])
+        path = self._path(item['sha'])
+        try:
+            # 更新修改时间，重启后仍能保持访问顺序
+            os.utime(path)
+        except OSError:
+            return None
+        return path, item['sha'], item['content_type']
+
+    def fetch(self, url: str) -> Tuple[str, str, str]:
+        """获取图片，未命中时从上游流式下载
+
+        Returns:
+            (文件路径, 摘要, 类型)
+        """
+        while True:
+            cached = self.lookup(url)
+            if cached is not None:
+                return cached
+            with self._lock:
+                event = self._inflight.get(url)
+                if event is None:
+                    event = self._inflight[url] = threading.Event()
+                    break
+            # 其他线程正在下载同一张图片，等待其完成后重新查询
+            event.wait(60)
+        try:
+            return self._download(url)
+        finally:
+            with self._lock:
+                self._inflight.pop(url, None)
+            event.set()
+
+    def _download(self, url: str) -> Tuple[str, str, str]:
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as file, ComfyOne.shared().open_image_stream(url) as response:
+                content_type = response.headers.get('Content-Type', 'application/octet-stream')
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    digest.update(chunk)
+                    file.write(chunk)
+                    size += len(chunk)
+            sha = digest.hexdigest()
+            path = self._path(sha)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            if sha not in self._entries:
+                self._entries[sha] = size
+                self._size += size
+            self._entries.move_to_end(sha)
+            self._index[url] = {'sha': sha, 'content_type': content_type}
+            self._evict()
+            self._save_index()
+        return path, sha, content_type
+
+    def _evict(self):
+        """按最近访问顺序淘汰，调用方需持有锁"""
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            sha, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(self._path(sha))
+            except OSError:
+                pass
+            self._index = {url: item for url, item in self._index.items() if item['sha'] != sha}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'files': len(self._entries), 'bytes': self._size, 'max_bytes': self.max_bytes}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_image_cache() -> ImageCache:
+    """获取进程内唯一的图片缓存"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ImageCache(
+                    directory=config.IMAGE_CACHE_DIR,
+                    max_bytes=config.IMAGE_CACHE_MAX_BYTES,
+                    chunk_size=config.IMAGE_CACHE_CHUNK_SIZE,
+                )
+    return _cache
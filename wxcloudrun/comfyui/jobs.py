@@ -0,0 +1,168 @@
+import contextlib
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from flask import current_app, has_app_context
+
+import config
+from ..logs import correlation, request_id_var
+
+logger = logging.getLogger('log.jobs')
+
+# 任务阶段
+STAGE_QUEUED = 'queued'
+STAGE_SUBMITTED = 'submitted'
+STAGE_FAILED = 'failed'
+
+TERMINAL_STAGES = (STAGE_SUBMITTED, STAGE_FAILED)
+
+
+class JobQueueFullError(Exception):
+    """任务队列已满"""
+
+
+class Job:
+    """一次异步绘画任务的执行状态"""
+
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.stage = STAGE_QUEUED
+        self.task_id = None
+        self.results = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.stages = [{'stage': STAGE_QUEUED, 'at': self.created_at}]
+        self._lock = threading.Lock()
+
+    def set_stage(self, stage: str):
+        """更新当前阶段"""
+        with self._lock:
+            self.stage = stage
+            self.updated_at = time.time()
+            self.stages.append({'stage': stage, 'at': self.updated_at})
+
+    def succeed(self, task_id: str):
+        """任务已提交到 ComfyOne"""
+        with self._lock:
+            self.task_id = task_id
+        self.set_stage(STAGE_SUBMITTED)
+
+    def set_results(self, results: List[Dict]):
+        """记录批量任务中每一项的 taskId 或错误"""
+        with self._lock:
+            self.results = results
+
+    def fail(self, error: str):
+        """任务执行失败"""
+        with self._lock:
+            self.error = error
+        self.set_stage(STAGE_FAILED)
+
+    @property
+    def finished(self) -> bool:
+        return self.stage in TERMINAL_STAGES
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                'job_id': self.id,
+                'kind': self.kind,
+                'stage': self.stage,
+                'task_id': self.task_id,
+                'results': self.results,
+                'error': self.error,
+                'created_at': self.created_at,
+                'updated_at': self.updated_at,
+                'stages': list(self.stages),
+            }
+
+
+class JobManager:
+    """进程内的有界任务池
+
+    请求线程只负责入队，实例准备与任务提交在后台线程中完成。
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, ttl: int):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='drawing-job')
+        self._jobs: Dict[str, Job] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, func: Callable[[Job], Optional[str]], kind: str = 'workflow') -> Job:
+        """提交一个任务
+
+        Args:
+            func: 在后台执行的函数，接收 Job 用于上报阶段，返回 ComfyOne taskId，
+                批量任务通过 Job.set_results 记录结果并返回 None
+            kind: 任务类型
+        Raises:
+            JobQueueFullError: 未完成的任务数已达到上限
+        """
+        job = Job(kind)
+        with self._lock:
+            self._prune()
+            if self._pending >= self.max_pending:
+                raise JobQueueFullError(f"任务队列已满，当前排队任务数: {self._pending}")
+            self._pending += 1
+            self._jobs[job.id] = job
+        # 后台线程不继承请求上下文，显式传递关联 ID 与应用（数据库锁等需要应用上下文）
+        app = current_app._get_current_object() if has_app_context() else None
+        self._executor.submit(self._run, job, func, request_id_var.get(), app)
+        return job
+
+    def _run(self, job: Job, func: Callable[[Job], Optional[str]], request_id: Optional[str] = None, app=None):
+        app_context = app.app_context() if app is not None else contextlib.nullcontext()
+        with app_context, correlation(request_id=request_id, job_id=job.id):
+            try:
+                task_id = func(job)
+                job.succeed(task_id)
+            except Exception as e:
+                logger.warning("后台任务 %s 执行失败: %s", job.id, e)
+                job.fail(str(e))
+            finally:
+                with self._lock:
+                    self._pending -= 1
+
+    def _prune(self):
+        """清理过期的已完成任务，调用方需持有锁"""
+        deadline = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and job.updated_at < deadline]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending_count(self) -> int:
+        """排队中与执行中的任务数"""
+        with self._lock:
+            return self._pending
+
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """获取进程内唯一的任务池"""
+    global _job_manager
+    if _job_manager is None:
+        with _job_manager_lock:
+            if _job_manager is None:
+                _job_manager = JobManager(
+                    max_workers=config.JOB_WORKERS,
+                    max_pending=config.JOB_MAX_PENDING,
+                    ttl=config.JOB_TTL,
+                )
+    return _job_manager
@@ -0,0 +1,16 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from wxcloudrun import db
+
+class RegisteredWorkflow(db.Model):
+    """已在 ComfyOne 注册的工作流模板，模板内容摘要不变时复用 workflow_id"""
+    __tablename__ = 'comfy_workflows'
+    __table_args__ = (
+        Index('ix_comfy_workflows_name_hash', 'name', 'content_hash', unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(64), nullable=False)  # 模板名
+    content_hash = Column(String(64), nullable=False)  # 模板文件内容的 SHA-256
+    workflow_id = Column(String(64), nullable=False)  # ComfyOne 返回的工作流 ID
+    created_at = Column(DateTime, default=datetime.now)
@@ -0,0 +1,166 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy.exc import SQLAlchemyError
+
+import config
+from wxcloudrun import db
+from .jobs import Job
+from ..comfyuione.task_events import STATUS_PENDING, STATUS_RUNNING, STATUS_FINISHED, TERMINAL_STATUSES
+from ..users.models import DrawingTask
+
+
+class ResultCache:
+    """按工作流摘要复用生成结果
+
+    已完成的结果在保留期内直接复用：进程内 LRU 缓存 摘要 -> taskId，
+    未命中时按 content_hash 查询 drawing_tasks，其他进程提交的结果同样可用。
+    相同工作流仍在执行时，新请求挂到已有的任务上，不再重复提交；
+    提交超过 inflight_max_age 秒仍未结束的任务不再挂载。
+    """
+
+    def __init__(self, max_size: int, ttl: float, inflight_max_age: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.inflight_max_age = inflight_max_age
+        self._lock = threading.Lock()
+        # 摘要 -> (taskId, 过期时间)
+        self._results: "OrderedDict[str, tuple]" = OrderedDict()
+        # 摘要 -> 本进程中尚未结束的 Job
+        self._inflight: Dict[str, Job] = {}
+        self.hits = 0
+        self.attached = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def put(self, content_hash: str, task_id: str, finished_at: Optional[float] = None):
+        """记录已完成的结果，保留期从任务完成时算起"""
+        expires_at = (finished_at or time.time()) + self.ttl
+        if expires_at <= time.time():
+            return
+        with self._lock:
+            self._results[content_hash] = (task_id, expires_at)
+            self._results.move_to_end(content_hash)
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+                self.evictions += 1
+
+    def _get_result(self, content_hash: str) -> Optional[str]:
+        """调用方需持有锁"""
+        entry = self._results.get(content_hash)
+        if entry is None:
+            return None
+        task_id, expires_at = entry
+        if expires_at < time.time():
+            del self._results[content_hash]
+            return None
+        self._results.move_to_end(content_hash)
+        return task_id
+
+    def lookup(self, content_hash: str, get_state: Callable[[str], Optional[Dict]]) -> Optional[Tuple]:
+        """查找可复用的结果
+
+        Args:
+            get_state: 按 taskId 查询任务当前状态
+        Returns:
+            ('job', Job) 本进程中相同工作流仍在准备或提交；
+            ('task', 任务状态) 已完成或仍在执行的相同任务；没有可复用的结果时返回 None
+        """
+        with self._lock:
+            task_id = self._get_result(content_hash)
+            job = self._inflight.get(content_hash)
+            if task_id is None and job is not None:
+                if not job.finished:
+                    self.attached += 1
+                    return 'job', job
+                task_id = job.task_id
+                del self._inflight[content_hash]
+
+        if task_id is None:
+            task_id = self._find_task(content_hash)
+        task = get_state(task_id) if task_id is not None else None
+        if task is None or task['status'] not in (STATUS_PENDING, STATUS_RUNNING, STATUS_FINISHED) \
+                or (task['status'] != STATUS_FINISHED and self._stale(task)):
+            # 失败的任务与长时间未结束的任务不复用
+            with self._lock:
+                self.misses += 1
+            return None
+
+        if task['status'] == STATUS_FINISHED:
+            self.put(content_hash, task_id, task.get('finished_at'))
+            with self._lock:
+                self.hits += 1
+        else:
+            with self._lock:
+                self.attached += 1
+        return 'task', task
+
+    def _stale(self, task: Dict) -> bool:
+        submitted_at = task.get('submitted_at')
+        return submitted_at is not None and submitted_at < time.time() - self.inflight_max_age
+
+    @db.read_only
+    def _find_task(self, content_hash: str) -> Optional[str]:
+        """查询最近一次相同工作流的任务：保留期内完成的或 inflight_max_age 内提交且仍在执行的"""
+        now = datetime.now()
+        deadline = now - timedelta(seconds=self.ttl)
+        submitted_after = now - timedelta(seconds=self.inflight_max_age)
+        try:
+            record = DrawingTask.query.filter(
+                DrawingTask.content_hash == content_hash,
+                db.or_(db.and_(DrawingTask.status.notin_(TERMINAL_STATUSES),
+                               DrawingTask.submitted_at >= submitted_after),
+                       db.and_(DrawingTask.status == STATUS_FINISHED, DrawingTask.finished_at >= deadline))
+            ).order_by(DrawingTask.id.desc()).first()
+        except SQLAlchemyError:
+            return None
+        return record.task_id if record is not None else None
+
+    def submit_once(self, content_hash: str, submit: Callable[[], Job]) -> Tuple[Job, bool]:
+        """同一摘要在本进程中只提交一次
+
+        Returns:
+            (Job, 是否挂到了已有的 Job 上)
+        """
+        with self._lock:
+            job = self._inflight.get(content_hash)
+            if job is not None and not job.finished:
+                self.attached += 1
+                return job, True
+            job = submit()
+            # 已结束的 Job 其任务已写入 drawing_tasks，不再需要保留
+            for key in [key for key, item in self._inflight.items() if item.finished]:
+                del self._inflight[key]
+            self._inflight[content_hash] = job
+            return job, False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'size': len(self._results),
+                'inflight': len(self._inflight),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'attached': self.attached,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """获取进程内唯一的结果缓存"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache(max_size=config.RESULT_CACHE_SIZE, ttl=config.RESULT_CACHE_TTL,
+                                     inflight_max_age=config.RESULT_CACHE_INFLIGHT_MAX_AGE)
+    return _cache
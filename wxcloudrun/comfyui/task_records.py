@@ -0,0 +1,181 @@
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from wxcloudrun import db
+from ..comfyuione.comfyone import ComfyOne
+from ..comfyuione.task_events import (get_task_store, TaskStore, STATUS_FINISHED,
+                                      TERMINAL_STATUSES)
+from ..users.models import DrawingTask, Order
+
+logger = logging.getLogger('log.task_records')
+
+
+def _to_datetime(timestamp: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(timestamp) if timestamp is not None else None
+
+
+def _to_timestamp(value: Optional[datetime]) -> Optional[float]:
+    return value.timestamp() if value is not None else None
+
+
+def record_to_dict(record: DrawingTask) -> Dict:
+    """数据库记录转为与 TaskStore 相同字段的字典"""
+    return {
+        'id': record.id,
+        'task_id': record.task_id,
+        'user_id': record.user_id,
+        'order_id': record.order_id,
+        'template': record.template,
+        'content_hash': record.content_hash,
+        'status': record.status,
+        'message': record.message,
+        'images': json.loads(record.images) if record.images else None,
+        'submitted_at': _to_timestamp(record.submitted_at),
+        'started_at': _to_timestamp(record.started_at),
+        'finished_at': _to_timestamp(record.finished_at),
+    }
+
+
+@db.read_only
+def load_finished(task_id: str) -> Optional[Dict]:
+    """读取已结束且结果完整的任务记录，未记录或未结束时返回 None"""
+    try:
+        record = DrawingTask.query.filter_by(task_id=task_id).first()
+    except SQLAlchemyError as e:
+        logger.warning("读取任务 %s 记录失败: %s", task_id, e)
+        return None
+    if record is None or record.status not in TERMINAL_STATUSES:
+        return None
+    if record.status == STATUS_FINISHED and not record.images:
+        return None
+    return record_to_dict(record)
+
+
+class TaskRecorder:
+    """把任务的提交与结束写入 drawing_tasks
+
+    写入在单个后台线程中按顺序执行，不阻塞请求线程与事件消费；
+    每次写入在独立的应用上下文中完成，结束后释放数据库会话。
+    """
+
+    def __init__(self, store: TaskStore):
+        self.store = store
+        self._app = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='task-recorder')
+        self._lock = threading.Lock()
+
+    def start(self, app):
+        """绑定应用并开始监听任务结束，可重复调用"""
+        with self._lock:
+            if self._app is not None:
+                return
+            self._app = app
+        self.store.add_listener(self._on_finished)
+
+    def submitted(self, task_id: str, user_id: Optional[int] = None, order_id: Optional[int] = None,
+                  template: Optional[str] = None, content_hash: Optional[str] = None,
+                  submitted_at: Optional[float] = None):
+        """记录刚提交的任务"""
+        self._enqueue(self._insert, task_id, user_id, order_id, template, content_hash, submitted_at)
+
+    def _on_finished(self, task: Dict):
+        self._enqueue(self._finish, task)
+
+    def _enqueue(self, func, *args):
+        if self._app is None:
+            logger.debug("任务记录未启用，跳过 %s", func.__name__)
+            return
+        self._executor.submit(self._run, func, *args)
+
+    def _run(self, func, *args):
+        with self._app.app_context():
+            try:
+                func(*args)
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                logger.warning("写入任务记录失败: %s", e)
+            except Exception as e:
+                logger.warning("写入任务记录失败: %s: %s", type(e).__name__, e)
+
+    def _insert(self, task_id: str, user_id: Optional[int], order_id: Optional[int],
+                template: Optional[str], content_hash: Optional[str], submitted_at: Optional[float]):
+        record = DrawingTask(task_id=task_id, user_id=user_id, order_id=order_id, template=template,
+                             content_hash=content_hash, status='pending',
+                             submitted_at=_to_datetime(submitted_at))
+        db.session.add(record)
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            record = DrawingTask.query.filter_by(task_id=task_id).first()
+            if record is None:
+                # 不是 task_id 重复，而是归属无效（如用户已被删除），不带归属写入，保留任务记录
+                logger.warning("任务 %s 的归属无效，不带归属写入: %s", task_id, e.orig)
+                user_id = order_id = None
+                record = DrawingTask(task_id=task_id, template=template, content_hash=content_hash,
+                                     status='pending', submitted_at=_to_datetime(submitted_at))
+                db.session.add(record)
+                db.session.commit()
+            else:
+                # 其他进程先收到结束事件并写入了记录，补上归属信息
+                record.user_id = user_id
+                record.order_id = order_id
+                record.template = template
+                record.content_hash = content_hash
+                record.submitted_at = _to_datetime(submitted_at)
+                db.session.commit()
+        if order_id is not None:
+            # 只关联属于该用户的订单
+            Order.query.filter_by(id=order_id, user_id=user_id).update({'drawing_id': record.id})
+            db.session.commit()
+
+    def _finish(self, task: Dict):
+        if task['status'] == STATUS_FINISHED and task['images'] is None:
+            # 结束事件不含图片地址，查询一次上游，取得后会再次通知
+            response = ComfyOne.shared().get_task_status(task['task_id'])
+            if response['code'] == 0:
+                latest = self.store.apply_status(task['task_id'], response['data'])
+                if (latest['status'], latest['images']) != (task['status'], task['images']):
+                    return
+            else:
+                logger.warning("查询任务 %s 图片失败，错误码: %s", task['task_id'], response['code'])
+
+        values = {
+            'status': task['status'],
+            'message': (task['message'] or '')[:255] or None,
+            'images': json.dumps(task['images'], ensure_ascii=False) if task['images'] is not None else None,
+            'started_at': _to_datetime(task['started_at']),
+            'finished_at': _to_datetime(task['finished_at']),
+        }
+        # 多个进程都会收到同一任务的事件，只有第一个写入生效
+        updated = DrawingTask.query.filter(
+            DrawingTask.task_id == task['task_id'],
+            db.or_(DrawingTask.status.notin_(TERMINAL_STATUSES), DrawingTask.images.is_(None))
+        ).update(values, synchronize_session=False)
+        if not updated and DrawingTask.query.filter_by(task_id=task['task_id']).first() is None:
+            db.session.add(DrawingTask(task_id=task['task_id'],
+                                       submitted_at=_to_datetime(task['submitted_at']), **values))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_task_recorder() -> TaskRecorder:
+    """获取进程内唯一的任务记录器"""
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = TaskRecorder(get_task_store())
+    return _recorder
@@ -0,0 +1,99 @@
+import logging
+import threading
+from typing import Dict, Tuple
+
+from flask import has_app_context
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+import config
+from wxcloudrun import db
+from ..comfyuione.comfyone import ComfyOne
+from ..coordination import SingleFlight, advisory_lock
+from ..metrics import stage_timer
+from .models import RegisteredWorkflow
+from .workflow_templates import WorkflowTemplate
+
+logger = logging.getLogger('log.workflow_registry')
+
+
+class WorkflowRegistry:
+    """工作流模板在 ComfyOne 中的注册表
+
+    每个模板按内容摘要只调用一次 create_workflow，返回的 workflow_id 保存在 comfy_workflows 中，
+    之后的提交只发送 inputs。进程内并发注册合并为一次，进程之间通过数据库锁串行。
+    """
+
+    def __init__(self, lock_timeout: int):
+        self.lock_timeout = lock_timeout
+        # (模板名, 内容摘要) -> workflow_id
+        self._ids: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+        self._registering = SingleFlight()
+
+    def workflow_id(self, comfyone: ComfyOne, template: WorkflowTemplate) -> str:
+        """获取模板的 workflow_id，未注册或模板内容变化时注册"""
+        key = (template.name, template.content_hash)
+        workflow_id = self._ids.get(key)
+        if workflow_id is None:
+            workflow_id = self._registering.do(f'{template.name}:{template.content_hash}',
+                                               lambda: self._register(comfyone, template))
+            with self._lock:
+                self._ids[key] = workflow_id
+        return workflow_id
+
+    def _register(self, comfyone: ComfyOne, template: WorkflowTemplate) -> str:
+        persist = has_app_context()
+        with advisory_lock(f'yimeng:workflow:{template.name}', self.lock_timeout):
+            if persist:
+                record = RegisteredWorkflow.query.filter_by(
+                    name=template.name, content_hash=template.content_hash).first()
+                if record is not None:
+                    return record.workflow_id
+
+            data = template.data
+            with stage_timer('workflow_register'):
+                response = comfyone.create_workflow(data.get('name', template.name), data.get('inputs', []),
+                                                    data.get('outputs', []), data['workflow'])
+            if response.get('code') != 0:
+                raise Exception(f"注册工作流 {template.name} 失败: {response.get('msg')}")
+            workflow_id = response['data']['id']
+            logger.info("注册工作流 %s 成功，workflow_id: %s", template.name, workflow_id)
+
+            if persist:
+                try:
+                    db.session.add(RegisteredWorkflow(name=template.name, content_hash=template.content_hash,
+                                                      workflow_id=workflow_id))
+                    db.session.commit()
+                except IntegrityError:
+                    db.session.rollback()
+                except SQLAlchemyError as e:
+                    db.session.rollback()
+                    logger.warning("保存工作流 %s 的 workflow_id 失败: %s", template.name, e)
+            return workflow_id
+
+    def invalidate(self, template: WorkflowTemplate):
+        """workflow_id 已失效（如在 ComfyOne 中被删除），下次提交时重新注册"""
+        with self._lock:
+            self._ids.pop((template.name, template.content_hash), None)
+        if not has_app_context():
+            return
+        try:
+            RegisteredWorkflow.query.filter_by(name=template.name, content_hash=template.content_hash).delete()
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.warning("删除工作流 %s 的注册记录失败: %s", template.name, e)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_workflow_registry() -> WorkflowRegistry:
+    """获取进程内唯一的工作流注册表"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = WorkflowRegistry(lock_timeout=config.WORKFLOW_REGISTER_LOCK_TIMEOUT)
+    return _registry
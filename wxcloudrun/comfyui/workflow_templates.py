@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+
+# 项目根目录，config.jsons_path 中的相对路径以此为基准
+PROJECT_ROOT = os.path.dirname(os.path.abspath(config.__file__))
+
+
+def workflow_hash(workflow: Dict) -> str:
+    """规范化工作流（键排序、紧凑分隔符）后计算 SHA-256，参数与随机种子相同的请求得到相同的摘要"""
+    canonical = json.dumps(workflow, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class PreparedWorkflow:
+    """注入参数后的工作流
+
+    workflow 为完整的工作流；参数全部是模板声明的输入时，
+    inputs 为按节点分组的输入列表，可通过已注册的 workflow_id 提交，否则为 None。
+    """
+
+    __slots__ = ('template', 'workflow', 'inputs')
+
+    def __init__(self, template: 'WorkflowTemplate', workflow: Dict, inputs: Optional[List[Dict]]):
+        self.template = template
+        self.workflow = workflow
+        self.inputs = inputs
+
+
+class WorkflowTemplate:
+    """已解析的工作流模板
+
+    模板数据只读共享，render() 只复制被参数改动的节点，
+    其余节点与原模板共用同一对象。
+    """
+
+    def __init__(self, name: str, path: str, data: Dict, mtime: float):
+        self.name = name
+        self.path = path
+        self.data = data
+        self.mtime = mtime
+        # 模板内容变化时摘要随之变化，据此重新注册
+        self.content_hash = workflow_hash(data)
+        # 模板声明的输入参数：参数名 -> 所在节点 ID 列表
+        self.declared: Dict[str, List[str]] = {}
+        for item in data.get('inputs', []):
+            self.declared.setdefault(item['name'], []).append(str(item['id']))
+
+    def resolve(self, params: Optional[Dict[str, Any]]) -> Dict[Tuple[str, str], Any]:
+        """把请求参数解析为 (节点 ID, 输入名) -> 值
+
+        支持两种写法：模板 inputs 中声明的参数名（如 seed、width），
+        以及 "节点ID.输入名"（如 6.text、10.image）直接指定节点输入。
+
+        Raises:
+            ValueError: params 不是对象，或含有未知参数
+        """
+        if params is not None and not isinstance(params, dict):
+            raise ValueError("params 必须是对象")
+        overrides = {}
+        workflow = self.data['workflow']
+        for key, value in (params or {}).items():
+            if key in self.declared:
+                for node_id in self.declared[key]:
+                    overrides[(node_id, key)] = value
+                continue
+            node_id, sep, input_name = key.partition('.')
+            if not sep or node_id not in workflow or input_name not in workflow[node_id].get('inputs', {}):
+                raise ValueError(f"未知的工作流参数: {key}")
+            overrides[(node_id, input_name)] = value
+        return overrides
+
+    def render(self, params: Optional[Dict[str, Any]] = None) -> Dict:
+        """生成注入参数后的工作流，返回值不可原地修改"""
+        return self._apply(self.resolve(params))
+
+    def prepare(self, params: Optional[Dict[str, Any]] = None) -> PreparedWorkflow:
+        """生成完整工作流，参数全部是声明的输入时同时生成 inputs 列表"""
+        overrides = self.resolve(params)
+        inputs = None
+        if all(key in self.declared for key in (params or {})):
+            grouped: Dict[str, Dict[str, Any]] = {}
+            for (node_id, input_name), value in overrides.items():
+                grouped.setdefault(node_id, {})[input_name] = value
+            inputs = [{'id': node_id, 'params': values} for node_id, values in grouped.items()]
+        return PreparedWorkflow(self, self._apply(overrides), inputs)
+
+    def _apply(self, overrides: Dict[Tuple[str, str], Any]) -> Dict:
+        if not overrides:
+            return self.data
+
+        workflow = dict(self.data['workflow'])
+        copied = set()
+        for (node_id, input_name), value in overrides.items():
+            if node_id not in copied:
+                node = dict(workflow[node_id])
+                node['inputs'] = dict(node['inputs'])
+                workflow[node_id] = node
+                copied.add(node_id)
+            workflow[node_id]['inputs'][input_name] = value
+
+        payload = dict(self.data)
+        payload['workflow'] = workflow
+        return payload
+
+
+class WorkflowTemplateRegistry:
+    """工作流模板注册表
+
+    启动时按 config.jsons_path 加载全部模板，之后按文件修改时间自动重新加载。
+    """
+
+    def __init__(self, paths: List[Dict[str, str]], check_interval: float):
+        self.check_interval = check_interval
+        self._paths: Dict[str, str] = {}
+        for item in paths:
+            for name, path in item.items():
+                self._paths[name] = path if os.path.isabs(path) else os.path.join(PROJECT_ROOT, path)
+        self._templates: Dict[str, WorkflowTemplate] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def load_all(self):
+        """加载全部模板"""
+        for name in self._paths:
+            self._load(name)
+
+    def names(self) -> List[str]:
+        return list(self._paths)
+
+    def _load(self, name: str) -> WorkflowTemplate:
+        path = self._paths[name]
+        mtime = os.stat(path).st_mtime
+        with open(path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        template = WorkflowTemplate(name, path, data, mtime)
+        with self._lock:
+            self._templates[name] = template
+            self._checked_at[name] = time.time()
+        return template
+
+    def get(self, name: str) -> WorkflowTemplate:
+        """获取模板，文件有更新时重新加载"""
+        if not isinstance(name, str) or name not in self._paths:
+            raise KeyError(f"工作流模板不存在: {name}")
+        template = self._templates.get(name)
+        if template is None:
+            return self._load(name)
+
+        now = time.time()
+        if now - self._checked_at.get(name, 0) < self.check_interval:
+            return template
+        self._checked_at[name] = now
+        if os.stat(template.path).st_mtime != template.mtime:
+            return self._load(name)
+        return template
+
+    def render(self, name: str, params: Optional[Dict[str, Any]] = None) -> Dict:
+        """获取注入参数后的工作流"""
+        return self.get(name).render(params)
+
+    def prepare(self, name: str, params: Optional[Dict[str, Any]] = None) -> PreparedWorkflow:
+        """获取注入参数后的工作流及可按 workflow_id 提交的 inputs"""
+        return self.get(name).prepare(params)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_template_registry() -> WorkflowTemplateRegistry:
+    """获取进程内唯一的模板注册表，首次调用时加载全部模板"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                registry = WorkflowTemplateRegistry(config.jsons_path, config.WORKFLOW_TEMPLATE_CHECK_INTERVAL)
+                registry.load_all()
+                _registry = registry
+    return _registry
@@ -0,0 +1,118 @@
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+import config
+from wxcloudrun.async_http import get_async_session, request_json
+from wxcloudrun.metrics import observe_upstream
+from wxcloudrun.comfyuione.comfyone import ComfyOne
+from wxcloudrun.comfyuione.multipart import detect_mime
+
+
+class AsyncComfyOne:
+    """ComfyOne API 的 asyncio 客户端，方法与 ComfyOne 一一对应
+
+    默认使用当前事件循环共享的 aiohttp 会话，见 wxcloudrun.async_http。
+    """
+
+    BASE_URL = config.COMFYONE_BASE_URL
+    WS_URL = config.COMFYONE_WS_URL
+
+    def __init__(self, session=None):
+        self.headers = {
+            "Authorization": f"Bearer {config.api_key}"
+        }
+        self.session = session
+
+    async def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Dict:
+        """发送 API 请求的通用方法"""
+        return await request_json('comfyone', method, self.BASE_URL, endpoint, self.headers, data,
+                                  timeout=5, session=self.session)
+
+    async def list_backends(self) -> Dict:
+        """获取所有可用的后端服务实例"""
+        return await self._make_request("GET", "/v1/backends")
+
+    async def register_backend(self, instance_id: str) -> Dict:
+        """注册一个新的后端服务实例"""
+        data = {"instance_id": instance_id}
+        return await self._make_request("POST", "/v1/backends", data)
+
+    async def delete_backend(self, backend_name: str) -> Dict:
+        """删除后端服务实例"""
+        return await self._make_request("DELETE", f"/v1/backends/{backend_name}")
+
+    async def create_workflow(self, name: str, inputs: List[Dict], outputs: List[str], workflow: Dict) -> Dict:
+        """创建一个新的工作流"""
+        data = {
+            "name": name,
+            "inputs": inputs,
+            "outputs": outputs,
+            "workflow": workflow
+        }
+        return await self._make_request("POST", "/v1/workflows", data)
+
+    async def upload_image(self, image_path: str) -> Dict:
+        """上传图片到服务器
+        Args:
+            image_path (str): 图片文件的本地路径
+        Returns:
+            Dict: 服务器响应，包含上传结果
+        """
+        import aiohttp
+
+        status = 'error'
+        started = time.perf_counter()
+        try:
+            with open(image_path, 'rb') as file:
+                form = aiohttp.FormData()
+                form.add_field('file', file, filename=os.path.basename(image_path),
+                               content_type=detect_mime(image_path))
+                async with (self.session or get_async_session()).post(
+                        f"{self.BASE_URL}/v1/files", headers=self.headers, data=form,
+                        timeout=aiohttp.ClientTimeout(total=config.UPLOAD_TIMEOUT, sock_connect=5)) as response:
+                    status = response.status
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
+        except FileNotFoundError:
+            raise Exception(f"文件未找到: {image_path}")
+        except Exception as e:
+            raise Exception(f"图片上传失败: {str(e)}")
+        finally:
+            observe_upstream('comfyone', 'POST', '/v1/files', status, time.perf_counter() - started)
+
+    async def submit_task(self, workflow_id: str, inputs: List[Dict], free_cache: bool = False) -> Dict:
+        """提交绘画任务"""
+        data = {
+            "workflow_id": workflow_id,
+            "inputs": inputs,
+            "free_cache": free_cache
+        }
+        return await self._make_request("POST", "/v1/prompts", data)
+
+    async def submit_workflow_task(self, workflow) -> Dict:
+        """提交工作流任务"""
+        return await self._make_request("POST", "/v1/prompts_workflow", workflow)
+
+    async def get_task_status(self, task_id: str) -> Dict:
+        """获取任务状态"""
+        return await self._make_request("GET", f"/v1/prompts/{task_id}/status")
+
+    async def get_task_images(self, image_url: str) -> bytes:
+        """获取任务图片的二进制内容"""
+        import aiohttp
+
+        # 截取 image_url 中的路径部分
+        url_path = image_url.split(self.BASE_URL)[-1]
+        try:
+            async with (self.session or get_async_session()).get(
+                    f"{self.BASE_URL}{url_path}", headers=self.headers,
+                    timeout=aiohttp.ClientTimeout(total=60, sock_connect=5)) as response:
+                response.raise_for_status()
+                return await response.read()
+        except aiohttp.ClientError as e:
+            raise Exception(f"API 请求失败: {str(e)}")
+
+    async def listen_task_status(self, callback: Optional[Callable] = None):
+        """监听任务状态，与 ComfyOne.listen_task_status 相同，本身即为协程"""
+        await ComfyOne.listen_task_status(self, callback)
@@ -1,54 +1,84 @@
+import logging
 import os
-import sys
+import threading
+import time
 import requests
-import asyncio
-import websockets
 import json
 from typing import Dict, List, Optional, Callable
 
-# 添加项目根目录到 Python 路径
-project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
-sys.path.insert(0, project_root)
-
 import config
+from wxcloudrun.http_session import create_session, HTTPStatusError
+from wxcloudrun.metrics import observe_upstream
+from wxcloudrun.comfyuione.multipart import MultipartFileStream, detect_mime
+
+logger = logging.getLogger('log.comfyone')
 
 class ComfyOne:
     """ComfyOne API 调用工具类"""
     
-    BASE_URL = "https://pandora-server-cf.onethingai.com"
-    WS_URL = "wss://pandora-server-cf.onethingai.com/v1/ws"
+    BASE_URL = config.COMFYONE_BASE_URL
+    WS_URL = config.COMFYONE_WS_URL
+
+    _shared = None
+    _shared_lock = threading.Lock()
     
     def __init__(self):
         self.headers = {
             "Authorization": f"Bearer {config.api_key}"
         }
+        # 带重试策略的连接池会话，复用 keep-alive 连接
+        self.session = create_session()
+
+    @classmethod
+    def shared(cls) -> 'ComfyOne':
+        """获取进程内共享的客户端，复用连接池"""
+        if cls._shared is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls()
+        return cls._shared
     
-    def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None, files: Optional[Dict] = None) -> Dict:
-        """发送 API 请求的通用方法"""
+    def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None,
+                      body: Optional[MultipartFileStream] = None) -> Dict:
+        """发送 API 请求的通用方法，body 为流式发送的 multipart 请求体"""
         url = f"{self.BASE_URL}{endpoint}"
+        # 失败类型或 HTTP 状态码，记录到上游调用指标
+        status = 'error'
+        started = time.perf_counter()
         try:
-            if files:
-                # 文件上传请求使用更长的超时时间（30秒）
-                response = requests.request(
+            if body is not None:
+                # 文件上传请求使用更长的超时时间
+                response = self.session.request(
                     method=method,
                     url=url,
-                    headers=self.headers,
-                    files=files,
-                    timeout=30  # 增加超时时间到30秒
+                    headers={**self.headers, 'Content-Type': body.content_type},
+                    data=body,
+                    timeout=(5, config.UPLOAD_TIMEOUT)
                 )
             else:
                 # 普通请求使用默认超时时间
-                response = requests.request(
+                response = self.session.request(
                     method=method,
                     url=url,
                     headers=self.headers,
                     json=data,
                     timeout=5
                 )
+            status = response.status_code
             response.raise_for_status()
             return response.json()
+        except requests.exceptions.Timeout as e:
+            status = 'timeout'
+            raise Exception(f"API 请求失败: {str(e)}")
+        except requests.exceptions.ConnectionError as e:
+            status = 'connection_error'
+            raise Exception(f"API 请求失败: {str(e)}")
+        except requests.exceptions.HTTPError as e:
+            raise HTTPStatusError(f"API 请求失败: {str(e)}", status)
         except requests.exceptions.RequestException as e:
             raise Exception(f"API 请求失败: {str(e)}")
+        finally:
+            observe_upstream('comfyone', method, endpoint, status, time.perf_counter() - started)
     
     def list_backends(self) -> Dict:
         """获取所有可用的后端服务实例"""
@@ -77,18 +107,15 @@ class ComfyOne:
             Dict: 服务器响应，包含上传结果
         """
         try:
-            with open(image_path, 'rb') as image_file:
-                # 获取文件名
-                file_name = os.path.basename(image_path)
-                # 创建文件元组：(文件名, 文件对象, MIME类型)
-                files = {
-                    'file': (file_name, image_file, 'image/png')  # 或 'image/jpeg' 等根据实际文件类型
-                }
-                return self._make_request(
-                    method="POST",
-                    endpoint="/v1/files",
-                    files=files
-                )
+            # 按文件头识别类型，流式发送文件内容
+            body = MultipartFileStream(
+                image_path,
+                field='file',
+                file_name=os.path.basename(image_path),
+                content_type=detect_mime(image_path),
+                chunk_size=config.UPLOAD_CHUNK_SIZE
+            )
+            return self._make_request("POST", "/v1/files", body=body)
         except FileNotFoundError:
             raise Exception(f"文件未找到: {image_path}")
         except Exception as e:
@@ -111,41 +138,63 @@ class ComfyOne:
         """获取任务状态"""
         return self._make_request("GET", f"/v1/prompts/{task_id}/status") 
     
-    def get_task_images(self, image_url: str) -> Dict:
-        """获取任务图片"""
+    def open_image_stream(self, image_url: str) -> requests.Response:
+        """以流式方式打开任务图片，调用方负责关闭响应"""
         # 截取 image_url 中的路径部分
-        url_path = image_url.split("https://pandora-server-cf.onethingai.com")[-1]
-        return self._make_request("GET", url_path)
+        url_path = image_url.split(self.BASE_URL)[-1]
+        try:
+            response = self.session.get(
+                f"{self.BASE_URL}{url_path}",
+                headers=self.headers,
+                stream=True,
+                timeout=(5, 60)
+            )
+            response.raise_for_status()
+            return response
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"API 请求失败: {str(e)}")
+
+    def get_task_images(self, image_url: str) -> bytes:
+        """获取任务图片的二进制内容"""
+        with self.open_image_stream(image_url) as response:
+            return response.content
 
     async def listen_task_status(self, callback: Optional[Callable] = None):
         """监听任务状态
         Args:
             callback: 回调函数，用于处理接收到的消息
         """
+        # 仅在监听时导入，避免拖慢应用冷启动
+        import asyncio
+        import websockets
+
         async def default_callback(message):
             """默认的回调函数"""
             try:
                 data = json.loads(message)
-                print(data)
+                task_id = data.get('taskId')
+                # 排队与进度事件数量大，按 LOG_SAMPLE_RATES 抽样输出
                 if data['type'] == 'pendding':
                     current = data.get('data', {}).get('current', 'unknown')
-                    print(f"任务 {data.get('taskId')} 等待执行, 当前位置: {current}")
+                    logger.debug("任务 %s 等待执行，当前位置: %s", task_id, current,
+                                 extra={'sample': 'task_pending'})
                 elif data['type'] == 'progress':
                     process = data.get('data', {}).get('process', 0)
-                    print(f"任务 {data.get('taskId')} 正在执行, 进度: {process}%")
+                    logger.debug("任务 %s 正在执行，进度: %s%%", task_id, process,
+                                 extra={'sample': 'task_progress'})
                 elif data['type'] == 'finished':
                     success = data.get('data', {}).get('success', False)
                     if success:
-                        print(f"任务 {data.get('taskId')} 执行完成")
+                        logger.info("任务 %s 执行完成", task_id)
                     else:
-                        print(f"任务 {data.get('taskId')} 执行失败")
+                        logger.warning("任务 %s 执行失败", task_id)
                 elif data['type'] == 'error':
                     message = data.get('data', {}).get('message', '未知错误')
-                    print(f"任务执行出错: {message}")
+                    logger.warning("任务 %s 执行出错: %s", task_id, message)
             except json.JSONDecodeError:
-                print(f"解析消息失败: {message}")
+                logger.warning("解析消息失败: %.200s", message)
             except Exception as e:
-                print(f"处理消息时出错: {str(e)}")
+                logger.warning("处理消息时出错: %s", e)
 
         while True:  # 添加外层循环，在连接断开时自动重连
             try:
@@ -159,7 +208,7 @@ class ComfyOne:
                     ping_timeout=None,   # 禁用 ping 超时
                     close_timeout=10     # 设置关闭超时
                 ) as websocket:
-                    print("WebSocket 连接已建立")
+                    logger.info("WebSocket 连接已建立")
                     
                     # 创建保活任务
                     async def heartbeat():
@@ -181,24 +230,24 @@ class ComfyOne:
                                 else:
                                     await default_callback(message)
                             except websockets.ConnectionClosed:
-                                print("WebSocket 连接已关闭，准备重新连接...")
+                                logger.info("WebSocket 连接已关闭，准备重新连接")
                                 break
                             except Exception as e:
-                                print(f"处理消息时出错: {str(e)}")
+                                logger.warning("处理消息时出错: %s", e)
                                 continue
                     finally:
                         heartbeat_task.cancel()
                     
             except Exception as e:
-                print(f"WebSocket 连接出错: {str(e)}")
-                print("5秒后尝试重新连接...")
+                logger.warning("WebSocket 连接出错: %s，5秒后尝试重新连接", e)
                 await asyncio.sleep(5)
 
     def start_listening(self):
         """启动 WebSocket 监听"""
+        import asyncio
         try:
             asyncio.run(self.listen_task_status())
         except KeyboardInterrupt:
-            print("监听已手动停止")
+            logger.info("监听已手动停止")
         except Exception as e:
-            print(f"监听出错: {str(e)}")
+            logger.warning("监听出错: %s", e)
@@ -0,0 +1,67 @@
+import mimetypes
+import os
+import uuid
+from typing import Iterator
+
+# 常见图片格式的文件头
+_SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+]
+
+
+def detect_mime(path: str) -> str:
+    """根据文件头识别图片类型，无法识别时按扩展名推断"""
+    with open(path, 'rb') as file:
+        head = file.read(16)
+    for signature, mime in _SIGNATURES:
+        if head.startswith(signature):
+            return mime
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def _header_param(value: str) -> str:
+    """Content-Disposition 中的参数值：去掉回车换行，双引号按 HTML5 表单的规则编码为 %22"""
+    return value.replace('\r', '').replace('\n', '').replace('"', '%22')
+
+
+class MultipartFileStream:
+    """流式的 multipart/form-data 请求体
+
+    提供 __len__ 以便 requests 设置 Content-Length，
+    迭代时逐块读取文件，不把整个文件读入内存。
+    字段名与文件名经过转义，文件名只保留最后一级，为空时使用 file。
+    """
+
+    def __init__(self, path: str, field: str, file_name: str, content_type: str, chunk_size: int):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.boundary = uuid.uuid4().hex
+        field = _header_param(field)
+        file_name = _header_param(os.path.basename(file_name.replace('\\', '/'))) or 'file'
+        self._head = (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field}"; filename="{file_name}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode('utf-8')
+        self._tail = f'\r\n--{self.boundary}--\r\n'.encode('utf-8')
+        self._length = len(self._head) + os.path.getsize(path) + len(self._tail)
+
+    @property
+    def content_type(self) -> str:
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self._head
+        with open(self.path, 'rb') as file:
+            for chunk in iter(lambda: file.read(self.chunk_size), b''):
+                yield chunk
+        yield self._tail
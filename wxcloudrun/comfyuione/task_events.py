@@ -0,0 +1,237 @@
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import config
+from .comfyone import ComfyOne
+
+logger = logging.getLogger('log.task_events')
+
+# 任务状态
+STATUS_PENDING = 'pending'
+STATUS_RUNNING = 'running'
+STATUS_FINISHED = 'finished'
+STATUS_ERROR = 'error'
+
+TERMINAL_STATUSES = (STATUS_FINISHED, STATUS_ERROR)
+
+
+class TaskStore:
+    """内存中的任务状态表，按 taskId 索引
+
+    每次变更递增 version，等待方据此判断是否有新进度。
+    任务结束或取得图片地址时通知监听方，用于持久化结果。
+    未结束的任务超过 inflight_max_age 没有更新时视为失联（结束事件丢失），
+    不再计入排队数，并与过期的已结束任务一起清理。
+    """
+
+    def __init__(self, ttl: int, inflight_max_age: float):
+        self.ttl = ttl
+        self.inflight_max_age = inflight_max_age
+        self._tasks: Dict[str, Dict] = {}
+        self._cond = threading.Condition()
+        self._pruned_at = time.time()
+        self._listeners: List[Callable[[Dict], None]] = []
+
+    def add_listener(self, listener: Callable[[Dict], None]):
+        """注册任务结束的监听方，在更新状态的线程中调用，不应阻塞"""
+        self._listeners.append(listener)
+
+    def _update(self, task_id: str, notify: bool = True, **fields) -> Dict:
+        with self._cond:
+            task = self._tasks.get(task_id)
+            if task is None:
+                task = {
+                    'task_id': task_id,
+                    'status': STATUS_PENDING,
+                    'position': None,
+                    'progress': 0,
+                    'message': None,
+                    'images': None,
+                    'version': 0,
+                    'submitted_at': None,
+                    'started_at': None,
+                    'finished_at': None,
+                }
+                self._tasks[task_id] = task
+            before = (task['status'], task['images'])
+            task.update(fields)
+            now = time.time()
+            if task['status'] == STATUS_RUNNING and task['started_at'] is None:
+                task['started_at'] = now
+            if task['status'] in TERMINAL_STATUSES and task['finished_at'] is None:
+                task['finished_at'] = now
+            task['version'] += 1
+            task['updated_at'] = now
+            self._prune()
+            self._cond.notify_all()
+            snapshot = dict(task)
+        if notify and snapshot['status'] in TERMINAL_STATUSES and (snapshot['status'], snapshot['images']) != before:
+            for listener in self._listeners:
+                try:
+                    listener(snapshot)
+                except Exception as e:
+                    logger.warning("任务监听方处理失败: %s", e)
+        return snapshot
+
+    def apply_event(self, event: Dict) -> Optional[Dict]:
+        """应用 WebSocket 推送的 pendding/progress/finished/error 事件"""
+        task_id = event.get('taskId')
+        if not task_id:
+            return None
+        data = event.get('data') or {}
+        event_type = event.get('type')
+        if event_type == 'pendding':
+            return self._update(task_id, status=STATUS_PENDING, position=data.get('current'))
+        elif event_type == 'progress':
+            return self._update(task_id, status=STATUS_RUNNING, position=None, progress=data.get('process', 0))
+        elif event_type == 'finished':
+            if data.get('success', False):
+                return self._update(task_id, status=STATUS_FINISHED, progress=100, message='success')
+            return self._update(task_id, status=STATUS_ERROR, message=data.get('message', '执行失败'))
+        elif event_type == 'error':
+            return self._update(task_id, status=STATUS_ERROR, message=data.get('message', '未知错误'))
+        return None
+
+    def apply_status(self, task_id: str, task_data: Dict) -> Dict:
+        """应用 GET /v1/prompts/<id>/status 的查询结果"""
+        status = task_data.get('status')
+        if status == 'finished' and task_data.get('message') != 'success':
+            status = STATUS_ERROR
+        fields = {'status': status, 'message': task_data.get('message'), 'images': task_data.get('images')}
+        if status == STATUS_FINISHED:
+            fields['progress'] = 100
+        return self._update(task_id, **fields)
+
+    def apply_record(self, record: Dict) -> Dict:
+        """载入数据库中已结束任务的记录，不再通知监听方"""
+        fields = {key: record[key] for key in ('status', 'message', 'images',
+                                               'submitted_at', 'started_at', 'finished_at')}
+        if record['status'] == STATUS_FINISHED:
+            fields['progress'] = 100
+        return self._update(record['task_id'], notify=False, **fields)
+
+    def track(self, task_id: str) -> Dict:
+        """记录刚提交的任务"""
+        with self._cond:
+            task = self._tasks.get(task_id)
+            if task is not None:
+                # 推送事件可能先于提交响应到达
+                if task['submitted_at'] is None:
+                    task['submitted_at'] = time.time()
+                return dict(task)
+        return self._update(task_id, status=STATUS_PENDING, submitted_at=time.time())
+
+    def get(self, task_id: str) -> Optional[Dict]:
+        with self._cond:
+            task = self._tasks.get(task_id)
+            return dict(task) if task else None
+
+    def wait_for_change(self, task_id: str, version: int, timeout: float) -> Optional[Dict]:
+        """等待任务版本超过 version，超时返回当前状态"""
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                task = self._tasks.get(task_id)
+                if task is not None and (task['version'] > version or task['status'] in TERMINAL_STATUSES):
+                    return dict(task)
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return dict(task) if task else None
+                self._cond.wait(remaining)
+
+    def is_stale(self, task: Dict, now: Optional[float] = None) -> bool:
+        """未结束的任务是否超过 inflight_max_age 没有更新"""
+        if task['status'] in TERMINAL_STATUSES:
+            return False
+        return task['updated_at'] < (now or time.time()) - self.inflight_max_age
+
+    def pending_count(self) -> int:
+        """ComfyOne 中排队等待执行的任务数，不含失联的任务"""
+        now = time.time()
+        with self._cond:
+            return sum(1 for task in self._tasks.values()
+                       if task['status'] == STATUS_PENDING and not self.is_stale(task, now))
+
+    def _prune(self):
+        """清理过期的已结束任务与失联的未结束任务，调用方需持有锁"""
+        now = time.time()
+        if now - self._pruned_at < 60:
+            return
+        self._pruned_at = now
+        deadline = now - self.ttl
+        expired = [task_id for task_id, task in self._tasks.items()
+                   if (task['status'] in TERMINAL_STATUSES and task['updated_at'] < deadline)
+                   or self.is_stale(task, now)]
+        for task_id in expired:
+            del self._tasks[task_id]
+
+
+class TaskEventBus:
+    """托管的 WebSocket 任务事件消费者
+
+    在后台线程中运行 ComfyOne.listen_task_status，断线自动重连，
+    收到的事件写入 TaskStore。
+    """
+
+    def __init__(self, store: TaskStore):
+        self.store = store
+        self.received = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='task-event-bus', daemon=True)
+            self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        import asyncio
+        try:
+            asyncio.run(ComfyOne.shared().listen_task_status(self._on_message))
+        except Exception as e:
+            logger.warning("任务事件消费已停止: %s", e)
+
+    async def _on_message(self, message):
+        try:
+            event = json.loads(message)
+        except json.JSONDecodeError:
+            return
+        self.received += 1
+        self.store.apply_event(event)
+
+
+_store = None
+_bus = None
+_lock = threading.Lock()
+
+
+def get_task_store() -> TaskStore:
+    """获取进程内唯一的任务状态表"""
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                _store = TaskStore(ttl=config.TASK_STORE_TTL, inflight_max_age=config.TASK_STORE_INFLIGHT_MAX_AGE)
+    return _store
+
+
+def get_task_event_bus() -> Optional[TaskEventBus]:
+    """获取进程内唯一的事件消费者，未开启时返回 None"""
+    global _bus
+    if not config.TASK_EVENTS_ENABLED:
+        return None
+    store = get_task_store()
+    if _bus is None:
+        with _lock:
+            if _bus is None:
+                _bus = TaskEventBus(store)
+    return _bus
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import config
+from .comfyone import ComfyOne
+
+
+def file_sha256(path: str, chunk_size: int) -> str:
+    """分块计算文件摘要"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadIndex:
+    """持久化的 文件摘要 -> 服务器文件 索引"""
+
+    def __init__(self, path: str, ttl: int):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as file:
+                    self._entries = json.load(file)
+            except (OSError, ValueError):
+                self._entries = {}
+
+    def get(self, sha: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(sha)
+            if entry is None:
+                return None
+            if time.time() - entry['uploaded_at'] > self.ttl:
+                del self._entries[sha]
+                return None
+            return entry['remote']
+
+    def put(self, sha: str, remote: Dict):
+        with self._lock:
+            self._entries[sha] = {'remote': remote, 'uploaded_at': time.time()}
+            directory = os.path.dirname(self.path) or '.'
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump(self._entries, file)
+            os.replace(tmp_path, self.path)
+
+
+class ImageUploader:
+    """批量上传输入图片
+
+    按内容摘要去重：服务器上已有的文件直接复用，其余文件并发流式上传。
+    """
+
+    def __init__(self, index: UploadIndex, concurrency: int, chunk_size: int):
+        self.index = index
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self._inflight: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def upload(self, path: str) -> Dict:
+        """上传单个文件
+
+        Returns:
+            包含 path、sha、remote（服务器返回的文件信息）、cached 的结果
+        """
+        sha = file_sha256(path, self.chunk_size)
+        while True:
+            remote = self.index.get(sha)
+            if remote is not None:
+                return {'path': path, 'sha': sha, 'remote': remote, 'cached': True}
+            with self._lock:
+                event = self._inflight.get(sha)
+                if event is None:
+                    event = self._inflight[sha] = threading.Event()
+                    break
+            # 相同内容正在上传，等待后复用结果
+            event.wait(config.UPLOAD_TIMEOUT)
+        try:
+            response = ComfyOne.shared().upload_image(path)
+            remote = response.get('data')
+            self.index.put(sha, remote)
+            return {'path': path, 'sha': sha, 'remote': remote, 'cached': False}
+        finally:
+            with self._lock:
+                self._inflight.pop(sha, None)
+            event.set()
+
+    def upload_many(self, paths: List[str]) -> List[Dict]:
+        """并发上传多个文件，单个失败记录在对应结果的 error 中"""
+        def upload(path):
+            try:
+                result = self.upload(path)
+                result['error'] = None
+                return result
+            except Exception as e:
+                return {'path': path, 'sha': None, 'remote': None, 'cached': False, 'error': str(e)}
+
+        max_workers = max(1, min(self.concurrency, len(paths)))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='image-upload') as executor:
+            return list(executor.map(upload, paths))
+
+
+_uploader = None
+_uploader_lock = threading.Lock()
+
+
+def get_image_uploader() -> ImageUploader:
+    """获取进程内唯一的图片上传器"""
+    global _uploader
+    if _uploader is None:
+        with _uploader_lock:
+            if _uploader is None:
+                _uploader = ImageUploader(
+                    UploadIndex(config.UPLOAD_INDEX_PATH, config.UPLOAD_INDEX_TTL),
+                    concurrency=config.UPLOAD_CONCURRENCY,
+                    chunk_size=config.UPLOAD_CHUNK_SIZE,
+                )
+    return _uploader
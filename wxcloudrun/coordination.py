@@ -0,0 +1,164 @@
+import contextvars
+import logging
+import threading
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Awaitable, Callable, Dict
+
+from flask import has_app_context
+from sqlalchemy import text
+
+from wxcloudrun import db
+
+logger = logging.getLogger('log.coordination')
+
+
+class _Call:
+    """一次进行中的调用，等待方共享其结果或异常"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """进程内的合并调用
+
+    同一 key 同时只执行一次，执行期间到达的调用方等待并共享同一结果；
+    执行结束后的新调用会重新执行。
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    """事件循环内的合并调用，语义与 SingleFlight 相同
+
+    leader 的协程作为独立任务运行，某个等待方被取消不会中断它。
+    """
+
+    def __init__(self):
+        # 事件循环 -> {key: Task}
+        self._calls = weakref.WeakKeyDictionary()
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        calls = self._calls.setdefault(loop, {})
+        task = calls.get(key)
+        if task is None:
+            task = loop.create_task(func())
+            calls[key] = task
+            task.add_done_callback(lambda _: calls.pop(key, None))
+        return await asyncio.shield(task)
+
+
+# 锁名 -> 进程内互斥锁，同一进程的线程先在此排队，每个进程最多一条连接等待 GET_LOCK
+_local_locks: Dict[str, threading.Lock] = {}
+_local_locks_lock = threading.Lock()
+
+
+def _local_lock(name: str) -> threading.Lock:
+    with _local_locks_lock:
+        return _local_locks.setdefault(name, threading.Lock())
+
+
+@contextmanager
+def advisory_lock(name: str, timeout: int):
+    """跨进程、跨容器的互斥锁，基于 MySQL GET_LOCK
+
+    先取得进程内同名的互斥锁，再取得 MySQL 锁；锁与持有它的连接绑定，范围内独占一条主库连接，退出时释放。
+    非 MySQL 数据库或没有应用上下文时只依赖进程内的互斥。
+    """
+    local = _local_lock(name)
+    if not local.acquire(timeout=timeout):
+        raise Exception(f"等待锁 {name} 超时")
+    try:
+        if not has_app_context() or db.engine.dialect.name != 'mysql':
+            logger.debug("没有 MySQL 连接，锁 %s 只在进程内互斥", name)
+            yield
+            return
+
+        with db.engine.connect() as connection:
+            acquired = connection.execute(text("SELECT GET_LOCK(:name, :timeout)"),
+                                          {'name': name, 'timeout': timeout}).scalar()
+            if acquired != 1:
+                raise Exception(f"等待锁 {name} 超时")
+            try:
+                yield
+            finally:
+                connection.execute(text("SELECT RELEASE_LOCK(:name)"), {'name': name})
+    finally:
+        local.release()
+
+
+def _resolve(future, error=None):
+    """在事件循环线程中设置 future 的结果，等待方已取消时忽略"""
+    if future.done():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
+
+
+@asynccontextmanager
+async def async_advisory_lock(name: str, timeout: int):
+    """advisory_lock 的 asyncio 版本
+
+    锁的获取、持有与释放在线程池的同一次调用中完成，范围内占用一个线程等待退出通知。
+    协程退出或被取消时通知该线程释放；取得锁之前被取消时，线程取得锁后立即释放。
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    acquired = loop.create_future()
+    release = threading.Event()
+    context = contextvars.copy_context()
+
+    def hold():
+        held = False
+        try:
+            with advisory_lock(name, timeout):
+                held = True
+                loop.call_soon_threadsafe(_resolve, acquired)
+                release.wait()
+        except Exception as e:
+            if held:
+                logger.warning("释放锁 %s 失败: %s", name, e)
+            else:
+                loop.call_soon_threadsafe(_resolve, acquired, e)
+
+    loop.run_in_executor(None, lambda: context.run(hold))
+    try:
+        await acquired
+        yield
+    finally:
+        release.set()
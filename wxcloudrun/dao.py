@@ -1,64 +1,111 @@
 import logging
+import random
+import threading
+import time
+from datetime import datetime
 
+from sqlalchemy import text
 from sqlalchemy.exc import OperationalError
 
+import config
 from wxcloudrun import db
-from wxcloudrun.model import Counters
 
 # 初始化日志
 logger = logging.getLogger('log')
 
 
-def query_counterbyid(id):
-    """
-    根据ID查询Counter实体
-    :param id: Counter的ID
-    :return: Counter实体
-    """
-    try:
-        return Counters.query.filter(Counters.id == id).first()
-    except OperationalError as e:
-        logger.info("query_counterbyid errorMsg= {} ".format(e))
-        return None
+# 计数值读缓存：id -> (计数值, 过期时间)
+_counter_cache = {}
+_counter_cache_lock = threading.Lock()
+
+
+def _cache_counter_value(id, value):
+    with _counter_cache_lock:
+        _counter_cache[id] = (value, time.time() + config.COUNTER_CACHE_TTL)
+
 
+def _invalidate_counter_value(id):
+    with _counter_cache_lock:
+        _counter_cache.pop(id, None)
 
-def delete_counterbyid(id):
+
+def _sum_counter(id):
+    """在当前会话中查询计数值，分片模式下为主行与各分片之和"""
+    return int(db.session.execute(text(
+        "SELECT COALESCE((SELECT count FROM Counters WHERE id = :id), 0) + "
+        "COALESCE((SELECT SUM(count) FROM CounterShards WHERE counter_id = :id), 0)"
+        if config.COUNTER_SHARDS > 1 else
+        "SELECT COALESCE((SELECT count FROM Counters WHERE id = :id), 0)"
+    ), {'id': id}).scalar())
+
+
+def increment_counter(id):
     """
-    根据ID删除Counter实体
+    原子自增Counter的值，不存在时创建
+    分片模式（COUNTER_SHARDS > 1）下写入随机分片，避免热点行锁竞争，提交后在主库上汇总各分片
     :param id: Counter的ID
+    :return: 自增后已提交的计数值（分片模式下包含同时提交的其他自增），失败时返回None
     """
     try:
-        counter = Counters.query.get(id)
-        if counter is None:
-            return
-        db.session.delete(counter)
+        now = datetime.now()
+        if config.COUNTER_SHARDS > 1:
+            db.session.execute(text(
+                "INSERT INTO CounterShards (counter_id, shard, count) VALUES (:id, :shard, 1) "
+                "ON DUPLICATE KEY UPDATE count = count + 1"
+            ), {'id': id, 'shard': random.randrange(config.COUNTER_SHARDS)})
+            db.session.commit()
+            value = _sum_counter(id)
+            db.session.commit()
+            _cache_counter_value(id, value)
+            return value
+
+        # LAST_INSERT_ID(expr) 记录新值，同一连接上读取，无需再次查询行
+        db.session.execute(text(
+            "INSERT INTO Counters (id, count, createdAt, updatedAt) VALUES (:id, LAST_INSERT_ID(1), :now, :now) "
+            "ON DUPLICATE KEY UPDATE count = LAST_INSERT_ID(count + 1), updatedAt = :now"
+        ), {'id': id, 'now': now})
+        value = db.session.execute(text("SELECT LAST_INSERT_ID()")).scalar()
         db.session.commit()
+        _cache_counter_value(id, value)
+        return value
     except OperationalError as e:
-        logger.info("delete_counterbyid errorMsg= {} ".format(e))
+        db.session.rollback()
+        logger.info("increment_counter errorMsg= {} ".format(e))
+        return None
 
 
-def insert_counter(counter):
+@db.read_only
+def query_counter_value(id):
     """
-    插入一个Counter实体
-    :param counter: Counters实体
+    查询计数值，分片模式下为主行与各分片之和，结果缓存COUNTER_CACHE_TTL秒
+    :param id: Counter的ID
+    :return: 计数值
     """
+    with _counter_cache_lock:
+        cached = _counter_cache.get(id)
+    if cached is not None and cached[1] > time.time():
+        return cached[0]
     try:
-        db.session.add(counter)
-        db.session.commit()
+        value = _sum_counter(id)
+        _cache_counter_value(id, value)
+        return value
     except OperationalError as e:
-        logger.info("insert_counter errorMsg= {} ".format(e))
+        logger.info("query_counter_value errorMsg= {} ".format(e))
+        return 0
 
 
-def update_counterbyid(counter):
+def clear_counter(id):
     """
-    根据ID更新counter的值
-    :param counter实体
+    清零计数，同时删除主行与全部分片
+    :param id: Counter的ID
     """
     try:
-        counter = query_counterbyid(counter.id)
-        if counter is None:
-            return
-        db.session.flush()
+        db.session.execute(text("DELETE FROM Counters WHERE id = :id"), {'id': id})
+        if config.COUNTER_SHARDS > 1:
+            db.session.execute(text("DELETE FROM CounterShards WHERE counter_id = :id"), {'id': id})
         db.session.commit()
     except OperationalError as e:
-        logger.info("update_counterbyid errorMsg= {} ".format(e))
+        db.session.rollback()
+        logger.info("clear_counter errorMsg= {} ".format(e))
+    finally:
+        _invalidate_counter_value(id)
@@ -0,0 +1,93 @@
+import functools
+import random
+import threading
+from contextlib import contextmanager
+
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, orm
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+
+class RoutingSession(SignallingSession):
+    """读写分离会话
+
+    在 replica_reads() 范围内的查询发往只读副本；
+    写操作、flush 以及同一请求内写入之后的所有查询都留在主库，保证读到自己的写入。
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if self._is_write(clause):
+            self.info['wrote'] = True
+        elif self.info.get('use_replica') and not self.info.get('wrote'):
+            replicas = self.db.get_replica_engines(self.app)
+            if replicas:
+                return random.choice(replicas)
+        return super().get_bind(mapper, clause)
+
+    def _is_write(self, clause) -> bool:
+        if self._flushing or isinstance(clause, UpdateBase):
+            return True
+        if isinstance(clause, TextClause):
+            return not clause.text.lstrip().upper().startswith('SELECT')
+        return False
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """支持只读副本的 SQLAlchemy
+
+    副本地址取自 SQLALCHEMY_REPLICA_URIS，连接池参数取自
+    SQLALCHEMY_REPLICA_ENGINE_OPTIONS，副本引擎在首次使用时创建。
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._replica_engines = {}
+        self._replica_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def get_replica_engines(self, app=None) -> list:
+        """获取只读副本引擎列表，未配置副本时为空"""
+        app = self.get_app(app)
+        engines = self._replica_engines.get(app)
+        if engines is None:
+            with self._replica_lock:
+                engines = self._replica_engines.get(app)
+                if engines is None:
+                    options = app.config.get('SQLALCHEMY_REPLICA_ENGINE_OPTIONS', {})
+                    engines = [create_engine(uri, **options)
+                               for uri in app.config.get('SQLALCHEMY_REPLICA_URIS', [])]
+                    self._replica_engines[app] = engines
+        return engines
+
+    def dispose_engines(self, app=None):
+        """释放主库与副本的连接池，用于 fork 之后的子进程"""
+        app = self.get_app(app)
+        self.get_engine(app).dispose()
+        for engine in self._replica_engines.get(app, []):
+            engine.dispose()
+
+    @contextmanager
+    def replica_reads(self):
+        """范围内的只读查询发往副本"""
+        session = self.session()
+        previous = session.info.get('use_replica', False)
+        session.info['use_replica'] = True
+        try:
+            yield
+        finally:
+            session.info['use_replica'] = previous
+
+    def read_only(self, func):
+        """装饰只读的查询函数，使其查询发往副本"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.replica_reads():
+                return func(*args, **kwargs)
+        return wrapper
@@ -0,0 +1,38 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import config
+
+
+class HTTPStatusError(Exception):
+    """上游返回错误的 HTTP 状态码，status 为状态码"""
+
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+
+
+def create_session(headers=None) -> requests.Session:
+    """创建带连接池与重试策略的 HTTP 会话
+
+    同一会话内的请求复用 keep-alive 连接，省去每次调用的 TCP/TLS 握手。
+    """
+    session = requests.Session()
+    if headers:
+        session.headers.update(headers)
+
+    # 设置重试策略
+    retry_strategy = Retry(
+        total=config.HTTP_RETRY_TOTAL,
+        backoff_factor=config.HTTP_RETRY_BACKOFF,
+        status_forcelist=[429, 500, 502, 503, 504],
+    )
+    adapter = HTTPAdapter(
+        max_retries=retry_strategy,
+        pool_connections=config.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=config.HTTP_POOL_MAXSIZE,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
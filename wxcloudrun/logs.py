@@ -0,0 +1,212 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+import config
+from wxcloudrun.metrics import LOG_RECORDS_DROPPED
+
+# 当前请求与后台任务的关联 ID，写入每条日志
+request_id_var: ContextVar[Optional[str]] = ContextVar('request_id', default=None)
+job_id_var: ContextVar[Optional[str]] = ContextVar('job_id', default=None)
+
+# 日志根记录器，各模块使用其子记录器（如 log.drawing_tool）以便单独设置级别
+ROOT_LOGGER = 'log'
+
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'sample'}
+
+
+@contextmanager
+def correlation(request_id: Optional[str] = None, job_id: Optional[str] = None):
+    """在范围内设置关联 ID，退出时恢复"""
+    tokens = []
+    if request_id is not None:
+        tokens.append((request_id_var, request_id_var.set(request_id)))
+    if job_id is not None:
+        tokens.append((job_id_var, job_id_var.set(job_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """在调用方线程中把关联 ID 附加到日志记录上"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        record.job_id = job_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """按 sample 键抽样高频日志
+
+    带 extra={'sample': 键} 的记录按配置的比例保留，如 0.1 表示每 10 条保留 1 条；
+    未配置比例的键与不带 sample 的记录全部保留。
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, 'sample', None)
+        rate = self.rates.get(key) if key is not None else None
+        if rate is None or rate >= 1:
+            return True
+        if rate <= 0:
+            return False
+        interval = round(1 / rate)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        return count % interval == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON，extra 中的字段原样附加"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and value is not None:
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """写入有界队列的非阻塞日志处理器
+
+    调用方线程只做消息格式化与入队，队列满时丢弃并计入 log_records_dropped_total，不会阻塞请求。
+    """
+
+    def __init__(self, maxsize: int):
+        super().__init__(queue.Queue(maxsize))
+
+    def prepare(self, record):
+        # 只合并消息参数，JSON 序列化留给后台线程
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+_handler: Optional[BoundedQueueHandler] = None
+_listener: Optional[QueueListener] = None
+_listener_pid: Optional[int] = None
+_setup_lock = threading.Lock()
+
+
+def _parse_levels(spec: str) -> Dict[str, str]:
+    """解析 "log.comfyone=WARNING,log.drawing_tool=DEBUG" 形式的配置"""
+    levels = {}
+    for item in spec.split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _parse_rates(spec: str) -> Dict[str, float]:
+    """解析 "task_progress=0.1,task_pending=0.2" 形式的配置"""
+    return {name: float(rate) for name, rate in _parse_levels(spec).items()}
+
+
+def setup_logging():
+    """配置日志：关联 ID、抽样、有界队列，并启动后台输出线程，可重复调用"""
+    global _handler
+    with _setup_lock:
+        if _handler is None:
+            _handler = BoundedQueueHandler(config.LOG_QUEUE_SIZE)
+            _handler.addFilter(ContextFilter())
+            _handler.addFilter(SamplingFilter(_parse_rates(config.LOG_SAMPLE_RATES)))
+
+            root = logging.getLogger(ROOT_LOGGER)
+            root.setLevel(config.LOG_LEVEL.upper())
+            root.addHandler(_handler)
+            root.propagate = False
+            for name, level in _parse_levels(config.LOG_LEVELS).items():
+                logging.getLogger(name).setLevel(level)
+            atexit.register(stop_listener)
+    start_listener()
+
+
+def start_listener():
+    """启动后台输出线程
+
+    gunicorn 预加载应用后 fork 出的子进程不继承父进程的线程，
+    需在子进程中重新调用；此时换用新队列，避免继承父进程中可能被持有的队列锁。
+    """
+    global _listener, _listener_pid
+    with _setup_lock:
+        if _handler is None or _listener_pid == os.getpid():
+            return
+        if _listener_pid is not None:
+            _handler.queue = queue.Queue(config.LOG_QUEUE_SIZE)
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JsonFormatter())
+        _listener = QueueListener(_handler.queue, output)
+        _listener.start()
+        _listener_pid = os.getpid()
+
+
+def stop_listener():
+    """输出队列中剩余的日志后停止后台线程"""
+    global _listener, _listener_pid
+    with _setup_lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            _listener.stop()
+        _listener = None
+        _listener_pid = None
+
+
+def init_app(app):
+    """为每个请求分配关联 ID，优先沿用调用方传入的 X-Request-Id"""
+    from flask import g, request
+
+    @app.before_request
+    def bind_request_id():
+        request_id = request.headers.get('X-Request-Id') or uuid.uuid4().hex
+        g.request_id = request_id
+        g.request_id_token = request_id_var.set(request_id)
+
+    @app.after_request
+    def echo_request_id(response):
+        request_id = g.get('request_id')
+        if request_id is not None:
+            response.headers['X-Request-Id'] = request_id
+        return response
+
+    @app.teardown_request
+    def unbind_request_id(exc=None):
+        token = g.pop('request_id_token', None)
+        if token is not None:
+            request_id_var.reset(token)
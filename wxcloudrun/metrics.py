@@ -0,0 +1,277 @@
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+from flask import Response
+
+# 上游接口耗时分桶（秒）
+UPSTREAM_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# 流水线阶段耗时分桶（秒），实例启动等待可达数分钟
+STAGE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 900)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple = ()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class _Metric:
+    """带标签的指标，各标签组合的取值由子类维护"""
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 的标签应为 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self) -> List:
+        """当前取值，可序列化为 JSON：[[标签值列表, 取值], ...]"""
+        with self._lock:
+            return [[list(key), json.loads(json.dumps(value))] for key, value in self._values.items()]
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self, values: Dict[Tuple[str, ...], object] = None) -> List[str]:
+        """输出本进程的取值，或 values 中汇总后的取值"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        if values is None:
+            with self._lock:
+                items = sorted(self._values.items())
+        else:
+            items = sorted(values.items())
+        lines.extend(self._render_samples(items))
+        return lines
+
+    def combine(self, left, right):
+        """合并两个进程中同一标签组合的取值"""
+        raise NotImplementedError
+
+    def _render_samples(self, items) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """只增计数器"""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def combine(self, left, right):
+        return left + right
+
+    def _render_samples(self, items) -> List[str]:
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in items]
+
+
+class Histogram(_Metric):
+    """分桶直方图，同时记录总和与次数"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = UPSTREAM_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][index] += 1
+                    break
+            state['sum'] += value
+
+    def combine(self, left, right):
+        return {'counts': [a + b for a, b in zip(left['counts'], right['counts'])],
+                'sum': left['sum'] + right['sum']}
+
+    def _render_samples(self, items) -> List[str]:
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state['counts']):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, (('le', _format_value(bound)),))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(state["sum"])}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    """进程内的指标注册表
+
+    gunicorn 多进程部署时调用 enable_multiprocess：每个工作进程定期把取值写入共享目录中自己的文件，
+    /metrics 汇总目录中所有文件，抓取结果与处理请求的进程无关。
+    已退出进程的文件保留，计数器不会因进程回收而回退；目录在 gunicorn 主进程启动时清空。
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self._directory = None
+        self._path = None
+        self._flush_lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标 {metric.name} 已注册")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def enable_multiprocess(self, directory: str, interval: float):
+        """在工作进程中调用：清空从主进程继承的取值，并每 interval 秒写出一次本进程的取值"""
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+        self._directory = directory
+        # 进程号可能被复用，加上启动时间区分不同进程
+        self._path = os.path.join(directory, f'{os.getpid()}-{int(time.time() * 1000)}.json')
+        self.flush()
+
+        def run():
+            while True:
+                time.sleep(interval)
+                self.flush()
+
+        threading.Thread(target=run, name='metrics-flush', daemon=True).start()
+
+    def flush(self):
+        """把本进程的取值写入共享目录，未开启多进程汇总时不做任何事"""
+        if self._path is None:
+            return
+        with self._lock:
+            metrics = list(self._metrics.values())
+        data = {metric.name: metric.snapshot() for metric in metrics}
+        with self._flush_lock:
+            temp = f'{self._path}.tmp'
+            with open(temp, 'w') as file:
+                json.dump(data, file)
+            os.replace(temp, self._path)
+
+    def _collect(self) -> Dict[str, Dict[Tuple[str, ...], object]]:
+        """汇总共享目录中所有进程的取值"""
+        with self._lock:
+            metrics = dict(self._metrics)
+        merged = {name: {} for name in metrics}
+        for filename in os.listdir(self._directory):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self._directory, filename)) as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for name, samples in data.items():
+                metric = metrics.get(name)
+                if metric is None:
+                    continue
+                values = merged[name]
+                for key, value in samples:
+                    key = tuple(key)
+                    values[key] = metric.combine(values[key], value) if key in values else value
+        return merged
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        merged = None
+        if self._path is not None:
+            self.flush()
+            merged = self._collect()
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render(merged[metric.name] if merged is not None else None))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+UPSTREAM_REQUESTS = REGISTRY.register(Counter(
+    'upstream_requests_total', '上游接口调用次数',
+    ('service', 'method', 'endpoint', 'status')))
+UPSTREAM_LATENCY = REGISTRY.register(Histogram(
+    'upstream_request_duration_seconds', '上游接口调用耗时',
+    ('service', 'method', 'endpoint'), UPSTREAM_BUCKETS))
+STAGE_LATENCY = REGISTRY.register(Histogram(
+    'drawing_stage_duration_seconds', '绘画流水线各阶段耗时',
+    ('stage', 'outcome'), STAGE_BUCKETS))
+STAGE_ERRORS = REGISTRY.register(Counter(
+    'drawing_stage_errors_total', '绘画流水线各阶段失败次数',
+    ('stage', 'error')))
+LOG_RECORDS_DROPPED = REGISTRY.register(Counter(
+    'log_records_dropped_total', '日志队列已满而丢弃的记录数'))
+
+# 路径中含数字且较长的段视为资源 ID，避免标签基数随 ID 增长
+_ID_SEGMENT = re.compile(r'^(?=.*\d)[\w.-]{8,}$')
+
+
+def endpoint_label(endpoint: str) -> str:
+    """把上游路径归一为模板，如 /v1/prompts/<id>/status"""
+    path = endpoint.split('?', 1)[0]
+    return '/'.join('<id>' if _ID_SEGMENT.match(segment) else segment for segment in path.split('/'))
+
+
+def observe_upstream(service: str, method: str, endpoint: str, status, elapsed: float):
+    """记录一次上游调用，status 为 HTTP 状态码或失败类型"""
+    endpoint = endpoint_label(endpoint)
+    method = method.upper()
+    UPSTREAM_REQUESTS.inc(service=service, method=method, endpoint=endpoint, status=status)
+    UPSTREAM_LATENCY.observe(elapsed, service=service, method=method, endpoint=endpoint)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """统计流水线阶段耗时，异常按类型计入失败次数后继续抛出"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        STAGE_LATENCY.observe(time.perf_counter() - started, stage=stage, outcome='error')
+        STAGE_ERRORS.inc(stage=stage, error=type(e).__name__)
+        raise
+    STAGE_LATENCY.observe(time.perf_counter() - started, stage=stage, outcome='ok')
+
+
+def metrics_endpoint():
+    """API 接口：以 Prometheus 文本格式输出指标"""
+    return Response(REGISTRY.render(), mimetype=None, content_type=CONTENT_TYPE)
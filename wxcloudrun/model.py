@@ -13,3 +13,14 @@ class Counters(db.Model):
     count = db.Column(db.Integer, default=1)
     created_at = db.Column('createdAt', db.TIMESTAMP, nullable=False, default=datetime.now())
     updated_at = db.Column('updatedAt', db.TIMESTAMP, nullable=False, default=datetime.now())
+
+
+# 计数分片表，分片模式下自增写入随机分片，读取时求和
+class CounterShards(db.Model):
+    # 设置结构体表格名称
+    __tablename__ = 'CounterShards'
+
+    # 设定结构体对应表格的字段
+    counter_id = db.Column(db.Integer, primary_key=True)
+    shard = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,61 @@
+from typing import Dict, List, Optional
+
+import config
+from ..async_http import request_json
+
+
+class AsyncOneThingAI:
+    """OneThingAI 实例管理的 asyncio 客户端，方法与 OneThingAI 一一对应
+
+    默认使用当前事件循环共享的 aiohttp 会话，见 wxcloudrun.async_http。
+    """
+    BASE_URL = config.ONETHINGAI_BASE_URL
+
+    STATUS_MESSAGES = {
+        401: "认证失败：请检查 API 密钥是否正确",
+        403: "权限不足：请检查 API 密钥权限",
+        404: "资源不存在：请检查 API 端点是否正确",
+    }
+
+    def __init__(self, session=None):
+        self.headers = {
+            "Authorization": f"Bearer {config.api_key}"
+        }
+        self.session = session
+
+    async def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Dict:
+        """发送 API 请求的通用方法"""
+        return await request_json('onethingai', method, self.BASE_URL, endpoint, self.headers, data,
+                                  timeout=15, session=self.session, status_messages=self.STATUS_MESSAGES)
+
+    async def list_image(self) -> List[Dict]:
+        """获取我的镜像列表"""
+        return await self._make_request("GET", "/api/v2/app/private/image/list")
+
+    async def list_resources(self, appImageId: str) -> List[Dict]:
+        """资源拉取接口"""
+        return await self._make_request("GET", f"/api/v2/resources/?appImageId={appImageId}")
+
+    async def list_instances(self) -> List[Dict]:
+        """获取实例列表"""
+        return await self._make_request("GET", "/api/v2/app")
+
+    async def start_instance(self, instance_id: str) -> Dict:
+        """启动实例"""
+        return await self._make_request("PUT", f"/api/v1/app/operate/boot/{instance_id}")
+
+    async def stop_instance(self, instance_id: str) -> Dict:
+        """停止实例"""
+        return await self._make_request("PUT", f"/api/v1/app/operate/shutdown/{instance_id}")
+
+    async def delete_instance(self, instance_id: str) -> Dict:
+        """删除实例"""
+        return await self._make_request("DELETE", f"/api/v1/app/{instance_id}")
+
+    async def create_instance(self, config: Dict) -> Dict:
+        """创建新实例"""
+        return await self._make_request("POST", "/api/v2/app", data=config)
+
+    async def get_wallet(self) -> Dict:
+        """获取余额"""
+        return await self._make_request("GET", "/api/v1/account/wallet/detail")
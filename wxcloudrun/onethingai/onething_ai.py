@@ -1,8 +1,10 @@
+import threading
+import time
 import requests
 from typing import Dict, List, Optional
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 import config
+from ..http_session import create_session
+from ..metrics import observe_upstream
 
 class OneThingAI:
     """OneThingAI 实例管理工具类"""
@@ -12,27 +14,34 @@ class OneThingAI:
     400: 停止中
     800: 已停止
     """
-    BASE_URL = "https://api-lab.onethingai.com"
+    BASE_URL = config.ONETHINGAI_BASE_URL
+
+    _shared = None
+    _shared_lock = threading.Lock()
     
     def __init__(self):
         self.headers = {
             "Authorization": f"Bearer {config.api_key}"
         }
         
-        # 设置重试策略
-        self.session = requests.Session()
-        retry_strategy = Retry(
-            total=3,
-            backoff_factor=0.5,
-            status_forcelist=[429, 500, 502, 503, 504],
-        )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        self.session.mount("https://", adapter)
-        self.session.mount("http://", adapter)
+        # 带重试策略的连接池会话
+        self.session = create_session()
+
+    @classmethod
+    def shared(cls) -> 'OneThingAI':
+        """获取进程内共享的客户端，复用连接池"""
+        if cls._shared is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls()
+        return cls._shared
     
     def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Dict:
         """发送 API 请求的通用方法"""
         url = f"{self.BASE_URL}{endpoint}"
+        # 失败类型或 HTTP 状态码，记录到上游调用指标
+        status = 'error'
+        started = time.perf_counter()
         try:
             kwargs = {
                 'headers': self.headers,
@@ -43,6 +52,7 @@ class OneThingAI:
                 kwargs['json'] = data
             
             response = self.session.request(method, url, **kwargs)
+            status = response.status_code
             
             # 检查响应状态
             if response.status_code == 401:
@@ -56,13 +66,18 @@ class OneThingAI:
             return response.json()
             
         except requests.exceptions.SSLError as e:
+            status = 'ssl_error'
             raise Exception(f"SSL 证书验证失败: {str(e)}")
         except requests.exceptions.ConnectionError as e:
+            status = 'connection_error'
             raise Exception(f"连接服务器失败: {str(e)}")
         except requests.exceptions.Timeout as e:
+            status = 'timeout'
             raise Exception(f"请求超时: {str(e)}")
         except requests.exceptions.RequestException as e:
             raise Exception(f"API 请求失败: {str(e)}")
+        finally:
+            observe_upstream('onethingai', method, endpoint, status, time.perf_counter() - started)
     
     def list_image(self) -> List[Dict]:
         """获取我的镜像列表"""
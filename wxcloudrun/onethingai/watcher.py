@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import config
+from .onething_ai import OneThingAI
+
+logger = logging.getLogger('log.watcher')
+
+
+class InstanceMissingError(Exception):
+    """等待中的实例已不存在（被删除或释放）"""
+
+    def __init__(self, app_id: str):
+        super().__init__(f"实例 {app_id} 不存在")
+        self.app_id = app_id
+
+
+class InstanceWatcher:
+    """共享的实例状态观察者
+
+    由一个后台线程轮询 list_instances 并按 appId 建立索引，
+    调用方通过 wait_until 阻塞等待状态条件成立，
+    API 调用量与并发等待的调用方数量无关。
+    """
+
+    def __init__(self, fast_interval: float, idle_interval: float):
+        self.fast_interval = fast_interval
+        self.idle_interval = idle_interval
+
+        self._client = OneThingAI.shared()
+        self._cond = threading.Condition()
+        self._refresh_lock = threading.RLock()
+        self._wake = threading.Event()
+        self._instances: Dict[str, Dict] = {}
+        self._refreshed_at = 0.0
+        self._waiters = 0
+        self._thread = None
+        self.poll_count = 0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._cond:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name='instance-watcher', daemon=True)
+                    self._thread.start()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                interval = self.fast_interval if self._waiters else self.idle_interval
+                stale = time.time() - self._refreshed_at >= interval
+            if stale:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.warning("刷新实例列表失败: %s", e)
+            # 有等待者时按快速间隔轮询，否则降频；invalidate() 可提前唤醒
+            self._wake.wait(interval)
+            self._wake.clear()
+
+    def refresh(self):
+        """拉取一次实例列表并唤醒所有等待者"""
+        with self._refresh_lock:
+            instances_response = self._client.list_instances()
+            instances = {inst['appId']: inst for inst in instances_response['data']['appList']}
+            with self._cond:
+                self.poll_count += 1
+                self._instances = instances
+                self._refreshed_at = time.time()
+                self._cond.notify_all()
+
+    def invalidate(self):
+        """实例状态即将变化（创建、停止、删除后），尽快重新拉取"""
+        with self._cond:
+            self._refreshed_at = 0.0
+        self._wake.set()
+
+    def instances(self, max_age: Optional[float] = None) -> List[Dict]:
+        """获取实例列表快照
+
+        Args:
+            max_age: 允许的最大数据时长（秒），超过时同步刷新，默认使用快速轮询间隔
+        """
+        self._ensure_started()
+        max_age = self.fast_interval if max_age is None else max_age
+        if time.time() - self._refreshed_at > max_age:
+            refreshed_at = self._refreshed_at
+            with self._refresh_lock:
+                # 其他线程已刷新过时直接复用
+                if self._refreshed_at == refreshed_at:
+                    self.refresh()
+        with self._cond:
+            return list(self._instances.values())
+
+    def get(self, app_id: str) -> Optional[Dict]:
+        """按 appId 查询实例"""
+        with self._cond:
+            return self._instances.get(app_id)
+
+    def wait_until(self, app_id: str, predicate: Callable[[Dict], bool], timeout: float,
+                   missing_ok: bool = False) -> Optional[Dict]:
+        """阻塞等待实例满足条件
+
+        Args:
+            app_id: 实例 ID
+            predicate: 接收实例，返回条件是否成立
+            timeout: 最长等待时间（秒）
+            missing_ok: 实例不存在时返回 None，否则抛出 InstanceMissingError
+        Returns:
+            条件成立时的实例，missing_ok 且实例不存在时为 None
+        Raises:
+            InstanceMissingError: 等待开始后拉取的实例列表中没有该实例
+        """
+        self._ensure_started()
+        deadline = time.time() + timeout
+        with self._cond:
+            self._waiters += 1
+            try:
+                self._wake.set()
+                # 只认可等待开始之后拉取到的数据
+                started = time.time()
+                while True:
+                    if self._refreshed_at >= started:
+                        instance = self._instances.get(app_id)
+                        if instance is None:
+                            if missing_ok:
+                                return None
+                            raise InstanceMissingError(app_id)
+                        if predicate(instance):
+                            return instance
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise Exception(f"等待实例 {app_id} 状态超时")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiters -= 1
+
+    def wait_for_status(self, app_id: str, statuses, timeout: float) -> Optional[Dict]:
+        """等待实例进入指定状态之一，实例消失时返回 None"""
+        return self.wait_until(app_id, lambda inst: inst['status'] in statuses, timeout, missing_ok=True)
+
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def get_instance_watcher() -> InstanceWatcher:
+    """获取进程内唯一的实例观察者"""
+    global _watcher
+    if _watcher is None:
+        with _watcher_lock:
+            if _watcher is None:
+                _watcher = InstanceWatcher(
+                    fast_interval=config.INSTANCE_POLL_INTERVAL,
+                    idle_interval=config.INSTANCE_IDLE_POLL_INTERVAL,
+                )
+    return _watcher
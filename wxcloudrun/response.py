@@ -1,18 +1,95 @@
+import gzip
 import json
+from datetime import date, datetime
+from decimal import Decimal
 
-from flask import Response
+from flask import Response, request
+
+import config
+
+# 已安装 orjson 时使用其编码，否则退回标准库 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 已安装 brotli 时支持 br 压缩
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON_MIMETYPE = 'application/json'
+
+
+def _default(obj):
+    """序列化标准 JSON 不支持的类型"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(data) -> bytes:
+        return orjson.dumps(data, default=_default, option=_ORJSON_OPTIONS)
+else:
+    def dumps(data) -> bytes:
+        return json.dumps(data, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+# 固定内容的响应体只序列化一次
+_SUCC_EMPTY_BODY = dumps({'code': 0, 'data': {}})
+
+
+def make_json_response(data, status=200):
+    return Response(dumps(data), status=status, mimetype=JSON_MIMETYPE)
 
 
 def make_succ_empty_response():
-    data = json.dumps({'code': 0, 'data': {}})
-    return Response(data, mimetype='application/json')
+    return Response(_SUCC_EMPTY_BODY, mimetype=JSON_MIMETYPE)
 
 
 def make_succ_response(data):
-    data = json.dumps({'code': 0, 'data': data})
-    return Response(data, mimetype='application/json')
+    return make_json_response({'code': 0, 'data': data})
 
 
 def make_err_response(err_msg):
-    data = json.dumps({'code': -1, 'errorMsg': err_msg})
-    return Response(data, mimetype='application/json')
+    return make_json_response({'code': -1, 'errorMsg': err_msg})
+
+
+def compress_response(response):
+    """客户端支持时压缩较大的 JSON 响应，优先 br，其次 gzip"""
+    if (response.direct_passthrough or response.is_streamed
+            or response.mimetype != JSON_MIMETYPE
+            or 'Content-Encoding' in response.headers
+            or not 200 <= response.status_code < 300):
+        return response
+
+    accept_encoding = request.headers.get('Accept-Encoding', '')
+    if brotli is not None and 'br' in accept_encoding:
+        encoding = 'br'
+    elif 'gzip' in accept_encoding:
+        encoding = 'gzip'
+    else:
+        return response
+
+    data = response.get_data()
+    if len(data) < config.RESPONSE_COMPRESS_MIN_SIZE:
+        return response
+    if encoding == 'br':
+        data = brotli.compress(data, quality=config.RESPONSE_BROTLI_QUALITY)
+    else:
+        data = gzip.compress(data, compresslevel=config.RESPONSE_GZIP_LEVEL)
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_app(app):
+    """注册响应压缩"""
+    app.after_request(compress_response)
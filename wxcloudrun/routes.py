@@ -0,0 +1,91 @@
+from flask import Blueprint
+from werkzeug.utils import import_string
+
+import config
+
+
+class LazyView:
+    """按导入路径延迟加载的视图函数
+
+    首次被调用时才导入视图模块，应用启动时无需加载各模块及其依赖的客户端。
+    """
+
+    def __init__(self, import_name: str):
+        self.__module__, self.__name__ = import_name.rsplit('.', 1)
+        self.import_name = import_name
+        self._view = None
+
+    @property
+    def view(self):
+        if self._view is None:
+            self._view = import_string(self.import_name)
+        return self._view
+
+    def __call__(self, *args, **kwargs):
+        return self.view(*args, **kwargs)
+
+
+COMFYUI_VIEWS = 'wxcloudrun.comfyui.comfyui_views'
+USER_VIEWS = 'wxcloudrun.users.user_views'
+COUNTER_VIEWS = 'wxcloudrun.views'
+METRICS_VIEWS = 'wxcloudrun.metrics'
+
+# (路径, 视图函数名, 请求方法)
+COMFYUI_RULES = [
+    ('/api/create_workflow_task_base', 'create_workflow_task_base', ['POST']),
+    ('/api/create_workflow_task_batch', 'create_workflow_task_batch', ['POST']),
+    ('/api/jobs/<job_id>', 'get_job', ['GET']),
+    ('/api/autoscaler', 'get_autoscaler_stats', ['GET']),
+    ('/api/result_cache', 'get_result_cache_stats', ['GET']),
+    ('/api/tasks/<task_id>', 'get_task', ['GET']),
+    ('/api/tasks/<task_id>/events', 'stream_task_events', ['GET']),
+    ('/api/tasks/<task_id>/images/<int:index>', 'get_task_image', ['GET']),
+    ('/api/upload_images', 'upload_images', ['POST']),
+]
+
+USER_RULES = [
+    ('/api/user/register', 'register_user', ['POST']),
+    ('/api/user/<int:user_id>', 'get_user', ['GET']),
+    ('/api/user/openid/<openid>', 'get_user_by_openid', ['GET']),
+    ('/api/user/cache/stats', 'get_user_cache_stats', ['GET']),
+    ('/api/user/photo', 'add_user_photo', ['POST']),
+    ('/api/user/photo/<int:photo_id>', 'update_user_photo', ['PUT']),
+    ('/api/user/photo/<int:photo_id>', 'delete_user_photo', ['DELETE']),
+    ('/api/user/balance', 'update_balance', ['POST']),
+    ('/api/user/balance/batch', 'apply_balance_credits', ['POST']),
+    ('/api/user/vip', 'update_vip', ['POST']),
+    ('/api/order', 'create_order', ['POST']),
+    ('/api/order/<int:order_id>/status', 'update_order_status', ['PUT']),
+    ('/api/user/<int:user_id>/orders', 'get_user_orders', ['GET']),
+    ('/api/user/<int:user_id>/drawings', 'get_user_drawings', ['GET']),
+]
+
+METRICS_RULES = [
+    ('/metrics', 'metrics_endpoint', ['GET']),
+]
+
+# 计数器示例视图，COUNTER_ENABLED 为 true 时注册
+COUNTER_RULES = [
+    ('/', 'index', ['GET']),
+    ('/api/count', 'count', ['POST']),
+    ('/api/count', 'get_count', ['GET']),
+]
+
+
+def _make_blueprint(name: str, module: str, rules) -> Blueprint:
+    blueprint = Blueprint(name, __name__)
+    for rule, view_name, methods in rules:
+        blueprint.add_url_rule(rule, view_name, LazyView(f'{module}.{view_name}'), methods=methods)
+    return blueprint
+
+
+def register_blueprints(app):
+    """注册各模块的路由，视图模块在首次请求对应路径时才导入"""
+    comfyui = _make_blueprint('comfyui', COMFYUI_VIEWS, COMFYUI_RULES)
+    # 后台组件（任务事件消费、自动伸缩）在首个请求到达时启动
+    comfyui.before_app_first_request(LazyView(f'{COMFYUI_VIEWS}.start_background_components'))
+    app.register_blueprint(comfyui)
+    app.register_blueprint(_make_blueprint('users', USER_VIEWS, USER_RULES))
+    app.register_blueprint(_make_blueprint('metrics', METRICS_VIEWS, METRICS_RULES))
+    if config.COUNTER_ENABLED:
+        app.register_blueprint(_make_blueprint('counter', COUNTER_VIEWS, COUNTER_RULES))
@@ -1,4 +1,4 @@
 from .service import UserService
-from .models import User, UserPhoto, Order
+from .models import User, UserPhoto, Order, BalanceLedger
 
-__all__ = ['UserService', 'User', 'UserPhoto', 'Order'] 
\ No newline at end of file
+__all__ = ['UserService', 'User', 'UserPhoto', 'Order', 'BalanceLedger'] 
\ No newline at end of file
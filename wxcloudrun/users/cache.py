@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import config
+from .models import User
+
+
+class UserSnapshot:
+    """User 的只读快照，脱离数据库会话，可在请求间共享
+
+    缓存只在本进程内写穿，不含余额：余额变更后其他进程的快照不会更新，余额需查询主库
+    """
+
+    __slots__ = ('id', 'openid', 'nickname', 'phone', 'avatar_url', 'is_vip',
+                 'vip_expire_time', 'vip_level', 'created_at', 'updated_at')
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_user(cls, user: User) -> 'UserSnapshot':
+        return cls(**{name: getattr(user, name) for name in cls.__slots__})
+
+
+class UserCache:
+    """进程内的用户快照缓存，LRU 淘汰并带过期时间
+
+    同时按 id 与 openid 索引，openid 索引只保存到 id 的映射。
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # user_id -> (快照, 过期时间)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._openids: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get(self, user_id: Optional[int]) -> Optional[UserSnapshot]:
+        """调用方需持有锁"""
+        entry = self._entries.get(user_id) if user_id is not None else None
+        if entry is None:
+            self.misses += 1
+            return None
+        snapshot, expires_at = entry
+        if expires_at < time.time():
+            self._remove(user_id)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return snapshot
+
+    def get(self, user_id: int) -> Optional[UserSnapshot]:
+        with self._lock:
+            return self._get(user_id)
+
+    def get_by_openid(self, openid: str) -> Optional[UserSnapshot]:
+        with self._lock:
+            return self._get(self._openids.get(openid))
+
+    def put(self, snapshot: UserSnapshot):
+        with self._lock:
+            self._remove(snapshot.id)
+            self._entries[snapshot.id] = (snapshot, time.time() + self.ttl)
+            self._openids[snapshot.openid] = snapshot.id
+            while len(self._entries) > self.max_size:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._openids.pop(evicted.openid, None)
+                self.evictions += 1
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._remove(user_id)
+
+    def _remove(self, user_id: int):
+        """调用方需持有锁"""
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._openids.pop(entry[0].openid, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+user_cache = UserCache(max_size=config.USER_CACHE_SIZE, ttl=config.USER_CACHE_TTL)
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DECIMAL, DateTime, Boolean, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DECIMAL, DateTime, Boolean, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from wxcloudrun import db
 
@@ -32,6 +32,10 @@ class UserPhoto(db.Model):
 
 class Order(db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        # 覆盖用户订单列表的过滤与排序，配合游标分页使用
+        Index('ix_orders_user_deleted_created', 'user_id', 'is_deleted', 'created_at', 'id'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id'))
@@ -44,4 +48,46 @@ class Order(db.Model):
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
     
-    user = relationship('User', backref='orders') 
\ No newline at end of file
+    user = relationship('User', backref='orders')
+
+class BalanceLedger(db.Model):
+    """余额流水，只追加不修改"""
+    __tablename__ = 'balance_ledger'
+    __table_args__ = (
+        Index('ix_balance_ledger_user_created', 'user_id', 'created_at'),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    amount = Column(DECIMAL(10, 2), nullable=False)  # 正数为入账，负数为扣款
+    balance_after = Column(DECIMAL(10, 2), nullable=False)
+    order_id = Column(Integer)
+    remark = Column(String(255))
+    created_at = Column(DateTime, default=datetime.now)
+
+class DrawingTask(db.Model):
+    """绘画任务记录，提交时写入，任务结束后更新状态与图片地址"""
+    __tablename__ = 'drawing_tasks'
+    __table_args__ = (
+        # 覆盖用户绘画历史的过滤与排序，配合游标分页使用
+        Index('ix_drawing_tasks_user_created', 'user_id', 'created_at', 'id'),
+        # 按工作流摘要查找可复用的结果
+        Index('ix_drawing_tasks_content_hash', 'content_hash', 'id'),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    task_id = Column(String(64), unique=True, nullable=False)  # ComfyOne taskId
+    user_id = Column(Integer, ForeignKey('users.id'))
+    order_id = Column(Integer)
+    template = Column(String(64))
+    content_hash = Column(String(64))  # 规范化工作流的 SHA-256，仅 deterministic 请求记录
+    status = Column(String(16), nullable=False, default='pending')  # pending/running/finished/error
+    message = Column(String(255))
+    images = Column(Text)  # 图片信息列表的 JSON
+    submitted_at = Column(DateTime)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    user = relationship('User', backref='drawings')
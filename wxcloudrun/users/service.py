@@ -1,9 +1,45 @@
 from datetime import datetime
 from decimal import Decimal
+import base64
+import threading
+import time
 import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import bindparam, tuple_
 from sqlalchemy.exc import SQLAlchemyError
 from wxcloudrun import db
-from .models import User, UserPhoto, Order
+from .models import User, UserPhoto, Order, BalanceLedger, DrawingTask
+from .cache import user_cache, UserSnapshot
+import config
+
+# 分页查询每页最多条数
+MAX_PAGE_SIZE = 100
+
+# 用户订单总数缓存：user_id -> (总数, 过期时间)，LRU 淘汰，最多 ORDER_COUNT_CACHE_SIZE 条
+_order_count_cache: "OrderedDict[int, Tuple[int, float]]" = OrderedDict()
+_order_count_lock = threading.Lock()
+
+
+def clamp_page_size(per_page: int) -> int:
+    """每页条数限制在 1 到 MAX_PAGE_SIZE 之间"""
+    return max(1, min(per_page, MAX_PAGE_SIZE))
+
+
+def encode_order_cursor(order) -> str:
+    """把订单（或绘画记录）的 (created_at, id) 编码为不透明的游标"""
+    raw = f"{order.created_at.isoformat()},{order.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_order_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解析游标"""
+    try:
+        created_at, order_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split(',')
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (ValueError, UnicodeError):
+        raise Exception("无效的分页游标")
+
 
 class UserService:
     @staticmethod
@@ -18,11 +54,57 @@ class UserService:
             )
             db.session.add(user)
             db.session.commit()
+            user_cache.put(UserSnapshot.from_user(user))
             return user
         except SQLAlchemyError as e:
             db.session.rollback()
             raise Exception(f"创建用户失败: {str(e)}")
 
+    @staticmethod
+    @db.read_only
+    def get_user(user_id: int) -> Optional[UserSnapshot]:
+        """按 ID 获取用户，优先读取缓存，未命中时查询只读副本"""
+        snapshot = user_cache.get(user_id)
+        if snapshot is not None:
+            return snapshot
+        try:
+            user = User.query.get(user_id)
+        except SQLAlchemyError as e:
+            raise Exception(f"获取用户失败: {str(e)}")
+        if user is None:
+            return None
+        snapshot = UserSnapshot.from_user(user)
+        user_cache.put(snapshot)
+        return snapshot
+
+    @staticmethod
+    def get_user_balance(user_id: int) -> Optional[Decimal]:
+        """查询用户当前余额，用户不存在时返回 None
+
+        余额不进入用户缓存，可能刚刚变更，查询走主库
+        """
+        try:
+            return db.session.query(User.balance).filter(User.id == user_id).scalar()
+        except SQLAlchemyError as e:
+            raise Exception(f"获取用户余额失败: {str(e)}")
+
+    @staticmethod
+    @db.read_only
+    def get_user_by_openid(openid: str) -> Optional[UserSnapshot]:
+        """按 openid 获取用户，优先读取缓存"""
+        snapshot = user_cache.get_by_openid(openid)
+        if snapshot is not None:
+            return snapshot
+        try:
+            user = User.query.filter_by(openid=openid).first()
+        except SQLAlchemyError as e:
+            raise Exception(f"获取用户失败: {str(e)}")
+        if user is None:
+            return None
+        snapshot = UserSnapshot.from_user(user)
+        user_cache.put(snapshot)
+        return snapshot
+
     @staticmethod
     def add_user_photo(user_id: int, photo_type: int, photo_url: str) -> UserPhoto:
         """添加用户照片"""
@@ -68,24 +150,94 @@ class UserService:
             raise Exception(f"删除用户照片失败: {str(e)}")
 
     @staticmethod
-    def update_user_balance(user_id: int, amount: Decimal, is_increase: bool = True) -> User:
-        """更新用户余额"""
+    def update_user_balance(user_id: int, amount: Decimal, is_increase: bool = True,
+                            order_id: int = None, remark: str = None) -> User:
+        """更新用户余额
+
+        通过一条带条件的 UPDATE 原子地变更余额，扣款时余额不足则不更新，
+        每次变更追加一条余额流水
+        """
         try:
-            user = User.query.get(user_id)
-            if not user:
-                raise Exception("用户不存在")
+            if amount <= 0:
+                raise Exception("金额必须大于0")
+            users = User.__table__
             if is_increase:
-                user.balance += amount
+                stmt = users.update().where(users.c.id == user_id).values(
+                    balance=users.c.balance + amount, updated_at=datetime.now())
             else:
-                if user.balance < amount:
-                    raise Exception("余额不足")
-                user.balance -= amount
+                stmt = users.update().where(users.c.id == user_id, users.c.balance >= amount).values(
+                    balance=users.c.balance - amount, updated_at=datetime.now())
+            result = db.session.execute(stmt)
+            if result.rowcount == 0:
+                db.session.rollback()
+                if db.session.query(User.id).filter(User.id == user_id).first() is None:
+                    raise Exception("用户不存在")
+                raise Exception("余额不足")
+
+            # 本事务持有该行的写锁，读到的即是本次变更后的余额
+            balance = db.session.query(User.balance).filter(User.id == user_id).scalar()
+            db.session.add(BalanceLedger(
+                user_id=user_id,
+                amount=amount if is_increase else -amount,
+                balance_after=balance,
+                order_id=order_id,
+                remark=remark
+            ))
             db.session.commit()
+            user = User.query.get(user_id)
+            user_cache.put(UserSnapshot.from_user(user))
             return user
         except SQLAlchemyError as e:
             db.session.rollback()
             raise Exception(f"更新用户余额失败: {str(e)}")
 
+    @staticmethod
+    def apply_balance_credits(credits: List[Tuple[int, Decimal]], remark: str = None) -> int:
+        """在一个事务内批量入账
+
+        同一用户的多笔入账先合并，按用户 ID 顺序更新以避免死锁，
+        流水批量写入。任一用户不存在时整体回滚。
+
+        Returns:
+            入账的用户数
+        """
+        try:
+            totals: Dict[int, Decimal] = {}
+            for user_id, amount in credits:
+                if amount <= 0:
+                    raise Exception("金额必须大于0")
+                totals[user_id] = totals.get(user_id, Decimal('0')) + amount
+            if not totals:
+                return 0
+
+            user_ids = sorted(totals)
+            users = User.__table__
+            now = datetime.now()
+            result = db.session.execute(
+                users.update().where(users.c.id == bindparam('uid')).values(
+                    balance=users.c.balance + bindparam('amount'), updated_at=now),
+                [{'uid': user_id, 'amount': totals[user_id]} for user_id in user_ids]
+            )
+            if result.rowcount != len(user_ids):
+                db.session.rollback()
+                raise Exception("用户不存在")
+
+            balances = dict(db.session.query(User.id, User.balance).filter(User.id.in_(user_ids)).all())
+            db.session.execute(BalanceLedger.__table__.insert(), [{
+                'user_id': user_id,
+                'amount': totals[user_id],
+                'balance_after': balances[user_id],
+                'remark': remark,
+                'created_at': now
+            } for user_id in user_ids])
+            db.session.commit()
+            for user_id in user_ids:
+                user_cache.invalidate(user_id)
+            return len(user_ids)
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise Exception(f"批量入账失败: {str(e)}")
+
     @staticmethod
     def update_user_vip(user_id: int, vip_level: int, expire_time: datetime) -> User:
         """更新用户会员状态"""
@@ -97,6 +249,7 @@ class UserService:
             user.vip_level = vip_level
             user.vip_expire_time = expire_time
             db.session.commit()
+            user_cache.put(UserSnapshot.from_user(user))
             return user
         except SQLAlchemyError as e:
             db.session.rollback()
@@ -111,6 +264,7 @@ class UserService:
                 raise Exception("用户不存在")
             user.avatar_url = avatar_url
             db.session.commit()
+            user_cache.put(UserSnapshot.from_user(user))
             return user
         except SQLAlchemyError as e:
             db.session.rollback()
@@ -134,6 +288,17 @@ class UserService:
             db.session.rollback()
             raise Exception(f"创建订单失败: {str(e)}")
 
+    @staticmethod
+    def get_user_order(user_id: int, order_id: int) -> Optional[Order]:
+        """获取属于该用户且未删除的订单，不存在或不属于该用户时返回 None
+
+        订单可能刚刚创建，查询走主库
+        """
+        try:
+            return Order.query.filter_by(id=order_id, user_id=user_id, is_deleted=False).first()
+        except SQLAlchemyError as e:
+            raise Exception(f"获取订单失败: {str(e)}")
+
     @staticmethod
     def update_order_status(order_id: int, status: int) -> Order:
         """更新订单状态"""
@@ -163,8 +328,10 @@ class UserService:
             raise Exception(f"删除订单失败: {str(e)}")
 
     @staticmethod
+    @db.read_only
     def get_user_orders(user_id: int, page: int = 1, per_page: int = 20):
         """获取用户订单列表"""
+        per_page = clamp_page_size(per_page)
         try:
             return Order.query.filter_by(
                 user_id=user_id,
@@ -173,4 +340,91 @@ class UserService:
                 Order.created_at.desc()
             ).paginate(page=page, per_page=per_page)
         except SQLAlchemyError as e:
-            raise Exception(f"获取用户订单列表失败: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"获取用户订单列表失败: {str(e)}")
+
+    @staticmethod
+    @db.read_only
+    def get_user_orders_after(user_id: int, after: Optional[str] = None,
+                              limit: int = 20) -> Tuple[List[Order], Optional[str]]:
+        """按游标获取用户订单列表
+
+        按 (created_at, id) 倒序，从游标位置之后取 limit 条（限制在 1 到 MAX_PAGE_SIZE 之间），
+        查询走 ix_orders_user_deleted_created 索引，耗时与翻页深度无关
+
+        Returns:
+            (订单列表, 下一页游标)，没有更多数据时游标为 None
+        """
+        limit = clamp_page_size(limit)
+        try:
+            query = Order.query.filter_by(
+                user_id=user_id,
+                is_deleted=False
+            )
+            if after:
+                created_at, order_id = decode_order_cursor(after)
+                query = query.filter(tuple_(Order.created_at, Order.id) < tuple_(created_at, order_id))
+            orders = query.order_by(
+                Order.created_at.desc(),
+                Order.id.desc()
+            ).limit(limit + 1).all()
+            if len(orders) > limit:
+                orders = orders[:limit]
+                return orders, encode_order_cursor(orders[-1])
+            return orders, None
+        except SQLAlchemyError as e:
+            raise Exception(f"获取用户订单列表失败: {str(e)}")
+
+    @staticmethod
+    @db.read_only
+    def count_user_orders(user_id: int) -> int:
+        """获取用户订单总数，结果缓存 ORDER_COUNT_CACHE_TTL 秒，最多缓存 ORDER_COUNT_CACHE_SIZE 个用户"""
+        now = time.time()
+        with _order_count_lock:
+            cached = _order_count_cache.get(user_id)
+            if cached is not None:
+                if cached[1] > now:
+                    _order_count_cache.move_to_end(user_id)
+                    return cached[0]
+                del _order_count_cache[user_id]
+        try:
+            total = Order.query.filter_by(
+                user_id=user_id,
+                is_deleted=False
+            ).count()
+        except SQLAlchemyError as e:
+            raise Exception(f"获取用户订单总数失败: {str(e)}")
+        with _order_count_lock:
+            _order_count_cache[user_id] = (total, now + config.ORDER_COUNT_CACHE_TTL)
+            _order_count_cache.move_to_end(user_id)
+            while len(_order_count_cache) > config.ORDER_COUNT_CACHE_SIZE:
+                _order_count_cache.popitem(last=False)
+        return total
+
+    @staticmethod
+    @db.read_only
+    def get_user_drawings_after(user_id: int, after: Optional[str] = None,
+                                limit: int = 20) -> Tuple[List[DrawingTask], Optional[str]]:
+        """按游标获取用户的绘画历史
+
+        按 (created_at, id) 倒序取 limit 条（限制在 1 到 MAX_PAGE_SIZE 之间），
+        一次查询走 ix_drawing_tasks_user_created 索引，状态与图片地址直接取自 drawing_tasks，不再逐个查询上游
+
+        Returns:
+            (绘画记录列表, 下一页游标)，没有更多数据时游标为 None
+        """
+        limit = clamp_page_size(limit)
+        try:
+            query = DrawingTask.query.filter_by(user_id=user_id)
+            if after:
+                created_at, drawing_id = decode_order_cursor(after)
+                query = query.filter(tuple_(DrawingTask.created_at, DrawingTask.id) < tuple_(created_at, drawing_id))
+            drawings = query.order_by(
+                DrawingTask.created_at.desc(),
+                DrawingTask.id.desc()
+            ).limit(limit + 1).all()
+            if len(drawings) > limit:
+                drawings = drawings[:limit]
+                return drawings, encode_order_cursor(drawings[-1])
+            return drawings, None
+        except SQLAlchemyError as e:
+            raise Exception(f"获取用户绘画历史失败: {str(e)}")
@@ -1,12 +1,14 @@
-from flask import request, jsonify
-from run import app
+import json
+from flask import request
 from .service import UserService
+from .cache import user_cache
 from wxcloudrun.response import make_succ_response, make_err_response
 from decimal import Decimal
 from datetime import datetime
 
+# 视图函数的路由注册在 wxcloudrun/routes.py 中
+
 # 用户注册
-@app.route('/api/user/register', methods=['POST'])
 def register_user():
     try:
         params = request.get_json()
@@ -23,15 +25,51 @@ def register_user():
             'user_id': user.id,
             'openid': user.openid,
             'nickname': user.nickname,
-            'balance': float(user.balance),
+            'balance': user.balance,
             'is_vip': user.is_vip,
             'vip_level': user.vip_level
         })
     except Exception as e:
         return make_err_response(str(e))
 
+def _user_to_dict(user, balance):
+    return {
+        'user_id': user.id,
+        'openid': user.openid,
+        'nickname': user.nickname,
+        'phone': user.phone,
+        'avatar_url': user.avatar_url,
+        'balance': balance,
+        'is_vip': user.is_vip,
+        'vip_level': user.vip_level,
+        'vip_expire_time': user.vip_expire_time
+    }
+
+# 获取用户信息
+def get_user(user_id):
+    try:
+        user = UserService.get_user(user_id)
+        if user is None:
+            return make_err_response('用户不存在')
+        return make_succ_response(_user_to_dict(user, UserService.get_user_balance(user.id)))
+    except Exception as e:
+        return make_err_response(str(e))
+
+# 按openid获取用户信息（登录）
+def get_user_by_openid(openid):
+    try:
+        user = UserService.get_user_by_openid(openid)
+        if user is None:
+            return make_err_response('用户不存在')
+        return make_succ_response(_user_to_dict(user, UserService.get_user_balance(user.id)))
+    except Exception as e:
+        return make_err_response(str(e))
+
+# 用户缓存命中统计
+def get_user_cache_stats():
+    return make_succ_response(user_cache.stats())
+
 # 上传用户照片
-@app.route('/api/user/photo', methods=['POST'])
 def add_user_photo():
     try:
         params = request.get_json()
@@ -51,7 +89,6 @@ def add_user_photo():
         return make_err_response(str(e))
 
 # 更新用户照片
-@app.route('/api/user/photo/<int:photo_id>', methods=['PUT'])
 def update_user_photo(photo_id):
     try:
         params = request.get_json()
@@ -70,7 +107,6 @@ def update_user_photo(photo_id):
         return make_err_response(str(e))
 
 # 删除用户照片
-@app.route('/api/user/photo/<int:photo_id>', methods=['DELETE'])
 def delete_user_photo(photo_id):
     try:
         UserService.delete_user_photo(photo_id)
@@ -79,7 +115,6 @@ def delete_user_photo(photo_id):
         return make_err_response(str(e))
 
 # 更新用户余额
-@app.route('/api/user/balance', methods=['POST'])
 def update_balance():
     try:
         params = request.get_json()
@@ -89,17 +124,34 @@ def update_balance():
         user = UserService.update_user_balance(
             user_id=params['user_id'],
             amount=Decimal(str(params['amount'])),
-            is_increase=params['is_increase']
+            is_increase=params['is_increase'],
+            order_id=params.get('order_id'),
+            remark=params.get('remark')
         )
         return make_succ_response({
             'user_id': user.id,
-            'balance': float(user.balance)
+            'balance': user.balance
         })
     except Exception as e:
         return make_err_response(str(e))
 
+# 批量入账
+def apply_balance_credits():
+    try:
+        params = request.get_json()
+        credits = params.get('credits')
+        if not credits or not all('user_id' in c and 'amount' in c for c in credits):
+            return make_err_response('缺少必要参数')
+            
+        count = UserService.apply_balance_credits(
+            credits=[(c['user_id'], Decimal(str(c['amount']))) for c in credits],
+            remark=params.get('remark')
+        )
+        return make_succ_response({'user_count': count})
+    except Exception as e:
+        return make_err_response(str(e))
+
 # 更新会员状态
-@app.route('/api/user/vip', methods=['POST'])
 def update_vip():
     try:
         params = request.get_json()
@@ -115,13 +167,12 @@ def update_vip():
             'user_id': user.id,
             'is_vip': user.is_vip,
             'vip_level': user.vip_level,
-            'vip_expire_time': user.vip_expire_time.isoformat() if user.vip_expire_time else None
+            'vip_expire_time': user.vip_expire_time
         })
     except Exception as e:
         return make_err_response(str(e))
 
 # 创建订单
-@app.route('/api/order', methods=['POST'])
 def create_order():
     try:
         params = request.get_json()
@@ -137,14 +188,13 @@ def create_order():
         return make_succ_response({
             'order_id': order.id,
             'order_no': order.order_no,
-            'amount': float(order.amount),
+            'amount': order.amount,
             'status': order.status
         })
     except Exception as e:
         return make_err_response(str(e))
 
 # 更新订单状态
-@app.route('/api/order/<int:order_id>/status', methods=['PUT'])
 def update_order_status(order_id):
     try:
         params = request.get_json()
@@ -162,12 +212,41 @@ def update_order_status(order_id):
     except Exception as e:
         return make_err_response(str(e))
 
+def _order_to_dict(order):
+    return {
+        'order_id': order.id,
+        'order_no': order.order_no,
+        'amount': order.amount,
+        'order_type': order.order_type,
+        'status': order.status,
+        'created_at': order.created_at
+    }
+
 # 获取用户订单列表
-@app.route('/api/user/<int:user_id>/orders', methods=['GET'])
 def get_user_orders(user_id):
+    """
+    传入 after 参数时使用游标分页：首页传空值，之后传上一页返回的 next_cursor，
+    with_total=1 时附带缓存的订单总数；否则按 page/per_page 分页
+    """
     try:
-        page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
+
+        if 'after' in request.args:
+            orders, next_cursor = UserService.get_user_orders_after(
+                user_id=user_id,
+                after=request.args.get('after') or None,
+                limit=per_page
+            )
+            data = {
+                'orders': [_order_to_dict(order) for order in orders],
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
+            }
+            if request.args.get('with_total', 0, type=int):
+                data['total'] = UserService.count_user_orders(user_id)
+            return make_succ_response(data)
+
+        page = request.args.get('page', 1, type=int)
         
         pagination = UserService.get_user_orders(
             user_id=user_id,
@@ -175,14 +254,7 @@ def get_user_orders(user_id):
             per_page=per_page
         )
         
-        orders = [{
-            'order_id': order.id,
-            'order_no': order.order_no,
-            'amount': float(order.amount),
-            'order_type': order.order_type,
-            'status': order.status,
-            'created_at': order.created_at.isoformat()
-        } for order in pagination.items]
+        orders = [_order_to_dict(order) for order in pagination.items]
         
         return make_succ_response({
             'orders': orders,
@@ -191,4 +263,38 @@ def get_user_orders(user_id):
             'current_page': pagination.page
         })
     except Exception as e:
-        return make_err_response(str(e))
\ No newline at end of file
+        return make_err_response(str(e))
+
+def _drawing_to_dict(drawing):
+    return {
+        'drawing_id': drawing.id,
+        'task_id': drawing.task_id,
+        'order_id': drawing.order_id,
+        'template': drawing.template,
+        'status': drawing.status,
+        'message': drawing.message,
+        'images': json.loads(drawing.images) if drawing.images else None,
+        'submitted_at': drawing.submitted_at,
+        'started_at': drawing.started_at,
+        'finished_at': drawing.finished_at,
+        'created_at': drawing.created_at
+    }
+
+# 获取用户绘画历史
+def get_user_drawings(user_id):
+    """
+    游标分页：首页不传 after，之后传上一页返回的 next_cursor
+    """
+    try:
+        drawings, next_cursor = UserService.get_user_drawings_after(
+            user_id=user_id,
+            after=request.args.get('after') or None,
+            limit=request.args.get('per_page', 20, type=int)
+        )
+        return make_succ_response({
+            'drawings': [_drawing_to_dict(drawing) for drawing in drawings],
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        })
+    except Exception as e:
+        return make_err_response(str(e))
@@ -1,11 +1,10 @@
-from datetime import datetime
 from flask import render_template, request
-from run import app
-from wxcloudrun.dao import delete_counterbyid, query_counterbyid, insert_counter, update_counterbyid
-from wxcloudrun.model import Counters
+from wxcloudrun.dao import increment_counter, query_counter_value, clear_counter
 from wxcloudrun.response import make_succ_empty_response, make_succ_response, make_err_response
 
-@app.route('/')
+# 视图函数的路由定义在 wxcloudrun/routes.py 的 COUNTER_RULES 中
+
+
 def index():
     """
     :return: 返回index页面
@@ -13,7 +12,6 @@ def index():
     return render_template('index.html')
 
 
-@app.route('/api/count', methods=['POST'])
 def count():
     """
     :return:计数结果/清除结果
@@ -31,24 +29,14 @@ def count():
 
     # 执行自增操作
     if action == 'inc':
-        counter = query_counterbyid(1)
-        if counter is None:
-            counter = Counters()
-            counter.id = 1
-            counter.count = 1
-            counter.created_at = datetime.now()
-            counter.updated_at = datetime.now()
-            insert_counter(counter)
-        else:
-            counter.id = 1
-            counter.count += 1
-            counter.updated_at = datetime.now()
-            update_counterbyid(counter)
-        return make_succ_response(counter.count)
+        count = increment_counter(1)
+        if count is None:
+            return make_err_response('计数失败')
+        return make_succ_response(count)
 
     # 执行清0操作
     elif action == 'clear':
-        delete_counterbyid(1)
+        clear_counter(1)
         return make_succ_empty_response()
 
     # action参数错误
@@ -56,14 +44,9 @@ def count():
         return make_err_response('action参数错误')
 
 
-@app.route('/api/count', methods=['GET'])
 def get_count():
     """
     :return: 计数的值
     """
-    counter = Counters.query.filter(Counters.id == 1).first()
-    return make_succ_response(0) if counter is None else make_succ_response(counter.count)
-
+    return make_succ_response(query_counter_value(1))
 
-if __name__ == '__main__':
-    app.run(debug=True)